@@ -1,30 +1,144 @@
-from flask import Flask, render_template, request, jsonify
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, render_template, request, jsonify, send_file, redirect, url_for
+import re
 import os
 import json
+import hashlib
 from main import GuideMind
 from sadtalker_controller import sadtalker_controller
+from avatar_router import avatar_router
+from startup import BackgroundInitializer
+from storage_manager import storage_manager
+from routes.heygen import heygen_bp
+from routes.troubleshoot import troubleshoot_bp
+from metrics import metrics, instrument_app
+from tracing import tracer
+from traffic_recorder import traffic_recorder
+from model_policy import model_policy
+from state_backend import state_backend
+from media_store import media_store
+from static_assets import static_assets
 
 app = Flask(__name__)
-guide = GuideMind()
+# Session state lives in the shared state backend (STATE_BACKEND) so every
+# worker of a multi-process server sees the same instructions and step
+guide = GuideMind(state=state_backend)
+# Blueprints reach the guide through current_app.extensions['guide']
+app.extensions['guide'] = guide
 
-# Initialize SadTalker controller
-try:
-    sadtalker_initialized = sadtalker_controller.is_available()
-    print(f"SadTalker initialized: {sadtalker_initialized}")
-    
+# Register blueprints
+app.register_blueprint(heygen_bp)
+app.register_blueprint(troubleshoot_bp)
+
+# Fingerprinted, precompressed static files (asset_url() in templates)
+static_assets.init_app(app)
+
+# Per-route latency histograms for /metrics
+instrument_app(app)
+
+# Request-scoped tracing spans (TRACING_EXPORTER)
+tracer.instrument_app(app)
+
+# Anonymized request recording for replay (TRAFFIC_RECORDING)
+traffic_recorder.instrument_app(app)
+
+@app.before_request
+def _restore_shared_video():
+    # Videos rendered on another node (or evicted here) come from the media store
+    if media_store.enabled and request.path.startswith('/static/videos/'):
+        store_url = sadtalker_controller.restore_video_file(request.path[len('/static/videos/'):])
+        if store_url:
+            return redirect(store_url)
+
+# Backend probing and sample avatar downloads run in the background so the
+# server accepts traffic immediately; progress is reported by /api/ready
+startup = BackgroundInitializer()
+startup.record_import_time("app", _import_started)
+
+def _initialize_sadtalker():
+    initialized = sadtalker_controller.initialize()
+    print(f"SadTalker initialized: {initialized}")
+    return initialized
+
+def _add_sample_avatars():
     # Add sample avatars if needed
-    if sadtalker_initialized and not sadtalker_controller.available_avatars:
+    if sadtalker_controller.is_available() and not sadtalker_controller.available_avatars:
         added_avatars = sadtalker_controller.add_sample_avatars()
         print(f"Added {len(added_avatars)} sample avatars")
-except Exception as e:
-    print(f"Error initializing SadTalker: {e}")
-    sadtalker_initialized = False
+        return len(added_avatars)
+    return 0
+
+def _warm_heygen_metadata():
+    # Load HeyGen auth status and catalogs before the first request needs them
+    if not os.getenv("HEYGEN_API_KEY"):
+        return False
+    from heygen_controller import heygen_controller
+    heygen_controller.heygen.warm_metadata()
+    return True
+
+def _check_state_backend():
+    # Workers only serve consistent sessions once the shared state is reachable
+    if not state_backend.ping():
+        raise RuntimeError(f"{state_backend.name} state backend is not reachable")
+    return state_backend.name
+
+startup.add_task("state", _check_state_backend)
+startup.add_task("sadtalker", _initialize_sadtalker)
+startup.add_task("sample_avatars", _add_sample_avatars, required=False)
+startup.add_task("storage_sweep", storage_manager.run, required=False)
+startup.add_task("heygen_metadata", _warm_heygen_metadata, required=False)
+startup.add_task("assets", static_assets.precompress, required=False)
+startup.start()
 
 @app.route('/')
 def index():
     # Main interface page
     return render_template('index.html')
 
+# Files whose content versions the service worker's static cache
+SERVICE_WORKER_BUNDLE = ['templates/index.html', 'templates/sw.js', 'static/css/style.css',
+                         'static/js/main-sadtalker.js', 'static/js/sadtalker.js']
+
+# Third-party assets the page loads (kept in sync with templates/index.html)
+SERVICE_WORKER_CDN_ASSETS = [
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha1/dist/css/bootstrap.min.css',
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha1/dist/js/bootstrap.bundle.min.js',
+    'https://code.jquery.com/jquery-3.6.0.min.js',
+    'https://cdn.jsdelivr.net/npm/hls.js@1.5.7/dist/hls.min.js'
+]
+
+def _bundle_version():
+    """Hash the static bundle so a deploy that changes it replaces the cached copy"""
+    digest = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for path in SERVICE_WORKER_BUNDLE:
+        try:
+            with open(os.path.join(root, path), 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(path.encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+@app.route('/sw.js')
+def service_worker():
+    """Serve the service worker from the site root so it controls every page"""
+    precache_urls = ['/', static_assets.asset_url('css/style.css'),
+                     static_assets.asset_url('js/main-sadtalker.js'),
+                     static_assets.asset_url('js/sadtalker.js'),
+                     url_for('static', filename='img/avatar-poster.jpg')] + SERVICE_WORKER_CDN_ASSETS
+    script = render_template(
+        'sw.js',
+        cache_version=_bundle_version(),
+        precache_urls=precache_urls,
+        media_cache_bytes=int(float(os.getenv('SW_MEDIA_CACHE_MB', '300')) * 1024 * 1024),
+        steps_cache_entries=int(os.getenv('SW_STEPS_CACHE_ENTRIES', '200'))
+    )
+    # Browsers check for a new worker on navigation; never let a stale one stick
+    return Response(script, mimetype='application/javascript', headers={'Cache-Control': 'no-cache'})
+
 @app.route('/load-instructions', methods=['POST'])
 def load_instructions():
     if 'manual' in request.files:
@@ -48,31 +162,88 @@ def load_instructions():
 @app.route('/get-step', methods=['GET'])
 def get_step():
     step_number = int(request.args.get('step', guide.current_step))
+    instructions = guide.instructions
     
     # Ensure valid step number
-    if 0 <= step_number < len(guide.instructions):
-        guide.current_step = step_number
-        current_step = guide.get_current_step()
-        explanation = guide.get_step_explanation(current_step)
+    if 0 <= step_number < len(instructions):
+        # Refreshes of a degraded answer don't move the learner
+        if request.args.get('refresh') != 'true':
+            guide.current_step = step_number
+        current_step = instructions[step_number]
+        
+        # Bounded by ROUTE_BUDGET_GET_STEP; a slow LLM yields canned or generic
+        # content marked as degraded, and the client refreshes it later
+        explanation = guide.get_step_explanation_within(current_step)
         
         return jsonify({
             'success': True,
             'step_number': step_number + 1,
-            'total_steps': len(guide.instructions),
+            'total_steps': len(instructions),
             'instruction': current_step,
-            'explanation': explanation
+            'explanation': explanation['text'],
+            'degraded': explanation['degraded'],
+            'source': explanation['source']
         })
     else:
         return jsonify({'success': False, 'error': 'Invalid step number'})
 
+# Most steps the batch endpoint returns per request
+STEPS_BATCH_MAX = int(os.getenv("STEPS_BATCH_MAX", "10"))
+
+@app.route('/api/steps', methods=['GET'])
+def get_steps():
+    """Get the payloads of a range of steps in one response
+    
+    Nothing here waits on the LLM or an avatar render: each step reports its
+    explanation (fallback content marked degraded while it is generated in
+    the background) and video as they are now. With warm=true, videos that
+    aren't ready start rendering, so the client can prefetch the steps
+    around the current one. Unlike /get-step, the learner's position is not
+    moved.
+    """
+    instructions = guide.instructions
+    try:
+        start = max(0, int(request.args.get('start', guide.current_step)))
+        count = min(max(1, int(request.args.get('count', 3))), STEPS_BATCH_MAX)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'start and count must be integers'}), 400
+    warm = request.args.get('warm', 'false').lower() == 'true'
+    
+    steps = []
+    for step_number in range(start, min(start + count, len(instructions))):
+        step_text = instructions[step_number]
+        explanation = guide.peek_step_explanation(step_text)
+        video = avatar_router.peek_step_video(step_text)
+        if warm and video['status'] == 'missing' and avatar_router.prefetch_step_video(step_text, step_number):
+            video['status'] = 'rendering'
+        
+        steps.append({
+            'step_number': step_number + 1,
+            'total_steps': len(instructions),
+            'instruction': step_text,
+            'explanation': explanation['text'],
+            'degraded': explanation['degraded'],
+            'source': explanation['source'],
+            'video': video
+        })
+    
+    return jsonify({
+        'success': True,
+        'total_steps': len(instructions),
+        'start': start,
+        'steps': steps
+    })
+
 @app.route('/troubleshoot', methods=['GET'])
 def troubleshoot():
     current_step = guide.get_current_step()
     if current_step:
-        troubleshooting = guide.get_troubleshooting(current_step)
+        troubleshooting = guide.get_troubleshooting_within(current_step)
         return jsonify({
             'success': True,
-            'troubleshooting': troubleshooting
+            'troubleshooting': troubleshooting['text'],
+            'degraded': troubleshooting['degraded'],
+            'source': troubleshooting['source']
         })
     else:
         return jsonify({'success': False, 'error': 'No current step'})
@@ -100,20 +271,39 @@ def previous_step():
 
 # SadTalker API Routes
 
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    """Report whether background startup has finished"""
+    status = startup.status()
+    return jsonify(status), (200 if status['ready'] else 503)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/llm/models', methods=['GET'])
+def llm_models():
+    """Report the model and token budget of every LLM call type"""
+    return jsonify(model_policy.report())
+
+@app.route('/api/storage', methods=['GET'])
+def storage_report():
+    """Report disk usage of generated media directories"""
+    return jsonify(storage_manager.report())
+
 @app.route('/api/avatar/status', methods=['GET'])
 def avatar_status():
     """Check if SadTalker is available and initialized"""
-    global sadtalker_initialized
+    if not startup.is_ready():
+        return jsonify({
+            'status': 'success',
+            'initialized': False,
+            'starting': True,
+            'message': 'SadTalker is starting up'
+        })
     
-    if not sadtalker_initialized:
-        try:
-            sadtalker_initialized = sadtalker_controller.is_available()
-        except Exception as e:
-            return jsonify({
-                'status': 'error',
-                'message': f'Error initializing SadTalker: {str(e)}',
-                'initialized': False
-            })
+    sadtalker_initialized = sadtalker_controller.is_available()
     
     return jsonify({
         'status': 'success',
@@ -121,6 +311,11 @@ def avatar_status():
         'message': 'SadTalker initialized successfully' if sadtalker_initialized else 'SadTalker not initialized'
     })
 
+@app.route('/api/avatar/backends', methods=['GET'])
+def avatar_backends():
+    """Report avatar backend routing and observed latency/error rates"""
+    return jsonify(avatar_router.report())
+
 @app.route('/api/avatar/options', methods=['GET'])
 def avatar_options():
     """Get available avatar options"""
@@ -209,7 +404,7 @@ def get_welcome_video():
     force_regenerate = request.args.get('force', 'false').lower() == 'true'
     
     try:
-        result = sadtalker_controller.get_welcome_video(force_regenerate=force_regenerate)
+        result = avatar_router.get_video("welcome", force_regenerate=force_regenerate)
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -223,7 +418,8 @@ def get_step_video(step_number):
     force_regenerate = request.args.get('force', 'false').lower() == 'true'
     
     try:
-        current_step = guide.instructions[step_number] if 0 <= step_number < len(guide.instructions) else None
+        instructions = guide.instructions
+        current_step = instructions[step_number] if 0 <= step_number < len(instructions) else None
         
         if not current_step:
             return jsonify({
@@ -231,8 +427,9 @@ def get_step_video(step_number):
                 'message': f'Invalid step number: {step_number}'
             })
         
-        result = sadtalker_controller.get_video_for_step(
-            step_text=current_step, 
+        result = avatar_router.get_video(
+            "step",
+            step_text=current_step,
             step_number=step_number,
             force_regenerate=force_regenerate
         )
@@ -261,7 +458,8 @@ def get_help_video():
                 })
             step_text = current_step
         
-        result = sadtalker_controller.get_help_video(
+        result = avatar_router.get_video(
+            "help",
             step_text=step_text,
             force_regenerate=force_regenerate
         )
@@ -272,8 +470,52 @@ def get_help_video():
             'message': f'Error generating help video: {str(e)}'
         })
 
+@app.route('/api/avatar/narration', methods=['GET'])
+def get_narration():
+    """Get narration audio for a video so it can play while the video renders"""
+    kind = request.args.get('kind', 'step')
+    step_text = request.args.get('step_text')
+    
+    try:
+        if kind not in ('welcome', 'step', 'help'):
+            return jsonify({
+                'status': 'error',
+                'message': f'Invalid kind: {kind}'
+            })
+        
+        if kind != 'welcome' and not step_text:
+            step_number = int(request.args.get('step', guide.current_step))
+            instructions = guide.instructions
+            if not 0 <= step_number < len(instructions):
+                return jsonify({
+                    'status': 'error',
+                    'message': f'Invalid step number: {step_number}'
+                })
+            step_text = instructions[step_number]
+        
+        return jsonify(sadtalker_controller.get_narration(kind, step_text))
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Error generating narration: {str(e)}'
+        })
+
+@app.route('/api/avatar/narration/<narration_key>.wav', methods=['GET'])
+def narration_audio(narration_key):
+    """Serve a narration file from the content cache"""
+    if not re.fullmatch(r'[0-9a-f]{64}', narration_key):
+        return jsonify({'status': 'error', 'message': 'Invalid narration key'}), 404
+    
+    path = sadtalker_controller.sadtalker.narration_path(narration_key)
+    if not os.path.exists(path):
+        return jsonify({'status': 'error', 'message': 'Narration not found'}), 404
+    
+    # Content-addressed, so the file at this URL never changes
+    return send_file(path, mimetype='audio/wav', conditional=True, max_age=31536000)
+
 if __name__ == '__main__':
     # Create templates directory if it doesn't exist
     os.makedirs('templates', exist_ok=True)
     
+    # Development server; production runs wsgi.py under gunicorn (gunicorn.conf.py)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -3,6 +3,7 @@ import os
 import json
 from main import GuideMind
 from routes.troubleshoot import troubleshoot_bp
+from static_assets import static_assets, TemplateSnippets
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -11,6 +12,10 @@ guide = GuideMind()
 # Register blueprints
 app.register_blueprint(troubleshoot_bp)
 
+# Fingerprinted, precompressed static files and memoized template snippets
+static_assets.init_app(app)
+snippets = TemplateSnippets(app)
+
 # Create required directories
 os.makedirs(os.path.join(app.static_folder, 'uploads'), exist_ok=True)
 os.makedirs('templates', exist_ok=True)
@@ -23,7 +28,7 @@ def index():
 @app.route('/templates/<template_name>')
 def serve_template(template_name):
     """Serve template snippets for dynamic loading"""
-    return render_template(template_name)
+    return snippets.serve(template_name)
 
 @app.route('/load-instructions', methods=['POST'])
 def load_instructions():
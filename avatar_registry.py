@@ -0,0 +1,397 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+
+class AvatarRegistry:
+    """Indexed registry of avatar images for GuideMind
+
+    Keeps a manifest (``manifest.json`` inside the avatars directory) with the
+    content hash, dimensions and a small pre-generated WebP thumbnail for every
+    avatar image. Files whose size and modification time match the manifest are
+    not re-read on startup, and uploads of an image that is already registered
+    return the existing avatar instead of storing another copy.
+    """
+
+    MANIFEST_VERSION = 1
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+    def __init__(self, avatars_dir: str, thumbnail_size: int = None):
+        """Initialize avatar registry
+
+        Args:
+            avatars_dir: Directory containing avatar images
+            thumbnail_size: Maximum width/height of generated thumbnails in pixels
+        """
+        self.avatars_dir = avatars_dir
+        self.thumbs_dir = os.path.join(avatars_dir, "thumbs")
+        self.manifest_path = os.path.join(avatars_dir, "manifest.json")
+        self.thumbnail_size = thumbnail_size or int(os.getenv("AVATAR_THUMBNAIL_SIZE", "128"))
+
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+        os.makedirs(self.thumbs_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """Get the content hash used to identify an avatar image
+
+        Args:
+            data: Image data as bytes
+
+        Returns:
+            Hex-encoded SHA-256 digest
+        """
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def hash_file(path: str) -> Optional[str]:
+        """Get the content hash of an image file
+
+        Args:
+            path: Path to the image file
+
+        Returns:
+            Hex-encoded SHA-256 digest or None if the file can't be read
+        """
+        try:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            return digest.hexdigest()
+        except OSError as e:
+            print(f"Error hashing avatar image {path}: {e}")
+            return None
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load the manifest and reconcile it with the avatars directory
+
+        Only new or modified image files are hashed and thumbnailed; unchanged
+        files are taken from the manifest as-is.
+
+        Returns:
+            List of avatar dictionaries sorted by name
+        """
+        with self._lock:
+            manifest_entries = self._read_manifest()
+            by_filename = {entry["filename"]: entry for entry in manifest_entries.values()}
+
+            entries = {}
+            seen_hashes = {}
+            changed = False
+
+            try:
+                filenames = sorted(os.listdir(self.avatars_dir))
+            except OSError as e:
+                print(f"Error loading avatars: {e}")
+                filenames = []
+
+            for filename in filenames:
+                if not filename.lower().endswith(self.IMAGE_EXTENSIONS):
+                    continue
+
+                path = os.path.join(self.avatars_dir, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                entry = by_filename.get(filename)
+                if not entry or entry.get("size") != stat.st_size or entry.get("mtime") != int(stat.st_mtime):
+                    entry = self._index_file(filename, stat, entry)
+                    if not entry:
+                        continue
+                    changed = True
+                elif not self._thumbnail_exists(entry):
+                    entry["thumbnail"] = self._generate_thumbnail(path, entry["hash"])
+                    changed = True
+
+                # The same picture saved under two names is only listed once
+                if entry["hash"] in seen_hashes:
+                    print(f"Skipping duplicate avatar {filename} (same image as {seen_hashes[entry['hash']]})")
+                    continue
+                seen_hashes[entry["hash"]] = filename
+
+                entries[entry["id"]] = entry
+
+            changed = changed or set(entries) != set(manifest_entries)
+
+            self._entries = entries
+            if changed:
+                self._write_manifest()
+
+            return self.list()
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Get all registered avatars
+
+        Returns:
+            List of avatar dictionaries with id, name, path, hash and dimensions
+        """
+        with self._lock:
+            avatars = [self._public_entry(entry) for entry in self._entries.values()]
+        avatars.sort(key=lambda x: x["name"])
+        return avatars
+
+    def get(self, avatar_id: str) -> Optional[Dict[str, Any]]:
+        """Get an avatar by ID
+
+        Args:
+            avatar_id: ID of the avatar
+
+        Returns:
+            Avatar dictionary or None if not registered
+        """
+        with self._lock:
+            entry = self._entries.get(avatar_id)
+            return self._public_entry(entry) if entry else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Find an avatar by content hash
+
+        Args:
+            content_hash: SHA-256 digest of the image data
+
+        Returns:
+            Avatar dictionary or None if no avatar has this content
+        """
+        with self._lock:
+            for entry in self._entries.values():
+                if entry["hash"] == content_hash:
+                    return self._public_entry(entry)
+        return None
+
+    def find_by_path(self, path: str) -> Optional[Dict[str, Any]]:
+        """Find an avatar by image path
+
+        Args:
+            path: Path to the avatar image
+
+        Returns:
+            Avatar dictionary or None if the path is not a registered avatar
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            for entry in self._entries.values():
+                if os.path.abspath(os.path.join(self.avatars_dir, entry["filename"])) == path:
+                    return self._public_entry(entry)
+        return None
+
+    def add_image(self, image_data: bytes, avatar_id: str = None, name: str = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Register an avatar image, reusing an existing avatar with identical content
+
+        Args:
+            image_data: Image data as bytes
+            avatar_id: ID for the avatar (optional, derived from the hash if omitted)
+            name: Display name for the avatar (optional)
+
+        Returns:
+            Tuple of (avatar dictionary or None if failed, True if a new avatar was created)
+        """
+        content_hash = self.hash_bytes(image_data)
+
+        with self._lock:
+            existing = self.find_by_hash(content_hash)
+            if existing:
+                return existing, False
+
+            extension = self._sniff_extension(image_data)
+            if not extension:
+                print("Unsupported avatar image format")
+                return None, False
+
+            avatar_id = avatar_id or f"custom_{content_hash[:12]}"
+            filename = f"{avatar_id}{extension}"
+            path = os.path.join(self.avatars_dir, filename)
+
+            try:
+                self._atomic_write(path, image_data)
+            except OSError as e:
+                print(f"Error saving avatar image: {e}")
+                return None, False
+
+            entry = self._index_file(filename, os.stat(path), None, content_hash=content_hash)
+            if not entry:
+                return None, False
+
+            entry["id"] = avatar_id
+            if name:
+                entry["name"] = name
+
+            self._entries[avatar_id] = entry
+            self._write_manifest()
+
+            return self._public_entry(entry), True
+
+    def to_option(self, avatar: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert an avatar to the format used by the avatar picker
+
+        Args:
+            avatar: Avatar dictionary
+
+        Returns:
+            Dictionary with id, name, thumbnail URL, hash and dimensions
+        """
+        if avatar.get("thumbnail"):
+            thumbnail = f"/static/img/avatars/thumbs/{avatar['thumbnail']}"
+        else:
+            # No thumbnail could be generated (e.g. Pillow is missing)
+            thumbnail = f"/static/img/avatars/{avatar['filename']}"
+
+        return {
+            "id": avatar["id"],
+            "name": avatar["name"],
+            "thumbnail": thumbnail,
+            "hash": avatar["hash"],
+            "width": avatar.get("width"),
+            "height": avatar.get("height")
+        }
+
+    def _index_file(self, filename: str, stat: os.stat_result, previous: Optional[Dict[str, Any]],
+                    content_hash: str = None) -> Optional[Dict[str, Any]]:
+        """Hash, measure and thumbnail a single image file
+
+        Args:
+            filename: Image filename within the avatars directory
+            stat: Result of os.stat for the file
+            previous: Previous manifest entry for the file, if any
+            content_hash: Already computed content hash (optional)
+
+        Returns:
+            Manifest entry or None if the file can't be read
+        """
+        path = os.path.join(self.avatars_dir, filename)
+        content_hash = content_hash or self.hash_file(path)
+        if not content_hash:
+            return None
+
+        avatar_id = os.path.splitext(filename)[0]
+        width, height = self._read_dimensions(path)
+
+        return {
+            "id": previous["id"] if previous else avatar_id,
+            # Create readable name from filename
+            "name": previous["name"] if previous else avatar_id.replace('_', ' ').replace('-', ' ').title(),
+            "filename": filename,
+            "hash": content_hash,
+            "size": stat.st_size,
+            "mtime": int(stat.st_mtime),
+            "width": width,
+            "height": height,
+            "thumbnail": self._generate_thumbnail(path, content_hash),
+            "added": previous.get("added") if previous else int(time.time())
+        }
+
+    def _read_dimensions(self, path: str) -> Tuple[Optional[int], Optional[int]]:
+        """Read image dimensions
+
+        Args:
+            path: Path to the image file
+
+        Returns:
+            Tuple of (width, height), or (None, None) if they can't be determined
+        """
+        try:
+            # Import Pillow only when needed to avoid unnecessary dependencies
+            from PIL import Image
+
+            with Image.open(path) as image:
+                return image.size
+        except Exception as e:
+            print(f"Could not read avatar dimensions for {path}: {e}")
+            return None, None
+
+    def _generate_thumbnail(self, path: str, content_hash: str) -> Optional[str]:
+        """Generate a small WebP thumbnail for an image
+
+        Thumbnails are named after the content hash so identical images share one.
+
+        Args:
+            path: Path to the source image
+            content_hash: Content hash of the source image
+
+        Returns:
+            Thumbnail filename within the thumbs directory or None if failed
+        """
+        thumbnail_name = f"{content_hash[:16]}_{self.thumbnail_size}.webp"
+        thumbnail_path = os.path.join(self.thumbs_dir, thumbnail_name)
+
+        if os.path.exists(thumbnail_path):
+            return thumbnail_name
+
+        try:
+            from PIL import Image, ImageOps
+
+            with Image.open(path) as image:
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGB")
+                image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+
+                temp_path = f"{thumbnail_path}.{os.getpid()}.tmp"
+                image.save(temp_path, format="WEBP", quality=80, method=4)
+                os.replace(temp_path, thumbnail_path)
+
+            return thumbnail_name
+        except Exception as e:
+            print(f"Error generating avatar thumbnail for {path}: {e}")
+            return None
+
+    def _thumbnail_exists(self, entry: Dict[str, Any]) -> bool:
+        """Check whether the thumbnail for a manifest entry is on disk"""
+        return bool(entry.get("thumbnail")) and os.path.exists(os.path.join(self.thumbs_dir, entry["thumbnail"]))
+
+    def _public_entry(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a manifest entry and add the absolute image path"""
+        avatar = dict(entry)
+        avatar["path"] = os.path.join(self.avatars_dir, entry["filename"])
+        return avatar
+
+    @staticmethod
+    def _sniff_extension(data: bytes) -> Optional[str]:
+        """Detect the file extension of image data from its magic bytes"""
+        if data.startswith(b"\x89PNG\r\n\x1a\n"):
+            return ".png"
+        if data.startswith(b"\xff\xd8\xff"):
+            return ".jpg"
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return ".webp"
+        return None
+
+    def _read_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """Read manifest entries keyed by avatar ID"""
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != self.MANIFEST_VERSION:
+                return {}
+            return {entry["id"]: entry for entry in manifest.get("avatars", [])}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error reading avatar manifest, rebuilding: {e}")
+            return {}
+
+    def _write_manifest(self):
+        """Write the manifest atomically"""
+        manifest = {
+            "version": self.MANIFEST_VERSION,
+            "thumbnail_size": self.thumbnail_size,
+            "avatars": sorted(self._entries.values(), key=lambda x: x["id"])
+        }
+        try:
+            self._atomic_write(self.manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
+        except OSError as e:
+            print(f"Error writing avatar manifest: {e}")
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        """Write a file via a temporary file and rename"""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
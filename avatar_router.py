@@ -0,0 +1,438 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional
+from metrics import metrics
+from tracing import tracer
+from ttl_cache import TTLCache
+
+class BackendStats:
+    """Observed latency and error rate of one avatar backend
+
+    Latency and error rate are exponentially weighted moving averages, so a
+    backend that slows down or starts failing is demoted within a few jobs,
+    and recovers as soon as it succeeds again.
+    """
+
+    def __init__(self, name: str, alpha: float = 0.3, prior_latency: float = 60.0):
+        """Initialize backend stats
+
+        Args:
+            name: Backend name
+            alpha: EWMA smoothing factor (weight of the newest observation)
+            prior_latency: Assumed latency in seconds before the first render
+        """
+        self.name = name
+        self.alpha = alpha
+        self.latency = prior_latency
+        self.error_rate = 0.0
+        self.renders = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.in_flight = 0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, success: bool, error: str = None):
+        """Record the outcome of a render
+
+        Args:
+            seconds: Time the render took
+            success: Whether the render produced a video
+            error: Error message for failed renders
+        """
+        with self._lock:
+            self.renders += 1
+            self.error_rate += self.alpha * ((0.0 if success else 1.0) - self.error_rate)
+            if success:
+                self.consecutive_errors = 0
+                self.latency += self.alpha * (seconds - self.latency)
+            else:
+                self.errors += 1
+                self.consecutive_errors += 1
+                self.last_error = error
+                self.last_error_at = time.time()
+
+    def started(self):
+        """Count a render as running"""
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self):
+        """Count a running render as done"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the stats as a dictionary"""
+        return {
+            "name": self.name,
+            "latency": round(self.latency, 2),
+            "error_rate": round(self.error_rate, 3),
+            "renders": self.renders,
+            "errors": self.errors,
+            "consecutive_errors": self.consecutive_errors,
+            "in_flight": self.in_flight,
+            "last_error": self.last_error,
+            "last_error_at": int(self.last_error_at) if self.last_error_at else None
+        }
+
+class AvatarRouter:
+    """Routes avatar video jobs across backends by observed latency
+
+    Each job goes to the fastest healthy backend. If it hasn't finished after
+    AVATAR_HEDGE_AFTER_SECONDS, the job is optionally hedged to the next
+    backend and whichever finishes first wins. If no video is ready within
+    AVATAR_DEADLINE_SECONDS, the response degrades to audio-only (the client
+    narrates the script itself) while the renders keep running in the
+    background, so the next request for the same video is a cache hit.
+    """
+
+    def __init__(self):
+        """Initialize router with settings from the environment"""
+        self.deadline = float(os.getenv("AVATAR_DEADLINE_SECONDS", "30"))
+        self.hedge_enabled = os.getenv("AVATAR_HEDGE", "false").lower() == "true"
+        self.hedge_after = float(os.getenv("AVATAR_HEDGE_AFTER_SECONDS", "10"))
+
+        # Backends with a higher error rate, or this many failures in a row,
+        # are skipped until the cooldown has passed
+        self.max_error_rate = float(os.getenv("AVATAR_MAX_ERROR_RATE", "0.5"))
+        self.max_consecutive_errors = int(os.getenv("AVATAR_MAX_CONSECUTIVE_ERRORS", "3"))
+        self.cooldown = float(os.getenv("AVATAR_BACKEND_COOLDOWN_SECONDS", "60"))
+
+        self.backends: Dict[str, Dict[str, Any]] = {}
+        self.stats: Dict[str, BackendStats] = {}
+        self._inflight: Dict[tuple, Any] = {}
+        self._listening = set()
+        self._lock = threading.Lock()
+        self._in_flight_gauge = metrics.gauge(
+            "guidemind_avatar_renders_in_flight",
+            "Avatar renders running per backend",
+            ["backend"]
+        )
+        self._responses = metrics.counter(
+            "guidemind_avatar_responses_total",
+            "Avatar video responses by backend and outcome",
+            ["backend", "outcome"]
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("AVATAR_ROUTER_WORKERS", "8")),
+            thread_name_prefix="avatar-render"
+        )
+
+    def add_backend(self, name: str, controller_getter: Callable[[], Any], is_available: Callable[[], bool]):
+        """Register an avatar backend
+
+        The controller must provide get_welcome_video(), get_video_for_step()
+        and get_help_video() returning a dictionary with status and video_url.
+        It may provide avatar_key(), identifying its current avatar, so
+        renders for different avatars are never joined. Controllers that
+        answer "pending" and finish renders in the background (HeyGen) may
+        provide add_render_listener(callback), called with (seconds,
+        success, error) when such a render ends, so their stats still learn.
+
+        Args:
+            name: Backend name
+            controller_getter: Function returning the backend's controller
+            is_available: Function checking whether the backend can render
+        """
+        self.backends[name] = {"get_controller": controller_getter, "is_available": is_available}
+        self.stats[name] = BackendStats(name)
+        self._in_flight_gauge.set_function(lambda: self.stats[name].in_flight, backend=name)
+
+    def _is_healthy(self, name: str) -> bool:
+        """Check whether a backend should receive jobs"""
+        stats = self.stats[name]
+        if stats.last_error_at and time.time() - stats.last_error_at > self.cooldown:
+            # Give a demoted backend another chance after the cooldown
+            return True
+        return stats.error_rate <= self.max_error_rate and stats.consecutive_errors < self.max_consecutive_errors
+
+    def ranked_backends(self) -> List[str]:
+        """Get available, healthy backends, fastest first
+
+        Returns:
+            List of backend names
+        """
+        candidates = []
+        for name, backend in self.backends.items():
+            try:
+                if backend["is_available"]() and self._is_healthy(name):
+                    candidates.append(name)
+            except Exception as e:
+                print(f"Error checking avatar backend {name}: {e}")
+        return sorted(candidates, key=lambda name: self.stats[name].latency)
+
+    def _listen(self, name: str, controller: Any):
+        """Record background renders of a controller in its backend's stats"""
+        add_listener = getattr(controller, "add_render_listener", None)
+        with self._lock:
+            if not add_listener or name in self._listening:
+                return
+            self._listening.add(name)
+        add_listener(self.stats[name].record)
+
+    def _render(self, name: str, kind: str, step_text: Optional[str], step_number: Optional[int], force_regenerate: bool) -> Dict[str, Any]:
+        """Render a video on one backend and record the outcome"""
+        controller = self.backends[name]["get_controller"]()
+        self._listen(name, controller)
+        stats = self.stats[name]
+        stats.started()
+        started = time.time()
+
+        with tracer.span("avatar.render", backend=name, kind=kind) as span:
+            try:
+                if kind == "welcome":
+                    result = controller.get_welcome_video(force_regenerate=force_regenerate)
+                elif kind == "help":
+                    result = controller.get_help_video(step_text, force_regenerate=force_regenerate)
+                else:
+                    result = controller.get_video_for_step(step_text, step_number, force_regenerate=force_regenerate)
+            except Exception as e:
+                result = {"status": "error", "message": str(e), "video_url": None}
+            finally:
+                stats.finished()
+            if span:
+                span.set_attribute("status", result.get("status"))
+                span.set_attribute("cached", bool(result.get("cached")))
+
+        success = result.get("status") == "success" and bool(result.get("video_url"))
+        # Cache hits say nothing about render latency; a render that is still
+        # running is recorded by the backend's render listener when it ends
+        if not (success and result.get("cached")) and result.get("status") != "pending":
+            stats.record(time.time() - started, success, result.get("message") or result.get("error"))
+
+        result["backend"] = name
+        return result
+
+    def _submit(self, name: str, kind: str, step_text: Optional[str], step_number: Optional[int], force_regenerate: bool):
+        """Submit a render, joining an identical one that is still running"""
+        # The same step on another avatar (or voice) is a different video
+        key = (name, self._avatar_key(name), kind, step_text)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future and not future.done() and not force_regenerate:
+                return future
+
+            # Bound to the caller's context so backend spans join its trace
+            future = self._executor.submit(tracer.bind(self._render), name, kind, step_text, step_number, force_regenerate)
+            self._inflight[key] = future
+
+        def forget(done_future):
+            with self._lock:
+                if self._inflight.get(key) is done_future:
+                    del self._inflight[key]
+
+        future.add_done_callback(forget)
+        return future
+
+    def _avatar_key(self, name: str) -> Optional[str]:
+        """Get the current avatar of a backend's controller, if it reports one"""
+        try:
+            avatar_key = getattr(self.backends[name]["get_controller"](), "avatar_key", None)
+            return avatar_key() if avatar_key else None
+        except Exception as e:
+            print(f"Error getting the avatar of {name}: {e}")
+            return None
+
+    def get_video(self, kind: str, step_text: str = None, step_number: int = None,
+                  force_regenerate: bool = False, deadline: float = None) -> Dict[str, Any]:
+        """Get a video from the best backend within the deadline
+
+        Args:
+            kind: "welcome", "step" or "help"
+            step_text: Text of the step (not used for the welcome video)
+            step_number: Step number (for step videos)
+            force_regenerate: Force regeneration of video
+            deadline: Seconds to wait for a video (default AVATAR_DEADLINE_SECONDS)
+
+        Returns:
+            Dictionary with video_url, status and the backend that produced it;
+            status is "degraded" with mode "audio" if no video was ready in time
+        """
+        deadline = self.deadline if deadline is None else deadline
+        started = time.time()
+        remaining_backends = self.ranked_backends()
+
+        if not remaining_backends:
+            return self._degraded("No avatar backend available", started)
+
+        pending = {}
+        errors = []
+        rendering = False
+
+        def launch_next():
+            name = remaining_backends.pop(0)
+            pending[self._submit(name, kind, step_text, step_number, force_regenerate)] = name
+
+        launch_next()
+        hedged = False
+
+        def can_hedge():
+            return self.hedge_enabled and not hedged and bool(remaining_backends)
+
+        # A backend answering "pending" is still rendering in the background:
+        # it stays eligible for hedging like a running future
+        while pending or (rendering and can_hedge()):
+            elapsed = time.time() - started
+            if elapsed >= deadline:
+                break
+
+            # Wake up to hedge while a second backend is still unused
+            timeout = deadline - elapsed
+            if can_hedge():
+                timeout = min(timeout, max(0.0, self.hedge_after - elapsed))
+
+            if pending:
+                done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(timeout)
+                done = set()
+
+            for future in done:
+                name = pending.pop(future)
+                result = future.result()
+                if result.get("status") == "success" and result.get("video_url"):
+                    result["latency"] = round(time.time() - started, 2)
+                    result["hedged"] = hedged
+                    self._responses.inc(backend=name, outcome="hedged" if hedged else "video")
+                    return result
+                errors.append(f"{name}: {result.get('message') or result.get('error')}")
+                if result.get("status") == "pending":
+                    # Still rendering (here or on another node); only a hedge
+                    # sends it to a second backend
+                    rendering = True
+                    continue
+
+                # Fail over to the next backend right away
+                if remaining_backends and not pending:
+                    launch_next()
+
+            if not done and can_hedge() and time.time() - started >= self.hedge_after:
+                hedged = True
+                print(f"Hedging {kind} video to {remaining_backends[0]} after {time.time() - started:.1f}s")
+                launch_next()
+
+        if pending or rendering:
+            # Renders keep going in the background and land in the backend caches
+            return self._degraded(f"No video ready within {deadline:.0f}s", started, pending=True)
+        return self._degraded("; ".join(errors) or "All avatar backends failed", started)
+
+    def peek_step_video(self, step_text: str) -> Dict[str, Any]:
+        """Report a step video's status without waiting for a render
+
+        Args:
+            step_text: Text of the step
+
+        Returns:
+            The first backend's cached video (status "success"), or status
+            "rendering" while a render is in flight and "missing" otherwise
+        """
+        for name in self.ranked_backends():
+            peek = getattr(self.backends[name]["get_controller"](), "peek_video_for_step", None)
+            try:
+                result = peek(step_text) if peek else None
+            except Exception as e:
+                print(f"Error checking {name} for a cached step video: {e}")
+                result = None
+            if result:
+                result["backend"] = name
+                return result
+
+        with self._lock:
+            rendering = any(
+                kind == "step" and text == step_text and not future.done()
+                for (_, _, kind, text), future in self._inflight.items()
+            )
+        return {"status": "rendering" if rendering else "missing", "video_url": None}
+
+    def prefetch_step_video(self, step_text: str, step_number: int = None) -> bool:
+        """Start rendering a step video on the best backend without waiting
+
+        A later get_video() for the same step joins the render, or finds the
+        video in the backend's cache.
+
+        Args:
+            step_text: Text of the step
+            step_number: Step number
+
+        Returns:
+            True if a render was started (or one was already running)
+        """
+        ranked = self.ranked_backends()
+        if not ranked:
+            return False
+        self._submit(ranked[0], "step", step_text, step_number, False)
+        return True
+
+    def _degraded(self, message: str, started: float, pending: bool = False) -> Dict[str, Any]:
+        """Build an audio-only response"""
+        self._responses.inc(backend="none", outcome="deadline" if pending else "degraded")
+        return {
+            "status": "degraded",
+            "mode": "audio",
+            "message": message,
+            "video_url": None,
+            "rendering": pending,
+            "latency": round(time.time() - started, 2)
+        }
+
+    def report(self) -> Dict[str, Any]:
+        """Report routing settings and per-backend stats
+
+        Returns:
+            Dictionary with settings, ranking and stats
+        """
+        return {
+            "deadline": self.deadline,
+            "hedge": self.hedge_enabled,
+            "hedge_after": self.hedge_after,
+            "ranking": self.ranked_backends(),
+            "backends": [self.stats[name].to_dict() for name in self.backends]
+        }
+
+def _sadtalker_controller():
+    from sadtalker_controller import sadtalker_controller
+    return sadtalker_controller
+
+def _sadtalker_available() -> bool:
+    from sadtalker_controller import sadtalker_controller
+    return sadtalker_controller.is_available()
+
+def _heygen_controller():
+    from heygen_controller import heygen_controller
+    return heygen_controller
+
+# ranked_backends() runs for every job; a failed HeyGen initialization
+# (network calls) is retried at most this often
+_availability = TTLCache("avatar_backends")
+HEYGEN_RETRY_SECONDS = float(os.getenv("AVATAR_BACKEND_RETRY_SECONDS", "30"))
+
+def _heygen_available() -> bool:
+    if not os.getenv("HEYGEN_API_KEY"):
+        return False
+    from heygen_controller import heygen_controller
+    if heygen_controller.initialized:
+        return True
+    return _availability.get(
+        "heygen",
+        heygen_controller.initialize,
+        ttl=lambda ok: 3600 if ok else HEYGEN_RETRY_SECONDS
+    )
+
+# Create router instance; AVATAR_BACKENDS selects and orders the backends
+avatar_router = AvatarRouter()
+
+_backend_factories = {
+    "sadtalker": (_sadtalker_controller, _sadtalker_available),
+    "heygen": (_heygen_controller, _heygen_available),
+}
+
+for _name in os.getenv("AVATAR_BACKENDS", "sadtalker,heygen").split(","):
+    _name = _name.strip().lower()
+    if _name in _backend_factories:
+        avatar_router.add_backend(_name, *_backend_factories[_name])
+    elif _name:
+        print(f"Warning: unknown avatar backend {_name}")
@@ -0,0 +1,274 @@
+"""Replay recorded GuideMind traffic at N× speed
+
+Reads a recording made with TRAFFIC_RECORDING=true (see traffic_recorder.py)
+and plays each session's requests back in order, keeping the recorded gaps
+between requests divided by --speed. By default it launches the app against
+the offline stand-ins from stand_ins.py, so caching or prefetch changes can be
+compared on realistic navigation patterns.
+
+Recordings hold no user content, so replay substitutes it:
+- uploaded manuals are replaced by the preloaded instructions
+- uploaded images (avatars, troubleshooting photos) by a generated PNG
+- custom avatar IDs by the avatar the replay uploads
+- step text and descriptions are left out, so the app uses its current step
+Requests for content-addressed media (video and narration files, HeyGen
+batches) are skipped, since their keys belong to the recorded deployment.
+
+Examples:
+    python bench/replay.py traffic.jsonl --speed 10
+    python bench/replay.py traffic.jsonl --speed 5 --cold --json replay.json
+    python bench/replay.py traffic.jsonl --target http://localhost:5000
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stand_ins import LatencyModel, add_latency_arguments, start_all
+from run_bench import BenchClient, _classify, cache_hit_rates, print_report, start_app, summarize, wait_until_ready
+
+ROUTE_ARGUMENT = re.compile(r"<(?:[^:<>]+:)?([^<>]+)>")
+
+def load_recording(path: str, sessions: int = 0) -> List[Dict[str, Any]]:
+    """Load and order a traffic recording
+
+    Args:
+        path: JSONL file written by the traffic recorder
+        sessions: Keep only the first N sessions (0 = all)
+
+    Returns:
+        Records sorted by timestamp
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                print(f"Skipping malformed line: {line[:80]}")
+
+    records.sort(key=lambda record: record["ts"])
+    if sessions:
+        kept = []
+        for record in records:
+            if record["session"] not in kept:
+                kept.append(record["session"])
+        kept = set(kept[:sessions])
+        records = [record for record in records if record["session"] in kept]
+    return records
+
+def build_request(record: Dict[str, Any], client: BenchClient) -> Optional[Dict[str, Any]]:
+    """Rebuild a request from a record
+
+    Args:
+        record: Recorded request
+        client: Client holding the replay's avatar and test image
+
+    Returns:
+        Keyword arguments for requests.Session.request, or None to skip
+    """
+    view_args = record.get("view_args", {})
+    missing = []
+
+    def substitute(match):
+        value = view_args.get(match.group(1))
+        if value is None or value is True:
+            missing.append(match.group(1))
+            return ""
+        return str(value)
+
+    path = ROUTE_ARGUMENT.sub(substitute, record["route"])
+    if missing or record["route"].startswith("/api/heygen/batch"):
+        return None
+
+    def known(fields: Dict[str, Any]) -> Dict[str, Any]:
+        # Fields recorded only as present carry no value to replay
+        return {name: value for name, value in (fields or {}).items() if value is not True}
+
+    kwargs: Dict[str, Any] = {"method": record["method"], "url": f"{client.base_url}{path}", "timeout": client.timeout}
+    params = known(record.get("args"))
+    if params:
+        kwargs["params"] = params
+
+    form = known(record.get("form"))
+    files = record.get("files") or {}
+    if record["route"] == "/load-instructions" and "manual" in files:
+        form["preloaded_key"] = "basic_crane"
+    elif "image" in files:
+        kwargs["files"] = {"image": ("replay.png", client.image, "image/png")}
+    if form:
+        kwargs["data"] = form
+
+    if "json" in record:
+        body = known(record["json"])
+        if body.get("avatar_id") == "custom":
+            if not client.avatar_id:
+                return None
+            body["avatar_id"] = client.avatar_id
+        kwargs["json"] = body
+
+    return kwargs
+
+def replay(records: List[Dict[str, Any]], client: BenchClient, speed: float) -> Tuple[List[Dict[str, Any]], float, int]:
+    """Replay records, one thread per session, at the given speed
+
+    Returns:
+        Tuple of (results, elapsed seconds, skipped records)
+    """
+    by_session: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        by_session[record["session"]].append(record)
+
+    first_ts = records[0]["ts"]
+    results = []
+    skipped = [0]
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def play(session_records):
+        session = requests.Session()
+        for record in session_records:
+            kwargs = build_request(record, client)
+            if kwargs is None:
+                with lock:
+                    skipped[0] += 1
+                continue
+
+            # Keep the recorded spacing; if we're behind, send right away
+            delay = started + (record["ts"] - first_ts) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            request_started = time.perf_counter()
+            try:
+                response = session.request(**kwargs)
+                ok, degraded, error = _classify(response)
+            except requests.RequestException as e:
+                ok, degraded, error = False, False, type(e).__name__
+            result = {
+                "op": record["route"],
+                "seconds": time.perf_counter() - request_started,
+                "ok": ok,
+                "degraded": degraded,
+                "error": error,
+                "lag": max(0.0, -delay),
+            }
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=play, args=(session_records,), daemon=True)
+               for session_records in by_session.values()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results, time.perf_counter() - started, skipped[0]
+
+def recorded_results(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Convert records to results so the recording can be summarized the same way"""
+    return [{
+        "op": record["route"],
+        "seconds": record["duration_ms"] / 1000.0,
+        "ok": record["status"] < 400 and record.get("outcome", {}).get("status") != "error"
+              and record.get("outcome", {}).get("success") is not False,
+        "degraded": record.get("outcome", {}).get("status") == "degraded" or bool(record.get("outcome", {}).get("degraded")),
+        "error": f"HTTP {record['status']}" if record["status"] >= 400 else "error response",
+    } for record in records]
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded GuideMind traffic")
+    parser.add_argument("recording", help="JSONL file written with TRAFFIC_RECORDING=true")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression factor (default 1 = real time)")
+    parser.add_argument("--sessions", type=int, default=0, help="Replay only the first N sessions")
+    parser.add_argument("--target", help="Replay against a running app at this URL instead of launching one")
+    parser.add_argument("--port", type=int, default=0, help="Port for the launched app (default: a free port)")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--cold", action="store_true", help="Start the app with an empty content cache")
+    parser.add_argument("--heygen", action="store_true", help="Enable the HeyGen backend (stand-in) alongside SadTalker")
+    parser.add_argument("--app-log", help="Write the launched app's output to this file")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    add_latency_arguments(parser)
+    args = parser.parse_args(argv)
+
+    records = load_recording(args.recording, args.sessions)
+    if not records:
+        print("Recording is empty")
+        return 1
+    span = records[-1]["ts"] - records[0]["ts"]
+    sessions = len({record["session"] for record in records})
+    print(f"{len(records)} requests from {sessions} sessions over {span:.0f}s; "
+          f"replaying at {args.speed:g}x (~{span / args.speed:.0f}s)")
+
+    process = None
+    if args.target:
+        base_url = args.target
+    else:
+        servers = start_all(
+            LatencyModel.parse(args.anthropic_latency),
+            LatencyModel.parse(args.sadtalker_latency),
+            LatencyModel.parse(args.heygen_latency),
+        )
+        process, base_url = start_app(servers, args)
+
+    try:
+        if not wait_until_ready(base_url, 120, process):
+            print("App did not become ready (use --app-log to see its output)")
+            return 1
+
+        client = BenchClient(base_url, args.timeout)
+        if any("/api/avatar/" in record["route"] for record in records) and not client.upload_avatar():
+            print("Warning: avatar upload failed; video routes will degrade")
+
+        before = client.scrape_cache_counters()
+        results, elapsed, skipped = replay(records, client, args.speed)
+        caches = cache_hit_rates(before, client.scrape_cache_counters())
+
+        print("\nRecorded:")
+        recorded = summarize(recorded_results(records), span or 1.0)
+        print_report(recorded, {}, span, sessions)
+
+        print("\nReplay:")
+        summary = summarize(results, elapsed)
+        print_report(summary, caches, elapsed, sessions)
+
+        lags = sorted(result["lag"] for result in results)
+        if lags:
+            print(f"\nSkipped {skipped} media requests; schedule lag p95 {lags[int(0.95 * (len(lags) - 1))] * 1000:.0f} ms "
+                  f"(high lag means the replay could not keep up with --speed)")
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({
+                    "config": {key: value for key, value in vars(args).items() if key != "json"},
+                    "elapsed": elapsed,
+                    "skipped": skipped,
+                    "recorded": recorded,
+                    "routes": summary,
+                    "caches": caches,
+                }, f, indent=2)
+            print(f"\nResults written to {args.json}")
+        return 0
+    finally:
+        if process:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,180 @@
+"""Redis-protocol stand-in for testing STATE_BACKEND=redis without a server
+
+Implements the RESP2 commands the state backend uses (PING, AUTH, SELECT,
+GET, SET with EX/PX, DEL, EXISTS, TTL, FLUSHDB, DBSIZE, and EVAL of the
+compare-and-delete script behind delete_if) on an in-memory
+dictionary with expiry. Optional latency shows how much a remote state
+store adds to each request.
+
+Usage:
+    python bench/resp_stand_in.py --port 6390
+    STATE_BACKEND=redis REDIS_URL=redis://127.0.0.1:6390/0 python app.py
+"""
+
+import time
+import random
+import argparse
+import threading
+import socketserver
+from typing import Any, Dict, List, Optional, Tuple
+
+class RESPStore:
+    """Key-value store with per-key expiry shared by all connections"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        """Initialize store
+
+        Args:
+            latency_ms: Mean added latency per command in milliseconds
+        """
+        self.latency_ms = latency_ms
+        self._entries: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self._entries.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self._entries[key]
+            return None
+        return entry
+
+    def execute(self, args: List[bytes]) -> Any:
+        """Execute one command
+
+        Returns:
+            Reply value (str for status, int, bytes, None or an Exception)
+        """
+        if self.latency_ms:
+            time.sleep(random.expovariate(1.0 / self.latency_ms) / 1000.0)
+
+        command = args[0].upper() if args else b""
+        with self._lock:
+            if command == b"PING":
+                return args[1] if len(args) > 1 else "PONG"
+            if command in (b"AUTH", b"SELECT", b"CLIENT"):
+                return "OK"
+            if command == b"GET" and len(args) == 2:
+                entry = self._live(args[1])
+                return entry[0] if entry else None
+            if command == b"SET" and len(args) >= 3:
+                expires_at = None
+                options = [arg.upper() for arg in args[3:]]
+                if b"NX" in options and self._live(args[1]):
+                    return None
+                for i, option in enumerate(options[:-1]):
+                    if option == b"EX":
+                        expires_at = time.time() + int(args[4 + i])
+                    elif option == b"PX":
+                        expires_at = time.time() + int(args[4 + i]) / 1000.0
+                self._entries[args[1]] = (args[2], expires_at)
+                return "OK"
+            if command == b"DEL":
+                return sum(1 for key in args[1:] if self._entries.pop(key, None) is not None)
+            if command == b"EVAL" and len(args) == 5 and b'redis.call("get", KEYS[1]) == ARGV[1]' in args[1]:
+                # Compare-and-delete, the only script the state backend runs
+                entry = self._live(args[3])
+                if entry and entry[0] == args[4]:
+                    del self._entries[args[3]]
+                    return 1
+                return 0
+            if command == b"EXISTS":
+                return sum(1 for key in args[1:] if self._live(key))
+            if command == b"TTL" and len(args) == 2:
+                entry = self._live(args[1])
+                if not entry:
+                    return -2
+                return -1 if entry[1] is None else max(0, int(entry[1] - time.time()))
+            if command == b"FLUSHDB":
+                self._entries.clear()
+                return "OK"
+            if command == b"DBSIZE":
+                return len(self._entries)
+        return Exception(f"ERR unknown command '{command.decode('utf-8', 'replace')}'")
+
+def _encode(reply: Any) -> bytes:
+    """Encode a reply in RESP2"""
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return f"-{reply}\r\n".encode("utf-8")
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode("utf-8")
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode("utf-8")
+    return f"${len(reply)}\r\n".encode("utf-8") + reply + b"\r\n"
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    """Reads RESP arrays (and inline commands) and writes replies"""
+
+    def _read_command(self) -> Optional[List[bytes]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, e.g. from telnet or redis-cli in inline mode
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:].strip())):
+            header = self.rfile.readline()
+            if not header.startswith(b"$"):
+                return None
+            length = int(header[1:].strip())
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            try:
+                args = self._read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            if not args:
+                continue
+            if args[0].upper() == b"QUIT":
+                self.wfile.write(b"+OK\r\n")
+                return
+            self.wfile.write(_encode(store.execute(args)))
+
+class RESPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_resp_stand_in(port: int = 0, latency_ms: float = 0.0, host: str = "127.0.0.1") -> RESPServer:
+    """Start the stand-in on a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free port)
+        latency_ms: Mean added latency per command in milliseconds
+        host: Interface to bind
+
+    Returns:
+        The running server (``server.server_address`` has the actual port)
+    """
+    server = RESPServer((host, port), RESPHandler)
+    server.store = RESPStore(latency_ms)
+    threading.Thread(target=server.serve_forever, name="stand-in-resp", daemon=True).start()
+    return server
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run a Redis-protocol stand-in for the state backend")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean added latency per command")
+    args = parser.parse_args(argv)
+
+    server = start_resp_stand_in(args.port, args.latency_ms)
+    host, port = server.server_address[:2]
+    print(f"resp       redis://{host}:{port}/0  latency={args.latency_ms:g}ms")
+    print("Point the app at it with:")
+    print(f"  STATE_BACKEND=redis REDIS_URL=redis://{host}:{port}/0")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
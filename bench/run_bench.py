@@ -0,0 +1,436 @@
+"""Benchmark GuideMind's routes against offline stand-ins
+
+Starts the stand-ins from stand_ins.py, launches the app pointed at them (or
+uses --target to benchmark an already running deployment), then drives the
+real HTTP routes at a fixed concurrency and reports latency percentiles,
+throughput, error rates and the cache hit rates exported on /metrics.
+
+Examples:
+    python bench/run_bench.py --requests 500 --concurrency 16
+    python bench/run_bench.py --mix get-step=5,troubleshoot=3,step-video=2 --anthropic-latency 1500:0.6:0.05
+    python bench/run_bench.py --cold --json results.json
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stand_ins import LatencyModel, add_latency_arguments, start_all
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "load-instructions=1,get-step=6,troubleshoot=2,image-troubleshoot=1,narration=1,step-video=2,help-video=1"
+
+class BenchClient:
+    """Issues the benchmark operations against one GuideMind instance"""
+
+    def __init__(self, base_url: str, timeout: float):
+        """Initialize client
+
+        Args:
+            base_url: Base URL of the app
+            timeout: Per-request timeout in seconds
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.total_steps = 0
+        self.avatar_id = None
+        self.image = _test_png()
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        # One keep-alive session per worker thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _random_step(self) -> int:
+        return random.randrange(max(1, self.total_steps))
+
+    def run(self, operation: str) -> Dict[str, Any]:
+        """Run one operation
+
+        Args:
+            operation: Operation name (see OPERATIONS)
+
+        Returns:
+            Dictionary with op, seconds, ok, degraded and error
+        """
+        started = time.perf_counter()
+        try:
+            response = OPERATIONS[operation](self)
+            seconds = time.perf_counter() - started
+            ok, degraded, error = _classify(response)
+        except requests.RequestException as e:
+            seconds = time.perf_counter() - started
+            ok, degraded, error = False, False, type(e).__name__
+        return {"op": operation, "seconds": seconds, "ok": ok, "degraded": degraded, "error": error}
+
+    def load_instructions(self):
+        response = self.session.post(f"{self.base_url}/load-instructions",
+                                     data={"preloaded_key": "basic_crane"}, timeout=self.timeout)
+        try:
+            self.total_steps = response.json().get("total_steps") or self.total_steps
+        except ValueError:
+            pass
+        return response
+
+    def get_step(self):
+        return self.session.get(f"{self.base_url}/get-step", params={"step": self._random_step()}, timeout=self.timeout)
+
+    def troubleshoot(self):
+        return self.session.get(f"{self.base_url}/troubleshoot", timeout=self.timeout)
+
+    def image_troubleshoot(self):
+        return self.session.post(
+            f"{self.base_url}/api/troubleshoot/image",
+            files={"image": ("bench.png", self.image, "image/png")},
+            data={"description": "The corners do not line up"},
+            timeout=self.timeout
+        )
+
+    def narration(self):
+        return self.session.get(f"{self.base_url}/api/avatar/narration",
+                                params={"kind": "step", "step": self._random_step()}, timeout=self.timeout)
+
+    def step_video(self):
+        return self.session.get(f"{self.base_url}/api/avatar/step-video/{self._random_step()}", timeout=self.timeout)
+
+    def help_video(self):
+        return self.session.post(f"{self.base_url}/api/avatar/help-video", json={}, timeout=self.timeout)
+
+    def welcome_video(self):
+        return self.session.get(f"{self.base_url}/api/avatar/welcome-video", timeout=self.timeout)
+
+    def upload_avatar(self) -> bool:
+        """Upload a generated avatar image so renders don't depend on the sample downloads"""
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/avatar/upload",
+                files={"image": ("bench.png", self.image, "image/png")},
+                data={"name": "Benchmark"},
+                timeout=self.timeout
+            )
+            data = response.json()
+            if data.get("status") != "success":
+                return False
+            self.avatar_id = data["avatar"]["id"]
+            return True
+        except (requests.RequestException, ValueError, KeyError, TypeError):
+            return False
+
+    def scrape_cache_counters(self) -> Dict[str, Dict[str, float]]:
+        """Read guidemind_cache_requests_total from /metrics
+
+        Returns:
+            Dictionary of cache name to {"hit": n, "miss": n}
+        """
+        counters: Dict[str, Dict[str, float]] = defaultdict(lambda: {"hit": 0.0, "miss": 0.0})
+        try:
+            text = self.session.get(f"{self.base_url}/metrics", timeout=self.timeout).text
+        except requests.RequestException:
+            return {}
+
+        pattern = re.compile(r'^guidemind_cache_requests_total\{cache="([^"]+)",result="(hit|miss)"\} ([0-9.e+]+)$')
+        for line in text.splitlines():
+            match = pattern.match(line)
+            if match:
+                counters[match.group(1)][match.group(2)] = float(match.group(3))
+        return dict(counters)
+
+OPERATIONS = {
+    "load-instructions": BenchClient.load_instructions,
+    "get-step": BenchClient.get_step,
+    "troubleshoot": BenchClient.troubleshoot,
+    "image-troubleshoot": BenchClient.image_troubleshoot,
+    "narration": BenchClient.narration,
+    "step-video": BenchClient.step_video,
+    "help-video": BenchClient.help_video,
+    "welcome-video": BenchClient.welcome_video,
+}
+
+def _classify(response: requests.Response):
+    """Decide whether a response succeeded
+
+    Returns:
+        Tuple of (ok, degraded, error)
+    """
+    if response.status_code >= 400:
+        return False, False, f"HTTP {response.status_code}"
+    try:
+        data = response.json()
+    except ValueError:
+        return True, False, None
+    if data.get("success") is False or data.get("status") == "error":
+        return False, False, str(data.get("error") or data.get("message"))[:80]
+    return True, data.get("status") == "degraded", None
+
+def _test_png(size: int = 64) -> bytes:
+    """Build a small grayscale PNG without imaging dependencies"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    rows = b"".join(b"\x00" + bytes((x * 4 + y * 2) % 256 for x in range(size)) for y in range(size))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows))
+            + chunk(b"IEND", b""))
+
+def parse_mix(spec: str) -> List[str]:
+    """Parse ``op=weight,...`` into a weighted list of operations"""
+    weighted = []
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name}; choose from {', '.join(OPERATIONS)}")
+        weighted.extend([name] * int(weight or 1))
+    return weighted
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Compute per-operation and overall statistics"""
+    by_op: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for result in results:
+        by_op[result["op"]].append(result)
+    by_op["all"] = results
+
+    summary = {}
+    for op, op_results in by_op.items():
+        latencies = [r["seconds"] for r in op_results if r["ok"]]
+        errors = defaultdict(int)
+        for r in op_results:
+            if not r["ok"]:
+                errors[r["error"]] += 1
+        summary[op] = {
+            "requests": len(op_results),
+            "ok": len(latencies),
+            "degraded": sum(1 for r in op_results if r["degraded"]),
+            "errors": dict(errors),
+            "throughput": len(op_results) / elapsed if elapsed else 0.0,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else 0.0,
+        }
+    return summary
+
+def cache_hit_rates(before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Hit rates of the lookups made during the run"""
+    rates = {}
+    for cache, counts in after.items():
+        previous = before.get(cache, {"hit": 0.0, "miss": 0.0})
+        hits = counts["hit"] - previous["hit"]
+        misses = counts["miss"] - previous["miss"]
+        if hits + misses:
+            rates[cache] = {"hits": int(hits), "misses": int(misses), "hit_rate": hits / (hits + misses)}
+    return rates
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_app(servers, args) -> Tuple[subprocess.Popen, str]:
+    """Launch the app in a subprocess pointed at the stand-ins
+
+    Returns:
+        Tuple of (process, base URL)
+    """
+    port = args.port or _free_port()
+    anthropic_port = servers["anthropic"].server_address[1]
+    sadtalker_port = servers["sadtalker"].server_address[1]
+    heygen_port = servers["heygen"].server_address[1]
+
+    env = dict(os.environ)
+    env.update({
+        "CLAUDE_API_KEY": "stand-in",
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{anthropic_port}",
+        "SADTALKER_USE_REMOTE": "true",
+        "SADTALKER_API_URL": f"http://127.0.0.1:{sadtalker_port}/generate",
+        "SADTALKER_API_KEY": "stand-in",
+        "AVATAR_BACKENDS": "sadtalker,heygen" if args.heygen else "sadtalker",
+        "VIDEO_POSTPROCESS": "false",
+        "AVATAR_HLS_MODE": "off",
+    })
+    if args.heygen:
+        env.update({"HEYGEN_API_KEY": "stand-in", "HEYGEN_API_URL": f"http://127.0.0.1:{heygen_port}/v1"})
+    else:
+        env.pop("HEYGEN_API_KEY", None)
+    if args.cold:
+        env["GUIDEMIND_CACHE_DIR"] = tempfile.mkdtemp(prefix="guidemind-bench-")
+
+    command = [sys.executable, "-c",
+               f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)"]
+    log = open(args.app_log, "w") if args.app_log else subprocess.DEVNULL
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}"
+
+def wait_until_ready(base_url: str, timeout: float, process: Optional[subprocess.Popen] = None) -> bool:
+    """Poll /api/ready until the app reports ready"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process and process.poll() is not None:
+            return False
+        try:
+            if requests.get(f"{base_url}/api/ready", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+def run_load(client: BenchClient, mix: List[str], concurrency: int, total: int, duration: float) -> Tuple[List[Dict[str, Any]], float]:
+    """Drive the app with a closed-loop workload
+
+    Each worker issues its next request as soon as the previous one returns,
+    until ``total`` requests are done or ``duration`` seconds have passed.
+
+    Returns:
+        Tuple of (results, elapsed seconds)
+    """
+    results = []
+    lock = threading.Lock()
+    issued = [0]
+    started = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock:
+                if (total and issued[0] >= total) or (duration and time.perf_counter() - started >= duration):
+                    return
+                issued[0] += 1
+            result = client.run(random.choice(mix))
+            with lock:
+                results.append(result)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+
+    return results, time.perf_counter() - started
+
+def print_report(summary: Dict[str, Any], caches: Dict[str, Dict[str, float]], elapsed: float, concurrency: int):
+    """Print results as tables"""
+    print(f"\n{summary['all']['requests']} requests in {elapsed:.1f}s at concurrency {concurrency}\n")
+    print(f"{'route':20s} {'reqs':>6s} {'ok':>6s} {'degr':>5s} {'err':>5s} {'req/s':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    for op in sorted(summary, key=lambda op: (op == "all", op)):
+        stats = summary[op]
+        print(f"{op:20s} {stats['requests']:6d} {stats['ok']:6d} {stats['degraded']:5d} "
+              f"{sum(stats['errors'].values()):5d} {stats['throughput']:7.2f} "
+              f"{stats['p50'] * 1000:8.0f} {stats['p95'] * 1000:8.0f} {stats['p99'] * 1000:8.0f}")
+
+    errors = {(op, error): count for op, stats in summary.items() if op != "all" for error, count in stats["errors"].items()}
+    if errors:
+        print("\nErrors:")
+        for (op, error), count in sorted(errors.items(), key=lambda item: -item[1]):
+            print(f"  {op:20s} {count:5d}  {error}")
+
+    if caches:
+        print(f"\n{'cache':20s} {'hits':>7s} {'misses':>7s} {'hit rate':>9s}")
+        for cache, stats in sorted(caches.items()):
+            print(f"{cache:20s} {stats['hits']:7d} {stats['misses']:7d} {stats['hit_rate']:9.1%}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark GuideMind routes against offline stand-ins")
+    parser.add_argument("--target", help="Benchmark a running app at this URL instead of launching one")
+    parser.add_argument("--port", type=int, default=0, help="Port for the launched app (default: a free port)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default 8)")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests (default 200; 0 = use --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Run for this many seconds instead")
+    parser.add_argument("--warmup", type=int, default=0, help="Requests to issue before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted operations (default {DEFAULT_MIX})")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--cold", action="store_true", help="Start the app with an empty content cache")
+    parser.add_argument("--heygen", action="store_true", help="Enable the HeyGen backend (stand-in) alongside SadTalker")
+    parser.add_argument("--app-log", help="Write the launched app's output to this file")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument("--seed", type=int, help="Random seed for the operation mix")
+    add_latency_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    mix = parse_mix(args.mix)
+
+    process = None
+    if args.target:
+        base_url = args.target
+    else:
+        servers = start_all(
+            LatencyModel.parse(args.anthropic_latency),
+            LatencyModel.parse(args.sadtalker_latency),
+            LatencyModel.parse(args.heygen_latency),
+        )
+        for name, server in servers.items():
+            print(f"Stand-in {name}: port {server.server_address[1]} ({server.stand_in['latency']})")
+        process, base_url = start_app(servers, args)
+
+    try:
+        print(f"Waiting for {base_url} ...")
+        if not wait_until_ready(base_url, 120, process):
+            print("App did not become ready (use --app-log to see its output)")
+            return 1
+
+        client = BenchClient(base_url, args.timeout)
+        client.load_instructions()
+        if not client.total_steps:
+            print("Could not load instructions")
+            return 1
+        if any(op.endswith("video") for op in mix) and not client.upload_avatar():
+            print("Warning: avatar upload failed; video routes will degrade")
+
+        if args.warmup:
+            run_load(client, mix, args.concurrency, args.warmup, 0)
+
+        before = client.scrape_cache_counters()
+        results, elapsed = run_load(client, mix, args.concurrency, args.requests, args.duration)
+        caches = cache_hit_rates(before, client.scrape_cache_counters())
+
+        summary = summarize(results, elapsed)
+        print_report(summary, caches, elapsed, args.concurrency)
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({
+                    "config": {key: value for key, value in vars(args).items() if key != "json"},
+                    "elapsed": elapsed,
+                    "routes": summary,
+                    "caches": caches,
+                }, f, indent=2)
+            print(f"\nResults written to {args.json}")
+        return 0
+    finally:
+        if process:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,207 @@
+"""S3-compatible stand-in for testing MEDIA_STORE=s3 without a bucket
+
+A MinIO-style object server with path-style addressing
+(``/<bucket>/<key>``): PUT, GET (with single byte ranges, so browsers can
+seek in redirected videos), HEAD and DELETE. Requests must be signed with
+AWS Signature V4, in the Authorization header or as a presigned URL, using
+the configured credentials (MinIO's defaults unless overridden). Objects
+are kept in memory.
+
+Usage:
+    python bench/s3_stand_in.py --port 9000
+    MEDIA_STORE=s3 MEDIA_STORE_S3_BUCKET=guidemind MEDIA_STORE_S3_ENDPOINT=http://127.0.0.1:9000 \\
+        AWS_ACCESS_KEY_ID=minioadmin AWS_SECRET_ACCESS_KEY=minioadmin python app.py
+"""
+
+import re
+import hmac
+import time
+import calendar
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qsl, quote
+
+CREDENTIAL = re.compile(r"Credential=([^/]+)/(\d{8})/([^/]+)/s3/aws4_request")
+
+def _signing_key(secret_key: str, date: str, region: str) -> bytes:
+    key = f"AWS4{secret_key}".encode("utf-8")
+    for part in (date, region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+    return key
+
+class S3Handler(BaseHTTPRequestHandler):
+    """Path-style object API backed by ``server.objects``"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: Dict[str, str] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if "Content-Length" not in (headers or {}):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status: int, code: str):
+        body = f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>{code}</Code></Error>".encode("utf-8")
+        self._send(status, body, {"Content-Type": "application/xml"})
+
+    def _authorized(self, payload_hash: str) -> bool:
+        """Verify the request's AWS Signature V4"""
+        parsed = urlparse(self.path)
+        query = parse_qsl(parsed.query, keep_blank_values=True)
+        params = dict(query)
+        authorization = self.headers.get("Authorization", "")
+
+        if "X-Amz-Signature" in params:
+            credential, amz_date = params.get("X-Amz-Credential", ""), params.get("X-Amz-Date", "")
+            signed_headers = params.get("X-Amz-SignedHeaders", "host").split(";")
+            signature = params["X-Amz-Signature"]
+            query = [(k, v) for k, v in query if k != "X-Amz-Signature"]
+            payload_hash = "UNSIGNED-PAYLOAD"
+            try:
+                signed_at = calendar.timegm(time.strptime(amz_date, "%Y%m%dT%H%M%SZ"))
+                expired = time.time() > signed_at + int(params.get("X-Amz-Expires", "0"))
+            except ValueError:
+                return False
+            if expired:
+                return False
+        elif authorization.startswith("AWS4-HMAC-SHA256 "):
+            fields = dict(part.strip().split("=", 1) for part in authorization[len("AWS4-HMAC-SHA256 "):].split(","))
+            credential = fields.get("Credential", "")
+            signed_headers = fields.get("SignedHeaders", "").split(";")
+            signature = fields.get("Signature", "")
+            amz_date = self.headers.get("x-amz-date", "")
+            payload_hash = self.headers.get("x-amz-content-sha256", payload_hash)
+        else:
+            return False
+
+        match = CREDENTIAL.match(f"Credential={credential}")
+        if not match or match.group(1) != self.server.access_key:
+            return False
+
+        canonical_query = "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in sorted(query))
+        canonical_headers = "".join(f"{name}:{(self.headers.get(name) or '').strip()}\n" for name in signed_headers)
+        canonical_request = "\n".join([
+            self.command, parsed.path, canonical_query, canonical_headers, ";".join(signed_headers), payload_hash
+        ])
+        scope = f"{match.group(2)}/{match.group(3)}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        ])
+        expected = hmac.new(
+            _signing_key(self.server.secret_key, match.group(2), match.group(3)),
+            string_to_sign.encode("utf-8"), hashlib.sha256
+        ).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    def _object_key(self) -> Optional[Tuple[str, str]]:
+        path = urlparse(self.path).path
+        bucket, _, key = path.lstrip("/").partition("/")
+        return (bucket, key) if bucket and key else None
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if not self._authorized(hashlib.sha256(body).hexdigest()):
+            self._error(403, "SignatureDoesNotMatch")
+            return
+
+        target = self._object_key()
+        if not target:
+            self._error(400, "InvalidRequest")
+            return
+
+        objects, lock = self.server.objects, self.server.lock
+        if self.command == "PUT":
+            with lock:
+                objects[target] = (body, self.headers.get("Content-Type", "application/octet-stream"))
+            self._send(200, headers={"ETag": f"\"{hashlib.md5(body).hexdigest()}\""})
+            return
+
+        if self.command == "DELETE":
+            with lock:
+                objects.pop(target, None)
+            self._send(204)
+            return
+
+        with lock:
+            stored = objects.get(target)
+        if not stored:
+            self._error(404, "NoSuchKey")
+            return
+
+        data, content_type = stored
+        headers = {"Content-Type": content_type, "Accept-Ranges": "bytes", "ETag": f"\"{hashlib.md5(data).hexdigest()}\""}
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), len(data) - 1) if match.group(2) else len(data) - 1
+            else:
+                start, end = max(0, len(data) - int(match.group(2))), len(data) - 1
+            if start >= len(data) or start > end:
+                self._send(416, headers={"Content-Range": f"bytes */{len(data)}"})
+                return
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            headers["Content-Length"] = str(end - start + 1)
+            self._send(206, data[start:end + 1], headers)
+            return
+
+        headers["Content-Length"] = str(len(data))
+        self._send(200, data, headers)
+
+    do_GET = do_HEAD = do_PUT = do_DELETE = _handle
+
+def start_s3_stand_in(port: int = 0, access_key: str = "minioadmin", secret_key: str = "minioadmin",
+                      host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Start the stand-in on a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free port)
+        access_key: Access key clients must sign with
+        secret_key: Secret key clients must sign with
+        host: Interface to bind
+
+    Returns:
+        The running server (``server.server_address`` has the actual port)
+    """
+    server = ThreadingHTTPServer((host, port), S3Handler)
+    server.daemon_threads = True
+    server.access_key = access_key
+    server.secret_key = secret_key
+    server.objects = {}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name="stand-in-s3", daemon=True).start()
+    return server
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run an S3-compatible stand-in for the media store")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--access-key", default="minioadmin")
+    parser.add_argument("--secret-key", default="minioadmin")
+    args = parser.parse_args(argv)
+
+    server = start_s3_stand_in(args.port, args.access_key, args.secret_key)
+    host, port = server.server_address[:2]
+    print(f"s3         http://{host}:{port}  (any bucket, path-style)")
+    print("Point the app at it with:")
+    print(f"  MEDIA_STORE=s3 MEDIA_STORE_S3_BUCKET=guidemind MEDIA_STORE_S3_ENDPOINT=http://{host}:{port}")
+    print(f"  AWS_ACCESS_KEY_ID={args.access_key} AWS_SECRET_ACCESS_KEY={args.secret_key}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
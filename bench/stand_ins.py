@@ -0,0 +1,298 @@
+"""Offline stand-ins for the external services GuideMind calls
+
+Each stand-in is a small threaded HTTP server that mimics the parts of the
+real API the app uses, with a configurable latency distribution and error
+rate:
+
+- Anthropic: POST /v1/messages
+- SadTalker remote API: POST to any path, returns base64 ``video_data``
+- HeyGen: /v1/user_info, /v1/avatar.list, /v1/voice.list,
+  /v1/video.generate, /v1/video.status and the rendered video files
+
+Latency is log-normal, given as ``median_ms[:sigma[:error_rate]]`` (e.g.
+``800:0.5:0.02``); for HeyGen it is the render time reported through
+video.status, while API calls themselves answer quickly.
+
+Usage (standalone, e.g. to point a manually started app at them):
+    python bench/stand_ins.py --anthropic-port 8101 --sadtalker-port 8102 --heygen-port 8103
+"""
+
+import json
+import math
+import time
+import base64
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+from urllib.parse import urlparse, parse_qs
+
+class LatencyModel:
+    """Log-normal latency with an error rate"""
+
+    def __init__(self, median_ms: float, sigma: float = 0.5, error_rate: float = 0.0):
+        """Initialize latency model
+
+        Args:
+            median_ms: Median latency in milliseconds
+            sigma: Log-normal shape (0 = constant latency; 0.5 gives p95 ~2.3x median)
+            error_rate: Fraction of requests that fail
+        """
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """Parse ``median_ms[:sigma[:error_rate]]``"""
+        parts = [float(part) for part in spec.split(":")]
+        return cls(*parts)
+
+    def sample(self) -> float:
+        """Sample a latency in seconds"""
+        return self.median_ms * math.exp(random.gauss(0, self.sigma)) / 1000.0
+
+    def fails(self) -> bool:
+        """Decide whether this request fails"""
+        return random.random() < self.error_rate
+
+    def __repr__(self):
+        return f"median={self.median_ms:.0f}ms sigma={self.sigma} errors={self.error_rate:.1%}"
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Base handler with JSON helpers; ``server.stand_in`` holds the config"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            return {}
+
+    def _send_json(self, status: int, payload: Any):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_bytes(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self) -> bool:
+        """Sleep for a sampled latency; returns False if the request should fail"""
+        latency = self.server.stand_in["latency"]
+        time.sleep(latency.sample())
+        return not latency.fails()
+
+def _fake_text(prompt: str, words: int) -> str:
+    """Build a deterministic reply of roughly the given length"""
+    seed = sum(prompt.encode("utf-8")) % 97
+    vocabulary = ["fold", "crease", "corner", "edge", "paper", "align", "press", "gently", "center", "line", "flip", "open"]
+    return " ".join(vocabulary[(seed + i * 7) % len(vocabulary)] for i in range(words)).capitalize() + "."
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class AnthropicHandler(_StandInHandler):
+    """Stand-in for the Anthropic Messages API"""
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        request = self._read_json()
+
+        if not self._delay():
+            self._send_json(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded (stand-in)"}})
+            return
+
+        if path.endswith("/v1/messages"):
+            prompt = json.dumps(request.get("messages", []))[:2000]
+            if "Parse these origami instructions" in prompt:
+                text = "\n".join(f"{i}. {_fake_text(prompt + str(i), 10)}" for i in range(1, 11))
+            else:
+                text = _fake_text(prompt, min(int(request.get("max_tokens", 300)), 120))
+            self._send_json(200, {
+                "id": f"msg_standin_{random.getrandbits(32):08x}",
+                "type": "message",
+                "role": "assistant",
+                "model": request.get("model"),
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": _estimate_tokens(prompt), "output_tokens": _estimate_tokens(text)},
+            })
+            return
+
+        self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": path}})
+
+class SadTalkerHandler(_StandInHandler):
+    """Stand-in for the SadTalker remote API"""
+
+    def do_POST(self):
+        request = self._read_json()
+
+        if not self._delay():
+            self._send_json(500, {"error": "Render failed (stand-in)"})
+            return
+
+        if not request.get("source_image") or not request.get("audio_data"):
+            self._send_json(400, {"error": "source_image and audio_data are required"})
+            return
+
+        self._send_json(200, {"video_data": base64.b64encode(self.server.stand_in["video"]).decode("ascii")})
+
+class HeyGenHandler(_StandInHandler):
+    """Stand-in for the HeyGen v1 API"""
+
+    def _api_delay(self):
+        # Metadata and submission calls are fast; renders take the sampled latency
+        time.sleep(random.uniform(0.02, 0.08))
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        state = self.server.stand_in
+
+        if path.startswith("/videos/"):
+            self._send_bytes(200, state["video"], "video/mp4")
+            return
+
+        self._api_delay()
+
+        if path.endswith("/user_info"):
+            self._send_json(200, {"data": {"username": "stand-in"}})
+        elif path.endswith("/avatar.list"):
+            self._send_json(200, {"data": {"avatars": [
+                {"avatar_id": "standin_avatar_1", "avatar_name": "Stand-in One"},
+                {"avatar_id": "standin_avatar_2", "avatar_name": "Stand-in Two"},
+            ]}})
+        elif path.endswith("/voice.list"):
+            self._send_json(200, {"data": {"voices": [
+                {"voice_id": "standin_voice_en", "language": "English", "display_name": "Stand-in"},
+            ]}})
+        elif path.endswith("/video.status"):
+            video_id = parse_qs(parsed.query).get("video_id", [""])[0]
+            with state["lock"]:
+                job = state["jobs"].get(video_id)
+            if not job:
+                self._send_json(404, {"error": "Unknown video"})
+            elif time.time() < job["ready_at"]:
+                self._send_json(200, {"data": {"status": "processing"}})
+            elif job["failed"]:
+                self._send_json(200, {"data": {"status": "failed"}})
+            else:
+                host = self.headers.get("Host")
+                self._send_json(200, {"data": {"status": "completed", "video_url": f"http://{host}/videos/{video_id}.mp4"}})
+        else:
+            self._send_json(404, {"error": path})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        state = self.server.stand_in
+        self._read_json()
+        self._api_delay()
+
+        if not path.endswith("/video.generate"):
+            self._send_json(404, {"error": path})
+            return
+
+        latency = state["latency"]
+        video_id = f"standin_{random.getrandbits(48):012x}"
+        with state["lock"]:
+            state["jobs"][video_id] = {"ready_at": time.time() + latency.sample(), "failed": latency.fails()}
+        self._send_json(200, {"data": {"video_id": video_id}})
+
+# Rendered "video" returned by the stand-ins; the app only stores and serves
+# the bytes (post-processing is disabled for benchmarks), so a playable MP4
+# is not needed
+PLACEHOLDER_VIDEO = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom" + b"\x00" * 4096
+
+def start_stand_in(handler, port: int, latency: LatencyModel, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Start a stand-in server on a background thread
+
+    Args:
+        handler: Handler class (AnthropicHandler, SadTalkerHandler or HeyGenHandler)
+        port: Port to listen on (0 picks a free port)
+        latency: Latency model
+        host: Interface to bind
+
+    Returns:
+        The running server (``server.server_address`` has the actual port)
+    """
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stand_in = {
+        "latency": latency,
+        "video": PLACEHOLDER_VIDEO,
+        "jobs": {},
+        "lock": threading.Lock(),
+    }
+    threading.Thread(target=server.serve_forever, name=f"stand-in-{handler.__name__}", daemon=True).start()
+    return server
+
+def start_all(anthropic: LatencyModel, sadtalker: LatencyModel, heygen: LatencyModel,
+              ports: Tuple[int, int, int] = (0, 0, 0)) -> Dict[str, ThreadingHTTPServer]:
+    """Start all stand-ins
+
+    Returns:
+        Dictionary of servers by service name
+    """
+    return {
+        "anthropic": start_stand_in(AnthropicHandler, ports[0], anthropic),
+        "sadtalker": start_stand_in(SadTalkerHandler, ports[1], sadtalker),
+        "heygen": start_stand_in(HeyGenHandler, ports[2], heygen),
+    }
+
+def add_latency_arguments(parser: argparse.ArgumentParser):
+    """Add the stand-in latency options to an argument parser"""
+    parser.add_argument("--anthropic-latency", default="900:0.4:0.0",
+                        help="Anthropic latency as median_ms[:sigma[:error_rate]] (default 900:0.4:0.0)")
+    parser.add_argument("--sadtalker-latency", default="8000:0.3:0.0",
+                        help="SadTalker render latency (default 8000:0.3:0.0)")
+    parser.add_argument("--heygen-latency", default="20000:0.3:0.0",
+                        help="HeyGen render latency (default 20000:0.3:0.0)")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run offline stand-ins for Anthropic, SadTalker and HeyGen")
+    parser.add_argument("--anthropic-port", type=int, default=8101)
+    parser.add_argument("--sadtalker-port", type=int, default=8102)
+    parser.add_argument("--heygen-port", type=int, default=8103)
+    add_latency_arguments(parser)
+    args = parser.parse_args(argv)
+
+    servers = start_all(
+        LatencyModel.parse(args.anthropic_latency),
+        LatencyModel.parse(args.sadtalker_latency),
+        LatencyModel.parse(args.heygen_latency),
+        ports=(args.anthropic_port, args.sadtalker_port, args.heygen_port),
+    )
+    for name, server in servers.items():
+        host, port = server.server_address[:2]
+        print(f"{name:10s} http://{host}:{port}  {server.stand_in['latency']}")
+
+    print("Point the app at them with:")
+    print(f"  ANTHROPIC_BASE_URL=http://127.0.0.1:{servers['anthropic'].server_address[1]}")
+    print(f"  SADTALKER_API_URL=http://127.0.0.1:{servers['sadtalker'].server_address[1]}/generate SADTALKER_API_KEY=stand-in")
+    print(f"  HEYGEN_API_URL=http://127.0.0.1:{servers['heygen'].server_address[1]}/v1 HEYGEN_API_KEY=stand-in")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,90 @@
+import re
+import difflib
+from typing import Optional
+
+# Hand-written content for the preloaded crane manual, shared by the demos and
+# used by the main app as a fallback when the LLM misses its latency budget.
+# Keys are step texts without their numbering.
+
+CRANE_EXPLANATIONS = {
+    "Start with a square piece of paper, colored side down.": 
+        "Begin with a perfectly square sheet of origami paper. If you're using paper that's colored on one side, place it on your work surface with the colored side facing down (white side up). This ensures the colored side will show on the outside of your finished crane.",
+    
+    "Fold the paper in half diagonally to form a triangle.":
+        "Take the bottom right corner of the square and fold it up to the top left corner, creating a diagonal fold that divides the square into a triangle. Make sure the edges align perfectly, then crease the fold firmly by running your finger along it.",
+    
+    "Fold the triangle in half to form a smaller triangle.":
+        "Take the right point of your triangle and fold it over to meet the left point, creating a smaller triangle. Again, make sure the edges align perfectly before creasing the fold firmly.",
+    
+    "Open the paper up to the first triangle.":
+        "Carefully unfold the paper back to the larger triangle shape from step 2. You should still see the crease from step 3 running from the top point to the middle of the base.",
+    
+    "Fold the corners of the triangle to the center point.":
+        "Take both the left and right corners of the triangle and fold them inward so their points meet at the top point of the triangle. The paper will now resemble a diamond shape or a kite.",
+    
+    "Turn the paper over.":
+        "Carefully flip the entire model over from left to right, keeping all your creases intact. The model should still look like a diamond shape.",
+    
+    "Fold the corners to the center again.":
+        "Similar to step 5, take the left and right corners of the diamond and fold them inward so they meet at the center crease. This will create a narrower diamond shape.",
+    
+    "Fold the bottom edges to the center line.":
+        "Take the bottom flaps on both sides and fold them upward along the center line. These will form the wings of your crane later.",
+    
+    "Fold the paper in half backward along the center line.":
+        "Fold the entire model in half backward (away from you) along the vertical center line. The folded wings should be on the outside of this fold.",
+    
+    "Pull the wings up and press the body down to form a crane.":
+        "Hold the bottom point (which will become the crane's tail) and the top point (which will become the head). Gently pull them apart while pressing down on the middle section. As you do this, the wings will naturally rise up on the sides. Shape the head by folding the very tip down, and adjust the wings to the desired angle."
+}
+
+CRANE_TROUBLESHOOTING = {
+    "Start with a square piece of paper, colored side down.": 
+        "Common mistakes:\n- Using rectangular paper instead of square\n- Starting with colored side up\n\nCheck if correct:\n- Paper should be perfectly square (all sides equal)\n- White/plain side should be facing up\n\nRemediation:\n- If using printer paper, fold one corner to the opposite edge and cut off excess\n- Flip the paper if the colored side is facing up\n\nConfirmation check:\n- Place paper on flat surface and ensure all corners line up",
+    
+    "Fold the paper in half diagonally to form a triangle.": 
+        "Common mistakes:\n- Folding horizontally or vertically instead of diagonally\n- Not aligning corners precisely\n\nCheck if correct:\n- You should have a perfect triangle\n- The fold should run from one corner to the opposite corner\n\nRemediation:\n- Unfold and try again, making sure to bring one corner directly to the opposite corner\n- Smooth out the paper and ensure it's flat before folding\n\nConfirmation check:\n- The triangle should have two equal sides",
+}
+
+def _normalize(step_text: str) -> str:
+    """Normalize a step for lookup (no numbering, case or trailing punctuation)"""
+    text = re.sub(r"^\s*(step\s*)?\d+[.):]?\s*", "", step_text.strip(), flags=re.IGNORECASE)
+    return re.sub(r"\s+", " ", text).strip(" .").lower()
+
+def _lookup(content: dict, step_text: str) -> Optional[str]:
+    """Find canned content for a step
+
+    Parsed manuals don't always reproduce the original wording, so close
+    matches count as well.
+
+    Args:
+        content: Dictionary of step text to content
+        step_text: Step to look up
+
+    Returns:
+        Content for the step, or None
+    """
+    if not step_text:
+        return None
+    normalized = {_normalize(step): text for step, text in content.items()}
+    step = _normalize(step_text)
+    if step in normalized:
+        return normalized[step]
+    matches = difflib.get_close_matches(step, normalized.keys(), n=1, cutoff=0.85)
+    return normalized[matches[0]] if matches else None
+
+def canned_explanation(step_text: str) -> Optional[str]:
+    """Get the hand-written explanation of a step, if there is one"""
+    return _lookup(CRANE_EXPLANATIONS, step_text)
+
+def canned_troubleshooting(step_text: str) -> Optional[str]:
+    """Get hand-written troubleshooting advice for a step, if there is one"""
+    return _lookup(CRANE_TROUBLESHOOTING, step_text)
+
+def generic_explanation(step_text: str) -> str:
+    """Get a short explanation that works for any step"""
+    return f"Here's how to do this step: {step_text} Make sure to crease all folds firmly and keep your work neat."
+
+def generic_troubleshooting(step_text: str) -> str:
+    """Get troubleshooting advice that works for any step"""
+    return f"If you're having trouble with '{step_text}', try the following:\n\n1. Check that your previous folds are accurate\n2. Make sure your paper is properly aligned\n3. Use your fingernail to make crisp, clean folds\n4. If necessary, start over with a new piece of paper"
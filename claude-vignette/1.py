@@ -1,7 +1,12 @@
 import anthropic
 import os
+import sys
 from dotenv import load_dotenv
 
+# Share the model policy with the main app (one directory up)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_policy import model_policy, not_truncated
+
 load_dotenv()  # 👈 Load the .env before anything else
 
 
@@ -16,13 +21,17 @@ goal = "Make a simple ham and cheese sandwich."
 # ---- Step 1: Ask CLAUDE 1 (Planner) ----
 
 def ask_planner(goal):
-    response = client.messages.create(
-        model="claude-3-opus-20240229",
-        max_tokens=500,
-        temperature=0,
-        messages=[
-            {"role": "user", "content": f"You are a planning expert. Break down this goal into 3-5 simple, clear steps.\n\nGoal: {goal}"}
-        ]
+    response = model_policy.run(
+        "planner",
+        lambda model, max_tokens: client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0,
+            messages=[
+                {"role": "user", "content": f"You are a planning expert. Break down this goal into 3-5 simple, clear steps.\n\nGoal: {goal}"}
+            ]
+        ),
+        not_truncated
     )
     steps = response.content[0].text
     return steps
@@ -30,13 +39,17 @@ def ask_planner(goal):
 # ---- Step 2: Ask CLAUDE 2 (Executor) ----
 
 def ask_executor(step):
-    response = client.messages.create(
-        model="claude-3-opus-20240229",
-        max_tokens=300,
-        temperature=0,
-        messages=[
-            {"role": "user", "content": f"You are a code execution expert. Explain exactly how to perform this step:\n\nStep: {step}"}
-        ]
+    response = model_policy.run(
+        "executor",
+        lambda model, max_tokens: client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0,
+            messages=[
+                {"role": "user", "content": f"You are a code execution expert. Explain exactly how to perform this step:\n\nStep: {step}"}
+            ]
+        ),
+        not_truncated
     )
     execution = response.content[0].text
     return execution
@@ -1,58 +1,137 @@
 import anthropic
+import argparse
+import asyncio
 import os
+import sys
 from dotenv import load_dotenv
 import time
 
+# Share the model policy with the main app (one directory up)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_policy import model_policy, not_truncated
+
 # Load environment variables
 load_dotenv()
 
-# Initialize Anthropic client
+# Initialize Anthropic client (concurrent runs open their own async one)
 client = anthropic.Anthropic(
     api_key=os.getenv("CLAUDE_API_KEY")
 )
 
+# Most executor calls in flight at once in concurrent mode
+EXECUTOR_CONCURRENCY = int(os.getenv("EXECUTOR_CONCURRENCY", "4"))
+
 # Logging helper
 def log(role, message):
     print(f"\n[{role.upper()}] {message}\n{'-'*40}")
 
 # Agent 1: Planner
 def planner_agent(goal):
-    response = client.messages.create(
-        model="claude-3-opus-20240229",
-        max_tokens=500,
-        temperature=0,
-        messages=[
-            {"role": "user", "content": f"You are a planning expert. Break down this goal into 3-5 clear steps.\n\nGoal: {goal}"}
-        ]
+    response = model_policy.run(
+        "planner",
+        lambda model, max_tokens: client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0,
+            messages=[
+                {"role": "user", "content": f"You are a planning expert. Break down this goal into 3-5 clear steps.\n\nGoal: {goal}"}
+            ]
+        ),
+        not_truncated
     )
     plan = response.content[0].text
     log("planner", plan)
     return plan
 
+def _executor_messages(step):
+    return [
+        {"role": "user", "content": f"You are a detailed execution expert. Explain exactly how to perform this step:\n\nStep: {step}"}
+    ]
+
 # Agent 2: Executor
 def executor_agent(step):
-    response = client.messages.create(
-        model="claude-3-opus-20240229",
-        max_tokens=300,
-        temperature=0,
-        messages=[
-            {"role": "user", "content": f"You are a detailed execution expert. Explain exactly how to perform this step:\n\nStep: {step}"}
-        ]
+    response = model_policy.run(
+        "executor",
+        lambda model, max_tokens: client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0,
+            messages=_executor_messages(step)
+        ),
+        not_truncated
     )
     execution = response.content[0].text
     log("executor", execution)
     return execution
 
+# Agent 2, async: same call on the given async client; the caller logs the result
+async def executor_agent_async(step, async_client):
+    response = await model_policy.arun(
+        "executor",
+        lambda model, max_tokens: async_client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0,
+            messages=_executor_messages(step)
+        ),
+        not_truncated
+    )
+    return response.content[0].text
+
+def plan_steps(plan):
+    return [line for line in plan.split("\n") if line.strip()]
+
 # Orchestration: Manage context
 def orchestrate(goal):
     plan = planner_agent(goal)
-    steps = [line for line in plan.split("\n") if line.strip()]
-    
+    steps = plan_steps(plan)
+
     for idx, step in enumerate(steps, 1):
         log("system", f"Executing Step {idx}: {step}")
         executor_agent(step)
-        time.sleep(1)  # Simulate "thinking time" for fun
+
+# Concurrent orchestration: each executor call sees only its own step, so
+# the steps are independent and can all run at once (bounded by the
+# semaphore). Results are printed in plan order as soon as each one and
+# everything before it is done, so the whole plan takes about as long as
+# its slowest step rather than the sum of all of them.
+async def orchestrate_concurrent(goal, max_concurrency=EXECUTOR_CONCURRENCY):
+    plan = planner_agent(goal)
+    steps = plan_steps(plan)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    started = time.perf_counter()
+
+    # One async client per run, closed when the run ends, so the function
+    # can be called again in the same process
+    async with anthropic.AsyncAnthropic(api_key=os.getenv("CLAUDE_API_KEY")) as async_client:
+        async def execute(step):
+            async with semaphore:
+                return await executor_agent_async(step, async_client)
+
+        tasks = [asyncio.create_task(execute(step)) for step in steps]
+        try:
+            for idx, (step, task) in enumerate(zip(steps, tasks), 1):
+                try:
+                    execution = await task
+                except Exception as e:
+                    log("system", f"Step {idx} failed: {e}")
+                    continue
+                log("system", f"Step {idx} ({time.perf_counter() - started:.1f}s): {step}")
+                log("executor", execution)
+        finally:
+            # Stop the remaining calls if the run is interrupted
+            for task in tasks:
+                task.cancel()
 
 if __name__ == "__main__":
-    GOAL = "Make a ham and cheese sandwich."
-    orchestrate(GOAL)
+    parser = argparse.ArgumentParser(description="Plan a goal and execute its steps")
+    parser.add_argument("goal", nargs="?", default="Make a ham and cheese sandwich.")
+    parser.add_argument("--concurrent", action="store_true", help="Execute the steps concurrently")
+    parser.add_argument("--max-concurrency", type=int, default=EXECUTOR_CONCURRENCY,
+                        help="Most executor calls in flight at once (with --concurrent)")
+    args = parser.parse_args()
+
+    if args.concurrent:
+        asyncio.run(orchestrate_concurrent(args.goal, args.max_concurrency))
+    else:
+        orchestrate(args.goal)
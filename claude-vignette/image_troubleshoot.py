@@ -1,9 +1,14 @@
 import anthropic
 import os
+import sys
 import base64
 from flask import Flask, request, render_template, jsonify
 from dotenv import load_dotenv
 
+# Share the model policy with the main app (one directory up)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_policy import model_policy, not_truncated
+
 # Load environment variables
 load_dotenv()
 
@@ -56,29 +61,33 @@ def troubleshoot():
     base64_image = encode_image(image_path)
     
     # Prepare the Claude message with the image
-    response = client.messages.create(
-        model="claude-3-opus-20240229",
-        max_tokens=1000,
-        temperature=0.2,
-        messages=[
-            {
-                "role": "user", 
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/jpeg",
-                            "data": base64_image
+    response = model_policy.run(
+        "vision_troubleshoot",
+        lambda model, max_tokens: client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0.2,
+            messages=[
+                {
+                    "role": "user", 
+                    "content": [
+                        {
+                            "type": "image",
+                            "source": {
+                                "type": "base64",
+                                "media_type": "image/jpeg",
+                                "data": base64_image
+                            }
+                        },
+                        {
+                            "type": "text",
+                            "text": f"I'm trying to follow origami instructions but I'm stuck at '{current_step}'. Here's a photo of my current progress. {user_description}. Can you identify what I might be doing wrong and how to fix it? Please provide clear, specific guidance."
                         }
-                    },
-                    {
-                        "type": "text",
-                        "text": f"I'm trying to follow origami instructions but I'm stuck at '{current_step}'. Here's a photo of my current progress. {user_description}. Can you identify what I might be doing wrong and how to fix it? Please provide clear, specific guidance."
-                    }
-                ]
-            }
-        ]
+                    ]
+                }
+            ]
+        ),
+        not_truncated
     )
     
     # Extract the troubleshooting advice
@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+from typing import Any, Optional
+from metrics import record_cache
+
+# Shared cache directory; point several processes or deployments at the same
+# directory to share generated content
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+def get_cache_dir() -> str:
+    """Get the shared cache directory
+
+    Returns:
+        Path from GUIDEMIND_CACHE_DIR or the default ``cache`` directory
+    """
+    return os.getenv("GUIDEMIND_CACHE_DIR", "").strip() or DEFAULT_CACHE_DIR
+
+def make_key(*parts: Any) -> str:
+    """Build a content key from the given parts
+
+    Args:
+        parts: Values that together identify the content (prompt, model, ...)
+
+    Returns:
+        Hex-encoded SHA-256 digest of the JSON-encoded parts
+    """
+    data = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+class ContentCache:
+    """Disk-backed cache for generated text content
+
+    Values are stored as one JSON file per key under
+    ``<cache_dir>/<namespace>/<key[:2]>/<key>.json``. Writes go through a
+    temporary file and a rename, so several processes (the web app and the
+    prebake CLI) can share one directory safely.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        """Initialize content cache
+
+        Args:
+            cache_dir: Root directory for cached content (optional, resolved
+                from the environment on each access if omitted)
+        """
+        self._cache_dir = cache_dir
+
+    @property
+    def cache_dir(self) -> str:
+        """Root directory for cached content"""
+        return self._cache_dir or get_cache_dir()
+
+    def path_for(self, namespace: str, key: str, extension: str = ".json") -> str:
+        """Get the file path for a cache entry
+
+        Args:
+            namespace: Kind of content (e.g. "llm", "narration")
+            key: Content key
+            extension: File extension
+
+        Returns:
+            Path of the cache file (the directory is created if needed)
+        """
+        directory = os.path.join(self.cache_dir, namespace, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{key}{extension}")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a cached value
+
+        Args:
+            namespace: Kind of content
+            key: Content key
+
+        Returns:
+            Cached value or None if not cached
+        """
+        try:
+            with open(self.path_for(namespace, key), "r", encoding="utf-8") as f:
+                value = json.load(f)["value"]
+            record_cache(namespace, True)
+            return value
+        except FileNotFoundError:
+            record_cache(namespace, False)
+            return None
+        except Exception as e:
+            print(f"Error reading cache entry {namespace}/{key}: {e}")
+            return None
+
+    def set(self, namespace: str, key: str, value: Any):
+        """Store a value
+
+        Args:
+            namespace: Kind of content
+            key: Content key
+            value: JSON-serializable value
+        """
+        path = self.path_for(namespace, key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"value": value}, f)
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Error writing cache entry {namespace}/{key}: {e}")
+
+# Shared cache instance
+content_cache = ContentCache()
@@ -4,6 +4,7 @@ import json
 import time
 import random
 from sadtalker_controller import sadtalker_controller
+from canned_content import canned_explanation, canned_troubleshooting, generic_explanation, generic_troubleshooting
 
 app = Flask(__name__)
 
@@ -26,50 +27,6 @@ class DemoGuide:
                 "Pull the wings up and press the body down to form a crane."
             ]
         }
-        
-        # Detailed explanations for each step
-        self.explanations = {
-            "Start with a square piece of paper, colored side down.": 
-                "Begin with a perfectly square sheet of origami paper. If you're using paper that's colored on one side, place it on your work surface with the colored side facing down (white side up). This ensures the colored side will show on the outside of your finished crane.",
-            
-            "Fold the paper in half diagonally to form a triangle.":
-                "Take the bottom right corner of the square and fold it up to the top left corner, creating a diagonal fold that divides the square into a triangle. Make sure the edges align perfectly, then crease the fold firmly by running your finger along it.",
-            
-            "Fold the triangle in half to form a smaller triangle.":
-                "Take the right point of your triangle and fold it over to meet the left point, creating a smaller triangle. Again, make sure the edges align perfectly before creasing the fold firmly.",
-            
-            "Open the paper up to the first triangle.":
-                "Carefully unfold the paper back to the larger triangle shape from step 2. You should still see the crease from step 3 running from the top point to the middle of the base.",
-            
-            "Fold the corners of the triangle to the center point.":
-                "Take both the left and right corners of the triangle and fold them inward so their points meet at the top point of the triangle. The paper will now resemble a diamond shape or a kite.",
-            
-            "Turn the paper over.":
-                "Carefully flip the entire model over from left to right, keeping all your creases intact. The model should still look like a diamond shape.",
-            
-            "Fold the corners to the center again.":
-                "Similar to step 5, take the left and right corners of the diamond and fold them inward so they meet at the center crease. This will create a narrower diamond shape.",
-            
-            "Fold the bottom edges to the center line.":
-                "Take the bottom flaps on both sides and fold them upward along the center line. These will form the wings of your crane later.",
-            
-            "Fold the paper in half backward along the center line.":
-                "Fold the entire model in half backward (away from you) along the vertical center line. The folded wings should be on the outside of this fold.",
-            
-            "Pull the wings up and press the body down to form a crane.":
-                "Hold the bottom point (which will become the crane's tail) and the top point (which will become the head). Gently pull them apart while pressing down on the middle section. As you do this, the wings will naturally rise up on the sides. Shape the head by folding the very tip down, and adjust the wings to the desired angle."
-        }
-        
-        # Troubleshooting advice for each step
-        self.troubleshooting = {
-            "Start with a square piece of paper, colored side down.": 
-                "Common mistakes:\n- Using rectangular paper instead of square\n- Starting with colored side up\n\nCheck if correct:\n- Paper should be perfectly square (all sides equal)\n- White/plain side should be facing up\n\nRemediation:\n- If using printer paper, fold one corner to the opposite edge and cut off excess\n- Flip the paper if the colored side is facing up\n\nConfirmation check:\n- Place paper on flat surface and ensure all corners line up",
-            
-            "Fold the paper in half diagonally to form a triangle.": 
-                "Common mistakes:\n- Folding horizontally or vertically instead of diagonally\n- Not aligning corners precisely\n\nCheck if correct:\n- You should have a perfect triangle\n- The fold should run from one corner to the opposite corner\n\nRemediation:\n- Unfold and try again, making sure to bring one corner directly to the opposite corner\n- Smooth out the paper and ensure it's flat before folding\n\nConfirmation check:\n- The triangle should have two equal sides",
-            
-            # Add more troubleshooting advice for other steps...
-        }
     
     def parse_instructions(self, manual_text=None, preloaded_key=None):
         """Parse either uploaded manual text or use preloaded instructions"""
@@ -106,18 +63,18 @@ class DemoGuide:
     
     def get_step_explanation(self, step_text):
         """Get detailed explanation for a particular step"""
-        return self.explanations.get(step_text, f"Here's how to do this step: {step_text} Make sure to crease all folds firmly and keep your work neat.")
+        return canned_explanation(step_text) or generic_explanation(step_text)
     
     def get_troubleshooting(self, step_text):
         """Get troubleshooting advice for when user is stuck"""
-        return self.troubleshooting.get(step_text, f"If you're having trouble with '{step_text}', try the following:\n\n1. Check that your previous folds are accurate\n2. Make sure your paper is properly aligned\n3. Use your fingernail to make crisp, clean folds\n4. If necessary, start over with a new piece of paper")
+        return canned_troubleshooting(step_text) or generic_troubleshooting(step_text)
 
 # Create a guide instance
 guide = DemoGuide()
 
 # Initialize SadTalker controller
 try:
-    sadtalker_initialized = sadtalker_controller.is_available()
+    sadtalker_initialized = sadtalker_controller.initialize()
     print(f"SadTalker initialized: {sadtalker_initialized}")
     
     # Add sample avatars if needed
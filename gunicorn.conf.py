@@ -0,0 +1,32 @@
+"""Gunicorn settings for serving GuideMind (see wsgi.py)
+
+Every setting can be overridden from the environment:
+- PORT / GUNICORN_BIND: address to listen on (default 0.0.0.0:5000)
+- WEB_CONCURRENCY: worker processes (default 2 per CPU core + 1)
+- GUNICORN_THREADS: threads per worker (default 8)
+- GUNICORN_TIMEOUT: seconds before a silent worker is restarted (default 120)
+"""
+
+import os
+import multiprocessing
+
+bind = os.getenv("GUNICORN_BIND") or f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# Requests mostly wait on the LLM and avatar backends, so each worker serves
+# several of them on threads
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Restart workers that stop responding (long renders run on request threads
+# and don't count against this)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app in each worker rather than in the master: startup runs
+# background threads (backend probing, metadata warmup), which don't survive fork
+preload_app = False
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
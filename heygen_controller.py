@@ -1,8 +1,20 @@
 import os
 import json
 import time
+import threading
 from flask import Flask, jsonify, request
 from heygen_integration import HeyGenAPI
+from content_cache import content_cache, make_key
+from metrics import record_cache
+from state_backend import state_backend
+from media_store import media_store
+
+# HeyGen's URLs of finished videos stay valid for days; we only need them
+# until the local copy is downloaded
+REMOTE_URL_TTL = 6 * 3600
+
+# Batch progress is kept for other workers to report for a day
+BATCH_TTL = 24 * 3600
 
 class HeyGenController:
     """Controller for managing HeyGen video avatar integration with GuideMind"""
@@ -10,11 +22,38 @@ class HeyGenController:
     def __init__(self):
         self.heygen = HeyGenAPI()
         self.initialized = False
-        self.avatar_id = None
-        self.voice_id = None
-        self.avatar_cache = {}  # Cache for generated videos
-        self.available_avatars = []
-        self.available_voices = []
+        # Defaults picked by initialize(); a selection made through any worker
+        # is kept in the state backend and takes precedence
+        self._default_avatar_id = None
+        self._default_voice_id = None
+        # Renders submitted by this worker (jobs are followed in-process);
+        # HeyGen URLs of finished videos are shared through the state backend
+        self._inflight = {}  # Cache key -> HeyGenJob for renders in progress
+        self._download_locks = {}
+        self._lock = threading.Lock()
+        self.batches = {}
+        self._render_listeners = []
+        self.max_concurrent_renders = int(os.getenv("HEYGEN_MAX_CONCURRENT_RENDERS", "4"))
+    
+    @property
+    def avatar_id(self):
+        """Avatar used for video generation"""
+        return state_backend.get("heygen:avatar_id") or self._default_avatar_id
+    
+    @property
+    def voice_id(self):
+        """Voice used for video generation"""
+        return state_backend.get("heygen:voice_id") or self._default_voice_id
+    
+    @property
+    def available_avatars(self):
+        """Available avatars (served from the HeyGen metadata cache)"""
+        return self.heygen.list_avatars()
+    
+    @property
+    def available_voices(self):
+        """Available voices (served from the HeyGen metadata cache)"""
+        return self.heygen.list_voices()
     
     def initialize(self):
         """Initialize HeyGen controller and fetch available resources"""
@@ -25,26 +64,22 @@ class HeyGenController:
             print("Error: HeyGen API authentication failed")
             return False
         
-        # Fetch available avatars and voices
-        self.available_avatars = self.heygen.list_avatars()
-        self.available_voices = self.heygen.list_voices()
-        
         if not self.available_avatars:
             print("Error: No avatars available in HeyGen account")
             return False
         
         # Set default avatar and voice
-        self.avatar_id = self.available_avatars[0].get("avatar_id")
+        self._default_avatar_id = self.available_avatars[0].get("avatar_id")
         
         # Find a suitable voice (prefer English voices)
         for voice in self.available_voices:
             if voice.get("language", "").lower() == "english":
-                self.voice_id = voice.get("voice_id")
+                self._default_voice_id = voice.get("voice_id")
                 break
         
         # If no English voice found, use the first available voice
-        if not self.voice_id and self.available_voices:
-            self.voice_id = self.available_voices[0].get("voice_id")
+        if not self._default_voice_id and self.available_voices:
+            self._default_voice_id = self.available_voices[0].get("voice_id")
         
         self.initialized = True
         return True
@@ -88,7 +123,7 @@ class HeyGenController:
         # Verify avatar_id is valid
         for avatar in self.available_avatars:
             if avatar.get("avatar_id") == avatar_id:
-                self.avatar_id = avatar_id
+                state_backend.set("heygen:avatar_id", avatar_id)
                 return True
         
         return False
@@ -102,7 +137,7 @@ class HeyGenController:
         # Verify voice_id is valid
         for voice in self.available_voices:
             if voice.get("voice_id") == voice_id:
-                self.voice_id = voice_id
+                state_backend.set("heygen:voice_id", voice_id)
                 return True
         
         return False
@@ -112,49 +147,42 @@ class HeyGenController:
         
         Args:
             step_text: The text of the step to explain
-            step_number: The step number for caching
+            step_number: The step number (videos are cached by content)
             force_regenerate: Force regeneration even if cached
             
         Returns:
             Dictionary with video_url and status or error message
         """
-        if not self.initialized:
-            if not self.initialize():
-                return {"error": "HeyGen API not initialized", "status": "error"}
-        
-        # Check cache first unless force_regenerate is True
-        cache_key = f"step_{step_number}"
-        if not force_regenerate and cache_key in self.avatar_cache:
-            return {
-                "video_url": self.avatar_cache[cache_key],
-                "status": "success",
-                "cached": True
-            }
-        
-        # No cached video, generate a new one
-        if not self.avatar_id:
-            return {"error": "No avatar selected", "status": "error"}
-        
-        # Generate script with enhanced step explanation
         script = self._generate_script_for_step(step_text)
+        return self._get_or_generate_video("step", script, force_regenerate, "Failed to generate video")
+    
+    def peek_video_for_step(self, step_text):
+        """Get a step video only if it has already been rendered
         
-        # Generate video
-        video_url = self.heygen.generate_video(
-            avatar_id=self.avatar_id,
-            script=script,
-            voice_id=self.voice_id
-        )
-        
-        if not video_url:
-            return {"error": "Failed to generate video", "status": "error"}
+        Args:
+            step_text: The text of the step
         
-        # Cache the result
-        self.avatar_cache[cache_key] = video_url
+        Returns:
+            Dictionary with video_url and status ("rendering" while a render
+            is in flight), or None if the video would have to be generated
+            (or fetched from the media store)
+        """
+        if not self.initialized:
+            return None
         
+        cache_key = self._video_cache_key(self._generate_script_for_step(step_text))
+        if os.path.exists(self._local_video_path(cache_key)):
+            video_url = f"/api/heygen/video/{cache_key}.mp4"
+        else:
+            video_url = state_backend.get(f"heygen:remote_url:{cache_key}")
+        if not video_url:
+            if cache_key in self._inflight:
+                return {"video_url": None, "status": "rendering"}
+            return None
         return {
             "video_url": video_url,
             "status": "success",
-            "cached": False
+            "cached": True
         }
     
     def _generate_script_for_step(self, step_text):
@@ -170,97 +198,418 @@ class HeyGenController:
         # In a full implementation, you might use Claude API to generate a better explanation
         return f"Let me explain this step. {step_text} Make sure to align the folds carefully. Take your time with this step."
     
+    def _generate_welcome_script(self):
+        """Generate the welcome script"""
+        return (
+            "Welcome to GuideMind! I'm your origami instructor, and I'll guide you "
+            "through creating beautiful paper art step by step. You can ask me for help "
+            "anytime you get stuck, or use voice commands to navigate. Let's get started!"
+        )
+    
+    def _generate_help_script(self, step_text):
+        """Generate a help script for the step the user is stuck on"""
+        return (
+            f"I see you're having trouble with this step: {step_text}. "
+            f"Don't worry, this is a common place to get stuck. "
+            f"Try checking that your previous folds are precise, and make sure "
+            f"the paper is properly aligned. Take it slowly and be gentle with the paper. "
+            f"If you're still having issues, we can go back to the previous step and try again."
+        )
+    
     def get_welcome_video(self, force_regenerate=False):
         """Generate a welcome video for the application
         
         Returns:
             Dictionary with video_url and status or error message
         """
-        if not self.initialized:
-            if not self.initialize():
-                return {"error": "HeyGen API not initialized", "status": "error"}
+        script = self._generate_welcome_script()
+        return self._get_or_generate_video("welcome", script, force_regenerate, "Failed to generate welcome video")
+    
+    def get_help_video(self, step_text, force_regenerate=False):
+        """Generate a help video for when user is stuck
         
-        # Check cache first unless force_regenerate is True
-        cache_key = "welcome"
-        if not force_regenerate and cache_key in self.avatar_cache:
-            return {
-                "video_url": self.avatar_cache[cache_key],
-                "status": "success",
-                "cached": True
-            }
+        Args:
+            step_text: The text of the step they're stuck on
+            
+        Returns:
+            Dictionary with video_url and status or error message
+        """
+        script = self._generate_help_script(step_text)
+        return self._get_or_generate_video("help", script, force_regenerate, "Failed to generate help video")
+    
+    def add_render_listener(self, callback):
+        """Call a function with (seconds, success, error) whenever a render ends
         
-        # Generate welcome video
-        script = (
-            "Welcome to GuideMind! I'm your origami instructor, and I'll guide you "
-            "through creating beautiful paper art step by step. You can ask me for help "
-            "anytime you get stuck, or use voice commands to navigate. Let's get started!"
-        )
+        Renders finish in the background (see _get_or_generate_video), so the
+        avatar router learns HeyGen's latency and failures from here.
+        """
+        self._render_listeners.append(callback)
+    
+    def avatar_key(self):
+        """Identify the current avatar and voice (part of every video's key)"""
+        return f"{self.avatar_id}:{self.voice_id}"
+    
+    def _video_cache_key(self, script):
+        """Build the content key for a video
         
-        video_url = self.heygen.generate_video(
-            avatar_id=self.avatar_id,
-            script=script,
-            voice_id=self.voice_id
-        )
+        The key covers the full script, avatar and voice, so each script is
+        rendered once per avatar/voice and never shared across them.
+        """
+        return make_key("heygen", script, self.avatar_id, self.voice_id)
+    
+    def _local_video_path(self, cache_key):
+        """Get the local path of a persisted video"""
+        return content_cache.path_for("heygen", cache_key, ".mp4")
+    
+    def _cached_video_url(self, cache_key):
+        """Get the URL of a finished video, preferring the local copy
         
-        if not video_url:
-            return {"error": "Failed to generate welcome video", "status": "error"}
+        Args:
+            cache_key: Content key of the video
+            
+        Returns:
+            URL of our video endpoint, HeyGen's URL while the download is
+            pending, the media store's URL for a video rendered on another
+            node, or None if the video has not been rendered
+        """
+        if os.path.exists(self._local_video_path(cache_key)):
+            return f"/api/heygen/video/{cache_key}.mp4"
+        return state_backend.get(f"heygen:remote_url:{cache_key}") or self._from_media_store(cache_key)
+    
+    def _from_media_store(self, cache_key):
+        """Get a video published by another node from the media store
         
-        # Cache the result
-        self.avatar_cache[cache_key] = video_url
+        Args:
+            cache_key: Content key of the video
+            
+        Returns:
+            The store's URL (MEDIA_STORE_REDIRECT), our video endpoint once
+            the video is downloaded, or None if the store doesn't have it
+        """
+        if not media_store.enabled:
+            return None
+        
+        store_name = f"heygen/{cache_key}.mp4"
+        if media_store.redirect and media_store.exists(store_name):
+            store_url = media_store.url(store_name)
+            if store_url:
+                record_cache("media_store", True)
+                return store_url
+        
+        if media_store.fetch(store_name, self._local_video_path(cache_key)):
+            return f"/api/heygen/video/{cache_key}.mp4"
+        return None
+    
+    def _persist_video(self, cache_key, remote_url, claimed=False):
+        """Download a finished video into the local content-addressed store
         
-        return {
-            "video_url": video_url,
-            "status": "success",
-            "cached": False
-        }
+        Only one download runs per key; concurrent callers wait for it.
+        
+        Args:
+            cache_key: Content key of the video
+            remote_url: HeyGen's URL of the finished video
+            claimed: Whether this process holds the render claim (released
+                once the video is shared)
+            
+        Returns:
+            URL to serve the video from (HeyGen's URL if the download failed)
+        """
+        with self._lock:
+            key_lock = self._download_locks.setdefault(cache_key, threading.Lock())
+        
+        with key_lock:
+            path = self._local_video_path(cache_key)
+            if not os.path.exists(path):
+                if not self.heygen.download_video(remote_url, path):
+                    return remote_url
+                
+                # Share with other nodes, then let them stop waiting for this render
+                store_name = f"heygen/{cache_key}.mp4"
+                media_store.publish(store_name, path)
+                if claimed:
+                    media_store.release(store_name)
+            
+            with self._lock:
+                self._download_locks.pop(cache_key, None)
+            state_backend.delete(f"heygen:remote_url:{cache_key}")
+            return f"/api/heygen/video/{cache_key}.mp4"
     
-    def get_help_video(self, step_text, force_regenerate=False):
-        """Generate a help video for when user is stuck
+    def _get_or_generate_video(self, kind, script, force_regenerate, failure_message):
+        """Serve a video from the cache, join an in-flight render, or generate it
         
         Args:
-            step_text: The text of the step they're stuck on
+            kind: Kind of video ("step", "welcome", "help")
+            script: Script for the avatar to say
+            force_regenerate: Force regeneration even if cached
+            failure_message: Error message if generation fails
             
         Returns:
-            Dictionary with video_url and status or error message
+            Dictionary with video_url and status or error message; status is
+            "pending" while the video renders
         """
         if not self.initialized:
             if not self.initialize():
                 return {"error": "HeyGen API not initialized", "status": "error"}
         
         # Check cache first unless force_regenerate is True
-        cache_key = f"help_{step_text[:20]}"  # Use first 20 chars of step as cache key
-        if not force_regenerate and cache_key in self.avatar_cache:
+        cache_key = self._video_cache_key(script)
+        cached_url = None if force_regenerate else self._cached_video_url(cache_key)
+        record_cache("heygen_video", bool(cached_url))
+        if cached_url:
             return {
-                "video_url": self.avatar_cache[cache_key],
+                "video_url": cached_url,
                 "status": "success",
                 "cached": True
             }
         
-        # Generate help script
-        script = (
-            f"I see you're having trouble with this step: {step_text}. "
-            f"Don't worry, this is a common place to get stuck. "
-            f"Try checking that your previous folds are precise, and make sure "
-            f"the paper is properly aligned. Take it slowly and be gentle with the paper. "
-            f"If you're still having issues, we can go back to the previous step and try again."
-        )
+        # No cached video, generate a new one
+        if not self.avatar_id:
+            return {"error": "No avatar selected", "status": "error"}
+        
+        # Join a render that is already in flight (e.g. from a batch) instead of submitting a duplicate
+        job = None if force_regenerate else self._inflight.get(cache_key)
+        store_name = f"heygen/{cache_key}.mp4"
+        if not job:
+            # A forced render goes ahead without the claim, and then must not release it
+            claimed = media_store.claim(store_name)
+            if not claimed and not force_regenerate:
+                # Another node is rendering this video; wait a while for its copy
+                if media_store.wait_for(store_name, lambda: bool(self._cached_video_url(cache_key))):
+                    return {
+                        "video_url": self._cached_video_url(cache_key),
+                        "status": "success",
+                        "cached": True
+                    }
+                # Only render if the other node gave up; otherwise don't hold this thread
+                if not media_store.claim(store_name):
+                    return {"error": "Video is rendering on another node", "status": "pending"}
+                claimed = True
+            job = self._submit(cache_key, script, claimed)
+        if not job:
+            return {"error": failure_message, "status": "error"}
+        
+        # Don't hold the request thread for the render: the webhook or poller
+        # resolves the job, and its callback publishes the video for the next request
+        if job.done:
+            video_url = self._cached_video_url(cache_key) or (job.video_url if job.status == "completed" else None)
+            if video_url:
+                return {
+                    "video_url": video_url,
+                    "status": "success",
+                    "cached": False
+                }
+            return {"error": job.error or failure_message, "status": "error"}
+        
+        return {
+            "error": "Video is rendering",
+            "status": "pending",
+            "video_id": job.video_id,
+            "video_url": None
+        }
+    
+    def _submit(self, cache_key, script, claimed=False):
+        """Submit a render and persist its result when it completes
         
-        video_url = self.heygen.generate_video(
+        Args:
+            cache_key: Content key for the video
+            script: Script for the avatar to say
+            claimed: Whether the caller took the render claim in the media
+                store; it is released when the render fails or is shared
+            
+        Returns:
+            HeyGenJob or None if submission failed
+        """
+        job = self.heygen.generate_video_async(
             avatar_id=self.avatar_id,
             script=script,
             voice_id=self.voice_id
         )
+        if not job:
+            if claimed:
+                media_store.release(f"heygen/{cache_key}.mp4")
+            return None
+        
+        with self._lock:
+            self._inflight[cache_key] = job
+        
+        def on_done(finished_job):
+            with self._lock:
+                if self._inflight.get(cache_key) is finished_job:
+                    del self._inflight[cache_key]
+            succeeded = finished_job.status == "completed" and bool(finished_job.video_url)
+            for listener in self._render_listeners:
+                try:
+                    listener(finished_job.completed_at - finished_job.submitted_at, succeeded, finished_job.error)
+                except Exception as e:
+                    print(f"Error in HeyGen render listener: {e}")
+            if not succeeded:
+                if claimed:
+                    media_store.release(f"heygen/{cache_key}.mp4")
+            else:
+                # Serve HeyGen's URL until the local copy is downloaded
+                state_backend.set(f"heygen:remote_url:{cache_key}", finished_job.video_url, ttl=REMOTE_URL_TTL)
+                threading.Thread(
+                    target=self._persist_video,
+                    args=(cache_key, finished_job.video_url, claimed),
+                    name="heygen-download",
+                    daemon=True
+                ).start()
+        
+        job.add_done_callback(on_done)
+        return job
+    
+    def prepare_videos_for_steps(self, steps, max_concurrency=None, include_welcome=True):
+        """Submit videos for all steps of a manual concurrently
         
-        if not video_url:
-            return {"error": "Failed to generate help video", "status": "error"}
+        Scripts are submitted from a background thread with at most
+        ``max_concurrency`` renders outstanding at a time; all of them are
+        followed by the shared HeyGen job tracker. Progress is available from
+        get_batch_status().
+        
+        Args:
+            steps: List of step texts
+            max_concurrency: Maximum renders in flight (default HEYGEN_MAX_CONCURRENT_RENDERS)
+            include_welcome: Also render the welcome video
+            
+        Returns:
+            Batch status dictionary
+        """
+        if not self.initialized:
+            if not self.initialize():
+                return {"error": "HeyGen API not initialized", "status": "error"}
+        
+        max_concurrency = max(1, int(max_concurrency or self.max_concurrent_renders))
+        
+        items = []
+        if include_welcome:
+            items.append({"kind": "welcome", "step_number": None, "script": self._generate_welcome_script()})
+        for step_number, step_text in enumerate(steps):
+            items.append({"kind": "step", "step_number": step_number, "script": self._generate_script_for_step(step_text)})
+        
+        batch_id = make_key("batch", [item["script"] for item in items], self.avatar_id, self.voice_id, time.time())[:12]
+        batch = {
+            "batch_id": batch_id,
+            "started_at": time.time(),
+            "finished_at": None,
+            "max_concurrency": max_concurrency,
+            "items": []
+        }
+        
+        for item in items:
+            cache_key = self._video_cache_key(item["script"])
+            cached_url = self._cached_video_url(cache_key)
+            batch["items"].append({
+                "kind": item["kind"],
+                "step_number": item["step_number"],
+                "cache_key": cache_key,
+                "script": item["script"],
+                "status": "success" if cached_url else "queued",
+                "video_url": cached_url,
+                "video_id": None
+            })
+        
+        with self._lock:
+            self.batches[batch_id] = batch
+        self._save_batch(batch)
+        
+        threading.Thread(target=self._run_batch, args=(batch,), name=f"heygen-batch-{batch_id}", daemon=True).start()
+        return self.get_batch_status(batch_id)
+    
+    def _run_batch(self, batch):
+        """Submit the items of a batch, keeping at most max_concurrency in flight"""
+        slots = threading.Semaphore(batch["max_concurrency"])
+        
+        for item in batch["items"]:
+            if item["status"] == "success":
+                continue
+            
+            slots.acquire()
+            
+            job = self._inflight.get(item["cache_key"])
+            if not job:
+                if not media_store.claim(f"heygen/{item['cache_key']}.mp4"):
+                    # Another node is rendering it and will share it through the media store
+                    item["status"] = "elsewhere"
+                    slots.release()
+                    self._save_batch(batch)
+                    continue
+                job = self._submit(item["cache_key"], item["script"], claimed=True)
+            if not job:
+                item["status"] = "error"
+                slots.release()
+                self._save_batch(batch)
+                continue
+            
+            item["status"] = "rendering"
+            item["video_id"] = job.video_id
+            self._save_batch(batch)
+            
+            def on_done(finished_job, item=item):
+                item["status"] = "success" if finished_job.status == "completed" else "error"
+                item["video_url"] = finished_job.video_url
+                slots.release()
+                self._finish_batch_if_done(batch)
+                self._save_batch(batch)
+            
+            job.add_done_callback(on_done)
         
-        # Cache the result
-        self.avatar_cache[cache_key] = video_url
+        self._finish_batch_if_done(batch)
+        self._save_batch(batch)
+    
+    def _finish_batch_if_done(self, batch):
+        """Record the batch finish time once every item is done"""
+        if batch["finished_at"] is None and all(item["status"] in ("success", "error", "elsewhere") for item in batch["items"]):
+            batch["finished_at"] = time.time()
+            elapsed = batch["finished_at"] - batch["started_at"]
+            print(f"HeyGen batch {batch['batch_id']} finished in {elapsed:.1f}s")
+    
+    def _save_batch(self, batch):
+        """Share a batch's progress so any worker can report it
         
+        Finished batches are dropped from memory once saved; their status is
+        served from the shared snapshot until it expires.
+        """
+        with self._lock:
+            snapshot = json.loads(json.dumps(batch))
+        state_backend.set(f"heygen:batch:{batch['batch_id']}", snapshot, ttl=BATCH_TTL)
+        if snapshot["finished_at"] is not None:
+            with self._lock:
+                self.batches.pop(batch["batch_id"], None)
+    
+    def get_batch_status(self, batch_id):
+        """Get the progress of a batch
+        
+        Args:
+            batch_id: ID returned by prepare_videos_for_steps
+            
+        Returns:
+            Batch status dictionary or error
+        """
+        # Batches started through another worker are reported from their shared snapshot
+        batch = self.batches.get(batch_id) or state_backend.get(f"heygen:batch:{batch_id}")
+        if not batch:
+            return {"error": f"Unknown batch: {batch_id}", "status": "error"}
+        
+        counts = {}
+        for item in batch["items"]:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        
+        end = batch["finished_at"] or time.time()
         return {
-            "video_url": video_url,
             "status": "success",
-            "cached": False
+            "batch_id": batch_id,
+            "done": batch["finished_at"] is not None,
+            "elapsed": round(end - batch["started_at"], 1),
+            "counts": counts,
+            "videos": [
+                {
+                    "kind": item["kind"],
+                    "step_number": item["step_number"],
+                    "status": item["status"],
+                    "video_url": self._cached_video_url(item["cache_key"]) if item["status"] == "success" else None
+                }
+                for item in batch["items"]
+            ]
         }
 
 # Create singleton instance
@@ -1,8 +1,12 @@
 import os
+import hmac
+import hashlib
 import requests
 import json
-import time
 from dotenv import load_dotenv
+from heygen_jobs import HeyGenJobTracker
+from ttl_cache import TTLCache
+from metrics import metrics
 
 # Load environment variables
 load_dotenv()
@@ -13,7 +17,7 @@ class HeyGenAPI:
     def __init__(self):
         """Initialize HeyGen API with credentials from .env"""
         self.api_key = os.getenv("HEYGEN_API_KEY")
-        self.base_url = "https://api.heygen.com/v1"
+        self.base_url = os.getenv("HEYGEN_API_URL", "https://api.heygen.com/v1").rstrip("/")
         self.headers = {
             "Content-Type": "application/json",
             "X-Api-Key": self.api_key
@@ -22,25 +26,96 @@ class HeyGenAPI:
         # Check if API key is available
         if not self.api_key:
             print("Warning: HEYGEN_API_KEY not found in .env file")
+        
+        # Public URL of our webhook receiver (/api/heygen/webhook); when set,
+        # HeyGen calls it on completion and polling is only a fallback
+        self.callback_url = os.getenv("HEYGEN_CALLBACK_URL", "").strip() or None
+        self.webhook_secret = os.getenv("HEYGEN_WEBHOOK_SECRET", "").strip() or None
+        if self.callback_url and not self.webhook_secret:
+            print("Warning: HEYGEN_CALLBACK_URL is set without HEYGEN_WEBHOOK_SECRET; webhooks are refused and renders are polled")
+            self.callback_url = None
+        
+        # Auth status and avatar/voice catalogs are cached and refreshed in the
+        # background so generating a video only calls the generation endpoint
+        self.metadata = TTLCache("heygen-metadata")
+        self.auth_ttl = float(os.getenv("HEYGEN_AUTH_TTL", "600"))
+        self.catalog_ttl = float(os.getenv("HEYGEN_CATALOG_TTL", "3600"))
+        
+        # Tracks outstanding renders and resolves them via webhook or polling
+        self.jobs = HeyGenJobTracker(
+            status_fetcher=self.get_video_status,
+            webhook_enabled=bool(self.callback_url),
+            timeout=float(os.getenv("HEYGEN_RENDER_TIMEOUT", "600"))
+        )
+        metrics.gauge(
+            "guidemind_heygen_jobs_outstanding",
+            "HeyGen renders submitted and not yet finished"
+        ).set_function(self.jobs.outstanding)
     
     def is_authenticated(self):
-        """Check if API key is valid"""
+        """Check if API key is valid
+        
+        The result is cached for HEYGEN_AUTH_TTL seconds (failures for at most
+        30 seconds) and refreshed in the background once it expires.
+        """
         if not self.api_key:
             return False
-            
+        
+        return self.metadata.get(
+            "auth",
+            self._check_authentication,
+            ttl=lambda ok: self.auth_ttl if ok else min(self.auth_ttl, 30)
+        )
+    
+    def _check_authentication(self):
+        """Check the API key against the API"""
         try:
             # Test the API key with a simple request
             response = requests.get(
                 f"{self.base_url}/user_info", 
-                headers=self.headers
+                headers=self.headers,
+                timeout=15
             )
             return response.status_code == 200
         except Exception as e:
             print(f"Authentication error: {e}")
             return False
     
-    def generate_video(self, avatar_id, script, voice_id=None):
-        """Generate a video using HeyGen API
+    def warm_metadata(self):
+        """Load auth status and catalogs in the background"""
+        if not self.api_key:
+            return
+        
+        self.metadata.refresh_async(
+            "auth",
+            self._check_authentication,
+            lambda ok: self.auth_ttl if ok else min(self.auth_ttl, 30)
+        )
+        self.metadata.refresh_async("avatars", self._fetch_avatars, self._catalog_ttl)
+        self.metadata.refresh_async("voices", self._fetch_voices, self._catalog_ttl)
+    
+    def _catalog_ttl(self, catalog):
+        """TTL for catalogs; empty results (usually errors) are retried sooner"""
+        return self.catalog_ttl if catalog else min(self.catalog_ttl, 60)
+    
+    def generate_video_async(self, avatar_id, script, voice_id=None):
+        """Submit a video for generation without waiting for it
+        
+        Args:
+            avatar_id: The ID of the avatar to use
+            script: The text content for the avatar to say
+            voice_id: Optional voice ID to use (if None, uses avatar's default voice)
+            
+        Returns:
+            HeyGenJob that resolves when the video is done, or None if submission failed
+        """
+        video_id = self.submit_video(avatar_id, script, voice_id)
+        if not video_id:
+            return None
+        return self.jobs.track(video_id)
+    
+    def submit_video(self, avatar_id, script, voice_id=None):
+        """Submit a video generation request
         
         Args:
             avatar_id: The ID of the avatar to use
@@ -48,7 +123,7 @@ class HeyGenAPI:
             voice_id: Optional voice ID to use (if None, uses avatar's default voice)
             
         Returns:
-            The URL of the generated video or None if failed
+            The HeyGen video ID or None if failed
         """
         if not self.is_authenticated():
             print("Error: Not authenticated with HeyGen API")
@@ -75,13 +150,22 @@ class HeyGenAPI:
                 "version": "v1"
             }
             
+            # Ask HeyGen to notify our webhook when the video is done
+            if self.callback_url:
+                payload["callback_url"] = self.callback_url
+            
             # Make the API request to generate video
             response = requests.post(
                 f"{self.base_url}/video.generate",
                 headers=self.headers,
-                data=json.dumps(payload)
+                data=json.dumps(payload),
+                timeout=30
             )
             
+            if response.status_code in (401, 403):
+                # The cached auth status is stale
+                self.metadata.invalidate("auth")
+            
             if response.status_code != 200:
                 print(f"Error generating video: {response.text}")
                 return None
@@ -94,61 +178,114 @@ class HeyGenAPI:
                 print("Error: No video ID returned")
                 return None
             
-            # Poll for video status until complete
-            return self._wait_for_video(video_id)
+            return video_id
             
         except Exception as e:
             print(f"Error generating video: {e}")
             return None
     
-    def _wait_for_video(self, video_id, max_attempts=60, delay=5):
-        """Wait for video processing to complete
+    def get_video_status(self, video_id):
+        """Check the status of a video once
         
         Args:
             video_id: The video ID to check
-            max_attempts: Maximum number of status check attempts
-            delay: Delay between status checks in seconds
             
         Returns:
-            The URL of the completed video or None if failed/timeout
+            Tuple of (status, video_url); status is None if the check failed
         """
-        for attempt in range(max_attempts):
-            try:
-                # Check video status
-                response = requests.get(
-                    f"{self.base_url}/video.status",
-                    headers=self.headers,
-                    params={"video_id": video_id}
-                )
-                
+        try:
+            response = requests.get(
+                f"{self.base_url}/video.status",
+                headers=self.headers,
+                params={"video_id": video_id},
+                timeout=15
+            )
+            
+            if response.status_code != 200:
+                print(f"Error checking video status: {response.text}")
+                return None, None
+            
+            data = response.json().get("data", {})
+            return data.get("status"), data.get("video_url")
+        except Exception as e:
+            print(f"Error checking video status: {e}")
+            return None, None
+    
+    def download_video(self, video_url, destination):
+        """Download a finished video to a local file
+        
+        HeyGen video URLs are signed and expire, so finished videos are copied
+        to local storage. The file is streamed to a temporary path and renamed
+        into place, so a partial download is never served.
+        
+        Args:
+            video_url: URL of the finished video
+            destination: Local path to write
+            
+        Returns:
+            True if the video was downloaded, False otherwise
+        """
+        temp_path = f"{destination}.{os.getpid()}.tmp"
+        try:
+            with requests.get(video_url, stream=True, timeout=60) as response:
                 if response.status_code != 200:
-                    print(f"Error checking video status: {response.text}")
-                    return None
-                
-                data = response.json()
-                status = data.get("data", {}).get("status")
-                
-                if status == "completed":
-                    # Video is ready, return the URL
-                    return data.get("data", {}).get("video_url")
-                elif status == "failed":
-                    print("Video generation failed")
-                    return None
-                
-                # Wait before checking again
-                print(f"Video processing: {status} ({attempt+1}/{max_attempts})")
-                time.sleep(delay)
-                
-            except Exception as e:
-                print(f"Error checking video status: {e}")
-                return None
+                    print(f"Error downloading video: HTTP {response.status_code}")
+                    return False
+                with open(temp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+            os.replace(temp_path, destination)
+            return True
+        except Exception as e:
+            print(f"Error downloading video: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+    
+    def verify_webhook_signature(self, body, signature):
+        """Verify the signature HeyGen sends with webhook events
+        
+        Args:
+            body: Raw request body as bytes
+            signature: Value of the Signature header
+            
+        Returns:
+            True if the signature matches; unsigned webhooks (no
+            HEYGEN_WEBHOOK_SECRET) are always refused
+        """
+        if not self.webhook_secret or not signature:
+            return False
         
-        print(f"Timeout waiting for video to complete after {max_attempts} attempts")
-        return None
+        expected = hmac.new(self.webhook_secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+    
+    def handle_webhook_event(self, event):
+        """Resolve a tracked video from a HeyGen webhook event
+        
+        The event only says which video to check: its status and URL come
+        from the status API, never from the payload.
+        
+        Args:
+            event: Parsed webhook payload
+            
+        Returns:
+            True if a pending video was resolved
+        """
+        event_type = event.get("event_type", "")
+        event_data = event.get("event_data", {}) or {}
+        video_id = event_data.get("video_id")
+        
+        if not video_id or event_type not in ("avatar_video.success", "avatar_video.fail"):
+            return False
+        
+        return self.jobs.poll_now(video_id, source="webhook")
     
     def list_avatars(self):
         """List available avatars
         
+        The catalog is cached for HEYGEN_CATALOG_TTL seconds and refreshed in
+        the background once it expires.
+        
         Returns:
             List of available avatars or empty list if failed
         """
@@ -156,10 +293,15 @@ class HeyGenAPI:
             print("Error: Not authenticated with HeyGen API")
             return []
         
+        return self.metadata.get("avatars", self._fetch_avatars, ttl=self._catalog_ttl)
+    
+    def _fetch_avatars(self):
+        """Fetch the avatar catalog from the API"""
         try:
             response = requests.get(
                 f"{self.base_url}/avatar.list",
-                headers=self.headers
+                headers=self.headers,
+                timeout=30
             )
             
             if response.status_code != 200:
@@ -176,6 +318,9 @@ class HeyGenAPI:
     def list_voices(self):
         """List available voices
         
+        The catalog is cached for HEYGEN_CATALOG_TTL seconds and refreshed in
+        the background once it expires.
+        
         Returns:
             List of available voices or empty list if failed
         """
@@ -183,10 +328,15 @@ class HeyGenAPI:
             print("Error: Not authenticated with HeyGen API")
             return []
         
+        return self.metadata.get("voices", self._fetch_voices, ttl=self._catalog_ttl)
+    
+    def _fetch_voices(self):
+        """Fetch the voice catalog from the API"""
         try:
             response = requests.get(
                 f"{self.base_url}/voice.list",
-                headers=self.headers
+                headers=self.headers,
+                timeout=30
             )
             
             if response.status_code != 200:
@@ -222,13 +372,13 @@ if __name__ == "__main__":
             avatar_id = avatars[0].get("avatar_id")
             print(f"Generating test video with avatar ID: {avatar_id}")
             
-            video_url = heygen.generate_video(
+            video_id = heygen.submit_video(
                 avatar_id=avatar_id,
                 script="Welcome to GuideMind! I'll guide you through the origami instructions step by step."
             )
             
-            if video_url:
-                print(f"Video generated successfully: {video_url}")
+            if video_id:
+                print(f"Video submitted: {video_id} (check progress with get_video_status)")
             else:
                 print("Failed to generate video")
     else:
@@ -0,0 +1,246 @@
+import time
+import threading
+from typing import Callable, Dict, Optional, Tuple, List
+from metrics import RENDER_DURATION
+
+class HeyGenJob:
+    """A HeyGen video render that is waiting for completion"""
+
+    def __init__(self, video_id: str):
+        """Initialize job
+
+        Args:
+            video_id: HeyGen video ID
+        """
+        self.video_id = video_id
+        self.submitted_at = time.time()
+        self.completed_at: Optional[float] = None
+        self.status = "pending"
+        self.video_url: Optional[str] = None
+        self.error: Optional[str] = None
+        self.source: Optional[str] = None  # "webhook" or "poll"
+
+        self._event = threading.Event()
+        self._callbacks: List[Callable[["HeyGenJob"], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        """Whether the job has completed or failed"""
+        return self._event.is_set()
+
+    def wait(self, timeout: float = None) -> Optional[str]:
+        """Block until the job is done
+
+        Args:
+            timeout: Maximum time to wait in seconds (optional)
+
+        Returns:
+            The URL of the completed video or None if failed/timeout
+        """
+        self._event.wait(timeout)
+        return self.video_url if self.status == "completed" else None
+
+    def add_done_callback(self, callback: Callable[["HeyGenJob"], None]):
+        """Call a function once the job is done
+
+        The callback runs immediately if the job is already done.
+
+        Args:
+            callback: Function taking the job as its only argument
+        """
+        with self._lock:
+            if not self.done:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self, status: str, video_url: str = None, error: str = None, source: str = None) -> bool:
+        """Mark the job as done and run callbacks
+
+        Returns:
+            True if this call finished the job, False if it was already done
+        """
+        with self._lock:
+            if self.done:
+                return False
+            self.status = status
+            self.video_url = video_url
+            self.error = error
+            self.source = source
+            self.completed_at = time.time()
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"Error in HeyGen job callback for {self.video_id}: {e}")
+        return True
+
+class HeyGenJobTracker:
+    """Tracks outstanding HeyGen renders and resolves them on completion
+
+    Jobs are resolved by the webhook receiver as soon as HeyGen calls back.
+    As a fallback a single background thread polls the status endpoint for
+    all outstanding jobs, backing off from ``min_delay`` to ``max_delay``
+    seconds per job, so no request thread ever sleeps on a render.
+    """
+
+    def __init__(self,
+                 status_fetcher: Callable[[str], Tuple[Optional[str], Optional[str]]],
+                 webhook_enabled: bool = False,
+                 min_delay: float = 2.0,
+                 max_delay: float = 30.0,
+                 backoff: float = 1.5,
+                 timeout: float = 600.0):
+        """Initialize job tracker
+
+        Args:
+            status_fetcher: Function returning (status, video_url) for a video ID
+            webhook_enabled: Whether HeyGen was given a callback URL; polling then
+                starts later and serves only as a safety net
+            min_delay: First polling delay in seconds
+            max_delay: Maximum polling delay in seconds
+            backoff: Factor by which the polling delay grows
+            timeout: Time after which a job is failed
+        """
+        self.status_fetcher = status_fetcher
+        self.webhook_enabled = webhook_enabled
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self._jobs: Dict[str, HeyGenJob] = {}
+        self._schedule: Dict[str, Tuple[float, float]] = {}  # video_id -> (next poll, current delay)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, video_id: str) -> HeyGenJob:
+        """Start tracking a submitted video
+
+        Args:
+            video_id: HeyGen video ID
+
+        Returns:
+            Job that resolves when the video is done
+        """
+        with self._lock:
+            job = self._jobs.get(video_id)
+            if job:
+                return job
+
+            job = HeyGenJob(video_id)
+            self._jobs[video_id] = job
+
+            # With a webhook, the first poll is only a safety net
+            first_delay = self.max_delay if self.webhook_enabled else self.min_delay
+            self._schedule[video_id] = (time.time() + first_delay, first_delay)
+
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll_loop, name="heygen-status", daemon=True)
+                self._thread.start()
+
+        self._wakeup.set()
+        return job
+
+    def resolve(self, video_id: str, status: str, video_url: str = None, error: str = None, source: str = "webhook") -> bool:
+        """Resolve a tracked job
+
+        Args:
+            video_id: HeyGen video ID
+            status: "completed" or "failed"
+            video_url: URL of the completed video
+            error: Error message for failed videos
+            source: What reported the completion
+
+        Returns:
+            True if a pending job was resolved, False if unknown or already done
+        """
+        with self._lock:
+            job = self._jobs.pop(video_id, None)
+            self._schedule.pop(video_id, None)
+
+        if not job:
+            return False
+
+        resolved = job._finish(status, video_url=video_url, error=error, source=source)
+        if resolved:
+            elapsed = job.completed_at - job.submitted_at
+            if status == "completed":
+                RENDER_DURATION.observe(elapsed, backend="heygen", kind="video")
+            print(f"HeyGen video {video_id} {status} via {source} after {elapsed:.1f}s")
+        return resolved
+
+    def outstanding(self) -> int:
+        """Get the number of videos still rendering"""
+        with self._lock:
+            return len(self._jobs)
+
+    def _poll_loop(self):
+        """Poll due jobs until none are outstanding"""
+        while True:
+            now = time.time()
+            with self._lock:
+                if not self._jobs:
+                    self._thread = None
+                    return
+                due = [video_id for video_id, (next_poll, _) in self._schedule.items() if next_poll <= now]
+                next_wake = min(next_poll for next_poll, _ in self._schedule.values())
+
+            for video_id in due:
+                self._poll(video_id)
+
+            self._wakeup.clear()
+            self._wakeup.wait(max(0.05, min(next_wake, time.time() + self.max_delay) - time.time()))
+
+    def poll_now(self, video_id: str, source: str = "webhook") -> bool:
+        """Check the status of a tracked job right away
+
+        Used when a webhook reports a video as done: the event is only a
+        hint, and the result comes from the status API.
+
+        Args:
+            video_id: HeyGen video ID
+            source: What prompted the check
+
+        Returns:
+            True if the job was resolved
+        """
+        return self._poll(video_id, source=source)
+
+    def _poll(self, video_id: str, source: str = "poll") -> bool:
+        """Check the status of one job and reschedule it
+
+        Returns:
+            True if the job was resolved
+        """
+        with self._lock:
+            job = self._jobs.get(video_id)
+            if not job:
+                return False
+
+        if time.time() - job.submitted_at > self.timeout:
+            print(f"Timeout waiting for video {video_id} to complete after {self.timeout:.0f}s")
+            return self.resolve(video_id, "failed", error="timeout", source=source)
+
+        try:
+            status, video_url = self.status_fetcher(video_id)
+        except Exception as e:
+            print(f"Error checking video status: {e}")
+            status, video_url = None, None
+
+        if status == "completed" and video_url:
+            return self.resolve(video_id, "completed", video_url=video_url, source=source)
+        if status == "failed":
+            return self.resolve(video_id, "failed", error="Video generation failed", source=source)
+
+        with self._lock:
+            if video_id in self._schedule:
+                _, delay = self._schedule[video_id]
+                delay = min(delay * self.backoff, self.max_delay)
+                self._schedule[video_id] = (time.time() + delay, delay)
+        return False
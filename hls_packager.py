@@ -0,0 +1,388 @@
+import os
+import re
+import math
+import time
+import shutil
+import socket
+import uuid
+import wave
+import subprocess
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from storage_manager import storage_manager
+from state_backend import state_backend
+from video_postprocess import video_postprocessor
+from metrics import metrics
+from tracing import tracer
+
+class HLSStream:
+    """An HLS video that is being rendered segment by segment"""
+
+    def __init__(self, name: str, total_segments: int):
+        """Initialize stream
+
+        Args:
+            name: Stream name (directory under static/videos/hls)
+            total_segments: Number of segments that will be rendered
+        """
+        self.name = name
+        self.total_segments = total_segments
+        self.segments_ready = 0
+        self.started_at = time.time()
+        self.finished = False
+        self.error: Optional[str] = None
+        self._first_segment = threading.Event()
+
+    def wait_first_segment(self, timeout: float = None) -> bool:
+        """Block until the first segment can be played
+
+        Args:
+            timeout: Maximum time to wait in seconds (optional)
+
+        Returns:
+            True if a segment is available, False on failure or timeout
+        """
+        self._first_segment.wait(timeout)
+        return self.segments_ready > 0
+
+class HLSPackager:
+    """Renders long avatar videos as segmented HLS
+
+    The script is split at sentence boundaries into chunks of at most
+    HLS_CHUNK_CHARS characters. Each chunk is rendered as its own clip,
+    transcoded into one MPEG-TS segment per variant and appended to an
+    EVENT playlist, so the player can start after the first segment while
+    later ones are still rendering. A master playlist lists the original
+    quality and the renditions from VIDEO_RENDITIONS so players can adapt
+    to bandwidth. Output layout:
+
+        static/videos/hls/<name>/master.m3u8
+        static/videos/hls/<name>/<variant>/index.m3u8
+        static/videos/hls/<name>/<variant>/seg_000.ts
+    """
+
+    def __init__(self, output_dir: str):
+        """Initialize packager with settings from the environment
+
+        Args:
+            output_dir: Directory for HLS output (served as static files)
+        """
+        self.output_dir = output_dir
+        self.mode = os.getenv("AVATAR_HLS_MODE", "long").lower()  # off, long or always
+        self.min_chars = int(os.getenv("HLS_MIN_CHARS", "300"))
+        self.chunk_chars = int(os.getenv("HLS_CHUNK_CHARS", "180"))
+        self.target_duration = int(os.getenv("HLS_TARGET_DURATION", "15"))
+        self.source_bitrate = os.getenv("HLS_SOURCE_BITRATE", "1500k")
+
+        ffmpeg = video_postprocessor.ffmpeg
+        self.ffprobe = os.getenv("FFPROBE_PATH", "").strip() or shutil.which("ffprobe") or (
+            os.path.join(os.path.dirname(ffmpeg), "ffprobe") if ffmpeg else None
+        )
+
+        self._streams: Dict[str, HLSStream] = {}
+        self._lock = threading.Lock()
+
+        # Workers of a node share the output directory; a claim in the state
+        # backend makes sure only one of them renders (and clears) a stream.
+        # It is renewed after every segment and lapses if the worker dies.
+        self.claim_ttl = float(os.getenv("HLS_RENDER_CLAIM_SECONDS", "300"))
+        self._owner = None
+        self._owner_pid = None
+
+        metrics.gauge(
+            "guidemind_hls_streams_rendering",
+            "HLS videos with segments still rendering"
+        ).set_function(lambda: sum(1 for stream in list(self._streams.values()) if not stream.finished))
+
+    @property
+    def available(self) -> bool:
+        """Whether HLS output can be produced"""
+        return self.mode != "off" and video_postprocessor.enabled
+
+    def should_use(self, kind: str, script: str) -> bool:
+        """Decide whether a video is rendered as HLS
+
+        Args:
+            kind: Kind of video ("welcome", "step" or "help")
+            script: Script the avatar speaks
+
+        Returns:
+            True for help videos and long scripts (always in "always" mode)
+        """
+        if not self.available:
+            return False
+        if self.mode == "always":
+            return True
+        return kind == "help" or len(script) >= self.min_chars
+
+    def split_script(self, script: str) -> List[str]:
+        """Split a script into chunks at sentence boundaries
+
+        Args:
+            script: Script the avatar speaks
+
+        Returns:
+            List of chunks of at most HLS_CHUNK_CHARS characters (unless a
+            single sentence is longer)
+        """
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", script) if s.strip()]
+        chunks = []
+        current = ""
+        for sentence in sentences:
+            if current and len(current) + 1 + len(sentence) > self.chunk_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def variants(self) -> List[Dict[str, Any]]:
+        """Get the variants every segment is transcoded to
+
+        Returns:
+            List of variant dictionaries, highest quality first
+        """
+        variants = [{"name": "src", "height": None, "video_bitrate": self.source_bitrate, "audio_bitrate": "128k"}]
+        for rendition in video_postprocessor.renditions:
+            variants.append({"name": f"{rendition['height']}p", **rendition})
+        return variants
+
+    def stream_dir(self, name: str) -> str:
+        """Get the output directory of a stream"""
+        return os.path.join(self.output_dir, name)
+
+    def url_for(self, name: str) -> str:
+        """Get the master playlist URL of a stream"""
+        return f"/static/videos/hls/{name}/master.m3u8"
+
+    def is_complete(self, name: str) -> bool:
+        """Check whether a stream was fully rendered and no segment was evicted
+
+        Args:
+            name: Stream name
+
+        Returns:
+            True if every variant playlist is finished and all segments exist
+        """
+        directory = self.stream_dir(name)
+        if not os.path.exists(os.path.join(directory, "master.m3u8")):
+            return False
+
+        for variant in self.variants():
+            variant_dir = os.path.join(directory, variant["name"])
+            try:
+                with open(os.path.join(variant_dir, "index.m3u8"), "r") as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                return False
+            if "#EXT-X-ENDLIST" not in lines:
+                return False
+            for line in lines:
+                if line and not line.startswith("#") and not os.path.exists(os.path.join(variant_dir, line)):
+                    return False
+        return True
+
+    def touch(self, name: str):
+        """Mark all files of a stream as used (for LRU eviction)"""
+        for root, _, filenames in os.walk(self.stream_dir(name)):
+            for filename in filenames:
+                storage_manager.touch(os.path.join(root, filename))
+
+    def _claim_key(self, name: str) -> str:
+        """State key of the render claim of a stream on this node"""
+        return f"hls:render:{socket.gethostname()}:{name}"
+
+    @property
+    def owner(self) -> str:
+        """Token identifying this process in render claims (new after a fork)"""
+        if self._owner_pid != os.getpid():
+            self._owner_pid = os.getpid()
+            self._owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        return self._owner
+
+    def has_segment(self, name: str) -> bool:
+        """Check whether a stream has a playable segment (e.g. while another worker renders it)"""
+        directory = self.stream_dir(name)
+        return os.path.exists(os.path.join(directory, "master.m3u8")) and all(
+            os.path.exists(os.path.join(directory, variant["name"], "seg_000.ts")) for variant in self.variants()
+        )
+
+    def get_stream(self, name: str) -> Optional[HLSStream]:
+        """Get a stream that is still rendering in this process"""
+        with self._lock:
+            stream = self._streams.get(name)
+        return stream if stream and not stream.finished else None
+
+    def start(self, name: str, chunks: List[str], render_chunk: Callable[[str, str], Optional[Tuple[str, Optional[str]]]]) -> HLSStream:
+        """Start rendering a stream on a background thread
+
+        Args:
+            name: Stream name
+            chunks: Script chunks, one segment each
+            render_chunk: Function rendering (text, result_file) into a clip,
+                returning (video_path, audio_path) or None on failure
+
+        Returns:
+            Stream to wait on for the first segment, or None if another
+            worker of this node is rendering it
+        """
+        with self._lock:
+            stream = self._streams.get(name)
+            if stream and not stream.finished:
+                return stream
+
+            if not state_backend.add(self._claim_key(name), self.owner, ttl=self.claim_ttl):
+                return None
+
+            stream = HLSStream(name, len(chunks))
+            self._streams[name] = stream
+
+        threading.Thread(
+            target=tracer.bind(self._render_stream),
+            args=(stream, chunks, render_chunk),
+            name=f"hls-{name}",
+            daemon=True
+        ).start()
+        return stream
+
+    def _render_stream(self, stream: HLSStream, chunks: List[str], render_chunk):
+        """Render and package all segments of a stream"""
+        directory = self.stream_dir(stream.name)
+        shutil.rmtree(directory, ignore_errors=True)
+        variants = self.variants()
+        for variant in variants:
+            os.makedirs(os.path.join(directory, variant["name"]), exist_ok=True)
+
+        self._write_master(directory, variants)
+        durations: List[float] = []
+
+        try:
+            for index, chunk in enumerate(chunks):
+                clip_path = os.path.join(directory, f"clip_{index:03d}.tmp.mp4")
+                rendered = render_chunk(chunk, clip_path)
+                if not rendered:
+                    raise RuntimeError(f"Failed to render segment {index}")
+                video_path, audio_path = rendered
+
+                duration = self._duration(video_path, audio_path)
+                offset = sum(durations)
+                for variant in variants:
+                    segment = os.path.join(directory, variant["name"], f"seg_{index:03d}.ts")
+                    if not self._transcode_segment(video_path, segment, variant, offset):
+                        raise RuntimeError(f"Failed to package segment {index} ({variant['name']})")
+
+                if os.path.exists(video_path):
+                    os.remove(video_path)
+
+                durations.append(duration)
+                for variant in variants:
+                    self._write_playlist(directory, variant, durations, finished=index == len(chunks) - 1)
+
+                stream.segments_ready = index + 1
+                stream._first_segment.set()
+                state_backend.set(self._claim_key(stream.name), self.owner, ttl=self.claim_ttl)
+                print(f"HLS {stream.name}: segment {index + 1}/{len(chunks)} ready after {time.time() - stream.started_at:.1f}s")
+        except Exception as e:
+            print(f"Error rendering HLS stream {stream.name}: {e}")
+            stream.error = str(e)
+            if not stream.segments_ready:
+                shutil.rmtree(directory, ignore_errors=True)
+        finally:
+            stream.finished = True
+            stream._first_segment.set()
+            state_backend.delete_if(self._claim_key(stream.name), self.owner)
+            storage_manager.maybe_run()
+
+    def _duration(self, video_path: str, audio_path: Optional[str]) -> float:
+        """Get the duration of a clip from ffprobe, or its narration audio"""
+        if self.ffprobe:
+            try:
+                result = subprocess.run(
+                    [self.ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", video_path],
+                    capture_output=True,
+                    text=True,
+                    timeout=30
+                )
+                return float(result.stdout.strip())
+            except Exception as e:
+                print(f"Error probing clip duration: {e}")
+
+        if audio_path:
+            try:
+                with wave.open(audio_path, "rb") as audio:
+                    return audio.getnframes() / float(audio.getframerate())
+            except Exception as e:
+                print(f"Error reading narration duration: {e}")
+
+        return float(self.target_duration)
+
+    def _transcode_segment(self, clip_path: str, segment_path: str, variant: Dict[str, Any], offset: float) -> bool:
+        """Transcode a clip into one MPEG-TS segment of a variant"""
+        temp_path = f"{segment_path}.{os.getpid()}.tmp.ts"
+        args = ["-i", clip_path]
+        if variant["height"]:
+            args += ["-vf", f"scale=-2:'min({variant['height']},ih)'"]
+        args += [
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+            "-b:v", variant["video_bitrate"], "-maxrate", variant["video_bitrate"],
+            "-bufsize", variant["video_bitrate"],
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", variant["audio_bitrate"], "-ar", "44100",
+            # Continue the timeline of the previous segments
+            "-output_ts_offset", f"{offset:.3f}",
+            "-f", "mpegts",
+            temp_path
+        ]
+        if not video_postprocessor._run(args):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        os.replace(temp_path, segment_path)
+        return True
+
+    @staticmethod
+    def _bandwidth(bitrate: str) -> int:
+        """Convert a bitrate like "700k" to bits per second"""
+        value = bitrate.strip().lower()
+        multiplier = {"k": 1000, "m": 1000000}.get(value[-1:], 1)
+        return int(float(value.rstrip("km")) * multiplier)
+
+    def _write_master(self, directory: str, variants: List[Dict[str, Any]]):
+        """Write the master playlist listing all variants"""
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        for variant in variants:
+            bandwidth = self._bandwidth(variant["video_bitrate"]) + self._bandwidth(variant["audio_bitrate"])
+            lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth}")
+            lines.append(f"{variant['name']}/index.m3u8")
+        self._write_atomic(os.path.join(directory, "master.m3u8"), lines)
+
+    def _write_playlist(self, directory: str, variant: Dict[str, Any], durations: List[float], finished: bool):
+        """Write the EVENT playlist of a variant with the segments so far"""
+        target = max(self.target_duration, math.ceil(max(durations)))
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{target}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for index, duration in enumerate(durations):
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(f"seg_{index:03d}.ts")
+        if finished:
+            lines.append("#EXT-X-ENDLIST")
+        self._write_atomic(os.path.join(directory, variant["name"], "index.m3u8"), lines)
+
+    @staticmethod
+    def _write_atomic(path: str, lines: List[str]):
+        """Write a playlist through a temporary file so players never read a partial one"""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+# Create packager instance
+hls_packager = HLSPackager(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "videos", "hls"))
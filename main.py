@@ -1,18 +1,161 @@
-import anthropic
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables first: the modules below read their settings
+# at import time, so this can't wait for the first LLM call
 load_dotenv()
 
-# Initialize Anthropic client - simple version
-client = anthropic.Client(api_key=os.getenv("CLAUDE_API_KEY"))
+from content_cache import content_cache, make_key
+from metrics import metrics, record_llm_call
+from model_policy import model_policy, HAIKU, SONNET, OPUS
+from canned_content import canned_explanation, canned_troubleshooting, generic_explanation, generic_troubleshooting
+from tracing import tracer
+from state_backend import MemoryBackend
+
+# Anthropic client is created on first use so importing this module stays cheap
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Get the shared Anthropic client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import anthropic
+                options = {}
+                # ANTHROPIC_BASE_URL points the client at a proxy or stand-in (see bench/)
+                if os.getenv("ANTHROPIC_BASE_URL"):
+                    options["base_url"] = os.getenv("ANTHROPIC_BASE_URL")
+                _client = anthropic.Anthropic(api_key=os.getenv("CLAUDE_API_KEY"), **options)
+    return _client
+
+def complete(method, prompt, max_tokens, model):
+    """Run a completion and record its latency and token counts
+    
+    Args:
+        method: Name of the calling method (metrics label)
+        prompt: Prompt text
+        max_tokens: Maximum tokens to sample
+        model: Model name
+        
+    Returns:
+        Completion text
+    """
+    started = time.perf_counter()
+    try:
+        with tracer.span("llm.complete", method=method, model=model):
+            response = get_client().messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=0,
+                messages=[{"role": "user", "content": prompt}]
+            )
+    except Exception:
+        record_llm_call(method, model, time.perf_counter() - started, status="error")
+        raise
+    
+    record_llm_call(
+        method,
+        model,
+        time.perf_counter() - started,
+        input_tokens=response.usage.input_tokens,
+        output_tokens=response.usage.output_tokens
+    )
+    return "".join(block.text for block in response.content if block.type == "text")
+
+def complete_for(call_type, method, prompt, is_acceptable=None):
+    """Run a completion with the model and token budget of a call type
+    
+    Args:
+        call_type: Model policy call type (e.g. "explain")
+        method: Name of the calling method (metrics label)
+        prompt: Prompt text
+        is_acceptable: Optional check of the completion; rejected completions
+            are retried on the call type's escalation model
+        
+    Returns:
+        Completion text
+    """
+    return model_policy.run(
+        call_type,
+        lambda model, max_tokens: complete(method, prompt, max_tokens, model),
+        is_acceptable
+    )
+
+# Latency budgets in seconds for routes that wait on the LLM; when a budget runs
+# out the route answers with fallback content and the real answer finishes in
+# the background to fill the cache
+ROUTE_BUDGETS = {
+    "get_step": float(os.getenv("ROUTE_BUDGET_GET_STEP", "4")),
+    "troubleshoot": float(os.getenv("ROUTE_BUDGET_TROUBLESHOOT", "6")),
+}
+
+# Answers being generated, by cache key, so concurrent and retried requests
+# for the same prompt share one LLM call
+_answers = {}
+_answers_lock = threading.Lock()
+_answer_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_ANSWER_WORKERS", "4")),
+    thread_name_prefix="llm-answer"
+)
+
+# Sources of fallback answers; responses from them are marked degraded so
+# the client asks again for the current tier's answer
+DEGRADED_SOURCES = ("other_tier", "canned", "generic")
+
+_degraded_responses = metrics.counter(
+    "guidemind_degraded_responses_total",
+    "Responses served from fallback content after the LLM missed its budget",
+    ["route", "source"]
+)
+
+def _generate_answer(cache_key, call_type, method, prompt, is_acceptable):
+    """Generate an answer and store it in the cache"""
+    completion = complete_for(call_type, method, prompt, is_acceptable)
+    content_cache.set("llm", cache_key, completion)
+    return completion
+
+def _answer_future(cache_key, call_type, method, prompt, is_acceptable):
+    """Start generating an answer, or join the generation already running"""
+    with _answers_lock:
+        future = _answers.get(cache_key)
+        if future is not None:
+            return future
+        future = _answer_executor.submit(
+            tracer.bind(_generate_answer), cache_key, call_type, method, prompt, is_acceptable
+        )
+        _answers[cache_key] = future
+    
+    def forget(done_future):
+        with _answers_lock:
+            if _answers.get(cache_key) is done_future:
+                del _answers[cache_key]
+    
+    future.add_done_callback(forget)
+    return future
+
+def _has_steps(completion):
+    """Check that a parsed manual has more than one step"""
+    return len([line for line in completion.split('\n') if line.strip()]) > 1
+
+def _is_substantive(completion):
+    """Check that an answer is more than a fragment"""
+    return len(completion.strip()) >= 40
 
 class GuideMind:
-    def __init__(self):
-        self.instructions = []
-        self.current_step = 0
+    def __init__(self, state=None):
+        """Initialize guide
+        
+        Args:
+            state: State backend holding the instructions and current step
+                (optional, in-process if omitted); the web app passes the
+                shared backend so every worker sees the same session
+        """
+        self.state = state or MemoryBackend()
         self.preloaded_instructions = {
             "basic_crane": """
                 1. Start with a square piece of paper, colored side down.
@@ -28,6 +171,24 @@ class GuideMind:
             """
         }
     
+    @property
+    def instructions(self):
+        """Parsed instruction steps"""
+        return self.state.get("guide:instructions", [])
+    
+    @instructions.setter
+    def instructions(self, instructions):
+        self.state.set("guide:instructions", instructions)
+    
+    @property
+    def current_step(self):
+        """Index of the current step"""
+        return self.state.get("guide:current_step", 0)
+    
+    @current_step.setter
+    def current_step(self, step):
+        self.state.set("guide:current_step", step)
+    
     def parse_instructions(self, manual_text=None, preloaded_key=None):
         """Parse either uploaded manual text or use preloaded instructions"""
         if preloaded_key and preloaded_key in self.preloaded_instructions:
@@ -49,59 +210,98 @@ class GuideMind:
             {instruction_text}
             """
             
-        response = client.completion(
-            prompt=f"\n\nHuman: {prompt}\n\nAssistant:",
-            model="claude-3-opus-20240229",
-            max_tokens_to_sample=1000,
-            temperature=0
-        )
-        parsed_steps = response.completion
+        # Parsed manuals are cached by content so each manual is parsed once
+        cache_key = make_key("parse_instructions", model_policy.model_for("parse"), prompt)
+        instructions = content_cache.get("llm", cache_key)
         
-        self.instructions = [step.strip() for step in parsed_steps.split('\n') if step.strip()]
+        if instructions is None:
+            parsed_steps = complete_for("parse", "parse_instructions", prompt, _has_steps)
+            
+            instructions = [step.strip() for step in parsed_steps.split('\n') if step.strip()]
+            content_cache.set("llm", cache_key, instructions)
+        
+        self.instructions = instructions
         self.current_step = 0
         return True
     
     def get_current_step(self):
         """Get the current step instruction"""
-        if 0 <= self.current_step < len(self.instructions):
-            return self.instructions[self.current_step]
+        instructions, current_step = self.instructions, self.current_step
+        if 0 <= current_step < len(instructions):
+            return instructions[current_step]
         return None
     
     def next_step(self):
         """Move to next step if available"""
-        if self.current_step < len(self.instructions) - 1:
-            self.current_step += 1
+        current_step = self.current_step
+        if current_step < len(self.instructions) - 1:
+            self.current_step = current_step + 1
             return True
         return False
     
     def previous_step(self):
         """Move to previous step if available"""
-        if self.current_step > 0:
-            self.current_step -= 1
+        current_step = self.current_step
+        if current_step > 0:
+            self.current_step = current_step - 1
             return True
         return False
     
-    def get_step_explanation(self, step_text):
-        """Get detailed explanation for a particular step"""
-        prompt = f"""
+    def _answer(self, method, call_type, prompt, is_acceptable, budget=None, fallback=None):
+        """Get an LLM answer from the cache, or generate it within a budget
+        
+        Args:
+            method: Name of the calling method (cache key and metrics label)
+            call_type: Model policy call type
+            prompt: Prompt text
+            is_acceptable: Check of the completion (see complete_for)
+            budget: Seconds to wait for a new answer (None waits indefinitely
+                and raises if the LLM call fails)
+            fallback: Function returning (text, source) when the budget runs
+                out or the call fails
+            
+        Returns:
+            Tuple of (text, source) where source is "llm", "cache",
+            "other_tier" (cached under another model) or the fallback's source
+        """
+        cache_key = make_key(method, model_policy.model_for(call_type), prompt)
+        cached = content_cache.get("llm", cache_key)
+        if cached is not None:
+            return cached, "cache"
+        
+        future = _answer_future(cache_key, call_type, method, prompt, is_acceptable)
+        if budget is None:
+            return future.result(), "llm"
+        
+        try:
+            return future.result(timeout=budget), "llm"
+        except FutureTimeoutError:
+            # A zero budget only peeks; the answer is expected to be pending
+            if budget:
+                print(f"{method} missed its {budget:.1f}s budget; answering with fallback content")
+        except Exception as e:
+            print(f"{method} failed ({e}); answering with fallback content")
+        
+        # An answer from another model tier (e.g. before the policy changed)
+        for model in (HAIKU, SONNET, OPUS):
+            if model != model_policy.model_for(call_type):
+                cached = content_cache.get("llm", make_key(method, model, prompt))
+                if cached is not None:
+                    return cached, "other_tier"
+        
+        return fallback()
+    
+    def _explanation_prompt(self, step_text):
+        return f"""
         You are an expert origami instructor. Explain this step in detail:
         
         Step: {step_text}
         
         Provide a clear, detailed explanation that would help a beginner understand exactly what to do.
         """
-        
-        response = client.completion(
-            prompt=f"\n\nHuman: {prompt}\n\nAssistant:",
-            model="claude-3-opus-20240229",
-            max_tokens_to_sample=500,
-            temperature=0
-        )
-        return response.completion
     
-    def get_troubleshooting(self, step_text):
-        """Get troubleshooting advice for when user is stuck"""
-        prompt = f"""
+    def _troubleshooting_prompt(self, step_text):
+        return f"""
         A user is stuck on this origami step:
         
         Step: {step_text}
@@ -112,14 +312,95 @@ class GuideMind:
         3. Remedial actions (e.g., "try refolding the top corner")
         4. A simple check to confirm they're back on track
         """
+    
+    def get_step_explanation(self, step_text):
+        """Get detailed explanation for a particular step"""
+        text, _ = self._answer(
+            "get_step_explanation", "explain", self._explanation_prompt(step_text), _is_substantive
+        )
+        return text
+    
+    def get_troubleshooting(self, step_text):
+        """Get troubleshooting advice for when user is stuck"""
+        text, _ = self._answer(
+            "get_troubleshooting", "troubleshoot", self._troubleshooting_prompt(step_text), _is_substantive
+        )
+        return text
+    
+    def get_step_explanation_within(self, step_text, budget=None, route="get_step"):
+        """Get an explanation for a step, degrading to fallback content
+        
+        Args:
+            step_text: Text of the step
+            budget: Seconds to wait for the LLM (default ROUTE_BUDGET_GET_STEP)
+            route: Route the degraded-response counter is labelled with
+            
+        Returns:
+            Dictionary with text, source ("llm", "cache", "other_tier",
+            "canned" or "generic") and degraded (True for fallback content)
+        """
+        text, source = self._answer(
+            "get_step_explanation", "explain", self._explanation_prompt(step_text), _is_substantive,
+            budget=ROUTE_BUDGETS["get_step"] if budget is None else budget,
+            fallback=lambda: self._explanation_fallback(step_text)
+        )
+        return self._budgeted_result(route, text, source)
+    
+    def peek_step_explanation(self, step_text):
+        """Get a step's explanation without waiting for the LLM
+        
+        Starts generating the explanation in the background if it isn't
+        cached, so a later request for the step finds it ready. Fallback
+        content served here is not counted as a degraded response.
+        
+        Args:
+            step_text: Text of the step
+            
+        Returns:
+            Dictionary with text, source and degraded (see get_step_explanation_within)
+        """
+        text, source = self._answer(
+            "get_step_explanation", "explain", self._explanation_prompt(step_text), _is_substantive,
+            budget=0, fallback=lambda: self._explanation_fallback(step_text)
+        )
+        return self._budgeted_result(None, text, source)
+    
+    def get_troubleshooting_within(self, step_text, budget=None):
+        """Get troubleshooting advice for a step, degrading to fallback content
         
-        response = client.completion(
-            prompt=f"\n\nHuman: {prompt}\n\nAssistant:",
-            model="claude-3-opus-20240229",
-            max_tokens_to_sample=500,
-            temperature=0
+        Args:
+            step_text: Text of the step
+            budget: Seconds to wait for the LLM (default ROUTE_BUDGET_TROUBLESHOOT)
+            
+        Returns:
+            Dictionary with text, source and degraded (see get_step_explanation_within)
+        """
+        text, source = self._answer(
+            "get_troubleshooting", "troubleshoot", self._troubleshooting_prompt(step_text), _is_substantive,
+            budget=ROUTE_BUDGETS["troubleshoot"] if budget is None else budget,
+            fallback=lambda: self._troubleshooting_fallback(step_text)
         )
-        return response.completion
+        return self._budgeted_result("troubleshoot", text, source)
+    
+    def _explanation_fallback(self, step_text):
+        """Get canned or generic content for a step explanation"""
+        canned = canned_explanation(step_text)
+        return (canned, "canned") if canned else (generic_explanation(step_text), "generic")
+    
+    def _troubleshooting_fallback(self, step_text):
+        """Get canned or generic troubleshooting advice for a step"""
+        canned = canned_troubleshooting(step_text)
+        return (canned, "canned") if canned else (generic_troubleshooting(step_text), "generic")
+    
+    def _budgeted_result(self, route, text, source):
+        """Build the result of a budgeted answer and count degraded ones
+        
+        Degraded answers are not counted when route is None (prefetches).
+        """
+        degraded = source in DEGRADED_SOURCES
+        if degraded and route:
+            _degraded_responses.inc(route=route, source=source)
+        return {"text": text, "source": source, "degraded": degraded}
 
 # Demo usage
 if __name__ == "__main__":
@@ -0,0 +1,457 @@
+import os
+import hmac
+import time
+import shutil
+import socket
+import hashlib
+import tempfile
+import uuid
+from typing import Callable, Dict, Optional
+from urllib.parse import quote, urlparse
+from metrics import record_cache
+from state_backend import state_backend
+
+# Seconds between checks while waiting for another node's render
+POLL_INTERVAL = 1.0
+
+def _temp_path(path: str) -> str:
+    """Create a unique temporary file next to path for an atomic replace"""
+    # Threads of one worker may write the same object at once, so a
+    # PID-based name is not enough
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    return temp_path
+
+class MediaStore:
+    """Store for rendered media shared by every node of a deployment
+
+    Rendered videos are published to the store under a content-addressed
+    name (e.g. ``sadtalker/step_<key>.mp4``). Before rendering, a node looks
+    the name up in the store and either downloads the file into its local
+    cache or redirects the client to the store. Renders are claimed through
+    the state backend, so a video that another node is already rendering is
+    waited for instead of rendered again.
+
+    This base class is the disabled store (MEDIA_STORE=off): nothing is
+    found and nothing is published, and only local files are used.
+    """
+
+    name = "off"
+
+    def __init__(self, public_url: str = None, redirect: bool = False):
+        """Initialize media store
+
+        Args:
+            public_url: Base URL the store's objects are served from (e.g. a CDN)
+            redirect: Send clients to the store instead of downloading objects
+                to the local cache first
+        """
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.redirect = redirect
+        # How long a render claim is held, and how long other nodes wait for it
+        self.render_wait = float(os.getenv("MEDIA_STORE_RENDER_WAIT", "300"))
+        # How long a request waits for another node's render before giving up;
+        # bounded like the avatar deadline so request threads aren't held for
+        # the whole render
+        self.wait_timeout = float(os.getenv("MEDIA_STORE_WAIT_SECONDS", os.getenv("AVATAR_DEADLINE_SECONDS", "30")))
+        self._owner = None
+        self._owner_pid = None
+
+    @property
+    def owner(self) -> str:
+        """Token identifying this process in render claims
+
+        Regenerated after a fork, so preloaded workers don't share one.
+        """
+        if self._owner_pid != os.getpid():
+            self._owner_pid = os.getpid()
+            self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        return self._owner
+
+    @property
+    def enabled(self) -> bool:
+        """Whether a store is configured"""
+        return self.name != "off"
+
+    def exists(self, name: str) -> bool:
+        """Check whether an object is in the store"""
+        return False
+
+    def put(self, name: str, path: str, content_type: str = "application/octet-stream") -> bool:
+        """Upload a local file
+
+        Args:
+            name: Object name
+            path: Local file to upload
+            content_type: MIME type of the file
+
+        Returns:
+            True if the object was stored
+        """
+        return False
+
+    def _download(self, name: str, path: str) -> bool:
+        """Download an object to a file (implemented by subclasses)"""
+        return False
+
+    def url(self, name: str) -> Optional[str]:
+        """Get a URL clients can fetch an object from, or None if there is none"""
+        if self.public_url:
+            return f"{self.public_url}/{quote(name)}"
+        return None
+
+    def fetch(self, name: str, path: str, record: bool = True) -> bool:
+        """Download an object into the local cache
+
+        The file is written next to its destination and renamed into place,
+        so readers never see a partial file.
+
+        Args:
+            name: Object name
+            path: Local destination
+            record: Count the lookup in the media_store cache metrics
+                (off for optional companions such as posters)
+
+        Returns:
+            True if the object was found and downloaded
+        """
+        if not self.enabled:
+            return False
+
+        temp_path = _temp_path(path)
+        try:
+            found = self._download(name, temp_path)
+            if found:
+                os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Error fetching {name} from the media store: {e}")
+            found = False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        if record:
+            record_cache("media_store", found)
+        return found
+
+    def publish(self, name: str, path: str, content_type: str = "video/mp4"):
+        """Upload a local file, logging instead of raising on failure"""
+        if not self.enabled or not os.path.exists(path):
+            return
+        try:
+            if not self.put(name, path, content_type):
+                print(f"Media store rejected {name}")
+        except Exception as e:
+            print(f"Error publishing {name} to the media store: {e}")
+
+    def claim(self, name: str) -> bool:
+        """Claim the render of an object for this node
+
+        The claim expires after MEDIA_STORE_RENDER_WAIT seconds if it is never
+        released (e.g. the node died mid-render).
+
+        Args:
+            name: Object name
+
+        Returns:
+            True if this node should render; False if another node is
+            rendering it already
+        """
+        if not self.enabled:
+            return True
+        return state_backend.add(f"media:render:{name}", self.owner, ttl=self.render_wait)
+
+    def release(self, name: str):
+        """Release a render claim held by this process
+
+        A claim taken by another process (or one that expired and was taken
+        over) is left alone.
+        """
+        if self.enabled:
+            state_backend.delete_if(f"media:render:{name}", self.owner)
+
+    def wait_for(self, name: str, ready: Callable[[], bool] = None, timeout: float = None) -> bool:
+        """Wait for an object that another node is rendering
+
+        Waits up to MEDIA_STORE_WAIT_SECONDS (default AVATAR_DEADLINE_SECONDS),
+        and stops early when the other node gives up (its claim is released
+        or expires without the object appearing).
+
+        Args:
+            name: Object name
+            ready: Optional check to use instead of looking the object up
+            timeout: Seconds to wait (default MEDIA_STORE_WAIT_SECONDS)
+
+        Returns:
+            True if the object became available
+        """
+        ready = ready or (lambda: self.exists(name))
+        deadline = time.time() + (self.wait_timeout if timeout is None else timeout)
+        while time.time() < deadline:
+            if ready():
+                return True
+            if state_backend.get(f"media:render:{name}") is None:
+                return ready()
+            time.sleep(POLL_INTERVAL)
+        return False
+
+class LocalMediaStore(MediaStore):
+    """Media store in a directory, e.g. a volume mounted on every node"""
+
+    name = "local"
+
+    def __init__(self, root: str, public_url: str = None, redirect: bool = False):
+        """Initialize local media store
+
+        Args:
+            root: Store directory
+            public_url: Base URL the directory is served from (optional)
+            redirect: Send clients to public_url instead of copying objects
+        """
+        super().__init__(public_url, redirect)
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, *name.split("/"))
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def put(self, name: str, path: str, content_type: str = "application/octet-stream") -> bool:
+        destination = self._path(name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        temp_path = _temp_path(destination)
+        try:
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, destination)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return True
+
+    def _download(self, name: str, path: str) -> bool:
+        if not self.exists(name):
+            return False
+        shutil.copyfile(self._path(name), path)
+        return True
+
+class SigV4Client:
+    """Minimal S3 client (path-style requests signed with AWS Signature V4)
+
+    Used when boto3 is not installed. Covers the calls the media store makes:
+    HEAD, PUT and GET of single objects, and presigned GET URLs.
+    """
+
+    def __init__(self, endpoint: str, region: str, access_key: str, secret_key: str, timeout: float = 60):
+        """Initialize client
+
+        Args:
+            endpoint: Service URL (e.g. ``https://s3.us-east-1.amazonaws.com``
+                or a MinIO server)
+            region: Signing region
+            access_key: Access key ID
+            secret_key: Secret access key
+            timeout: Request timeout in seconds
+        """
+        self.endpoint = endpoint.rstrip("/")
+        self.host = urlparse(self.endpoint).netloc
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.timeout = timeout
+
+    def _signature(self, amz_date: str, canonical_request: str) -> str:
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        ])
+        key = f"AWS4{self.secret_key}".encode("utf-8")
+        for part in (amz_date[:8], self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+        return hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _request(self, method: str, bucket: str, key: str, body: bytes = b"", headers: Dict[str, str] = None, stream: bool = False):
+        import requests
+
+        uri = quote(f"/{bucket}/{key}", safe="/-_.~")
+        amz_date = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        payload_hash = hashlib.sha256(body).hexdigest()
+        canonical_request = "\n".join([
+            method, uri, "",
+            f"host:{self.host}\nx-amz-content-sha256:{payload_hash}\nx-amz-date:{amz_date}\n",
+            "host;x-amz-content-sha256;x-amz-date",
+            payload_hash
+        ])
+        headers = dict(headers or {})
+        headers.update({
+            "x-amz-content-sha256": payload_hash,
+            "x-amz-date": amz_date,
+            "Authorization": (
+                f"AWS4-HMAC-SHA256 Credential={self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request, "
+                f"SignedHeaders=host;x-amz-content-sha256;x-amz-date, "
+                f"Signature={self._signature(amz_date, canonical_request)}"
+            )
+        })
+        return requests.request(method, f"{self.endpoint}{uri}", data=body or None, headers=headers,
+                                timeout=self.timeout, stream=stream)
+
+    def head_object(self, bucket: str, key: str) -> bool:
+        response = self._request("HEAD", bucket, key)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    def put_object(self, bucket: str, key: str, path: str, content_type: str) -> bool:
+        with open(path, "rb") as f:
+            body = f.read()
+        response = self._request("PUT", bucket, key, body, {"Content-Type": content_type})
+        response.raise_for_status()
+        return True
+
+    def get_object(self, bucket: str, key: str, path: str) -> bool:
+        response = self._request("GET", bucket, key, stream=True)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+        return True
+
+    def presigned_url(self, bucket: str, key: str, expires: int) -> str:
+        uri = quote(f"/{bucket}/{key}", safe="/-_.~")
+        amz_date = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        params = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires),
+            "X-Amz-SignedHeaders": "host",
+        }
+        query = "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in sorted(params.items()))
+        canonical_request = "\n".join(["GET", uri, query, f"host:{self.host}\n", "host", "UNSIGNED-PAYLOAD"])
+        return f"{self.endpoint}{uri}?{query}&X-Amz-Signature={self._signature(amz_date, canonical_request)}"
+
+class S3MediaStore(MediaStore):
+    """Media store in an S3-compatible bucket (AWS S3, MinIO, R2, ...)
+
+    Uses boto3 when it is installed and the built-in SigV4 client otherwise.
+    Clients are redirected to presigned URLs unless MEDIA_STORE_PUBLIC_URL
+    points at a public or CDN endpoint for the bucket.
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint: str = None, region: str = "us-east-1",
+                 public_url: str = None, redirect: bool = False, url_ttl: int = 3600):
+        """Initialize S3 media store
+
+        Args:
+            bucket: Bucket name
+            prefix: Prefix for every object name
+            endpoint: Service URL (optional, AWS S3 in the region if omitted)
+            region: Bucket region
+            public_url: Base URL the bucket is served from (optional)
+            redirect: Send clients to the bucket instead of copying objects
+            url_ttl: Lifetime of presigned URLs in seconds
+        """
+        super().__init__(public_url, redirect)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_ttl = url_ttl
+        access_key = os.getenv("AWS_ACCESS_KEY_ID", "")
+        secret_key = os.getenv("AWS_SECRET_ACCESS_KEY", "")
+
+        try:
+            import boto3
+            self._boto = boto3.client(
+                "s3", endpoint_url=endpoint or None, region_name=region,
+                aws_access_key_id=access_key or None, aws_secret_access_key=secret_key or None
+            )
+            self._client = None
+        except ImportError:
+            self._boto = None
+            self._client = SigV4Client(endpoint or f"https://s3.{region}.amazonaws.com", region, access_key, secret_key)
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}{name}"
+
+    def exists(self, name: str) -> bool:
+        try:
+            if self._boto:
+                self._boto.head_object(Bucket=self.bucket, Key=self._key(name))
+                return True
+            return self._client.head_object(self.bucket, self._key(name))
+        except Exception as e:
+            # boto3 reports a missing object as a 404 ClientError
+            response = getattr(e, "response", None)
+            code = response.get("Error", {}).get("Code") if isinstance(response, dict) else None
+            if code not in ("404", "NoSuchKey"):
+                print(f"Error checking {name} in the media store: {e}")
+            return False
+
+    def put(self, name: str, path: str, content_type: str = "application/octet-stream") -> bool:
+        if self._boto:
+            self._boto.upload_file(path, self.bucket, self._key(name), ExtraArgs={"ContentType": content_type})
+            return True
+        return self._client.put_object(self.bucket, self._key(name), path, content_type)
+
+    def _download(self, name: str, path: str) -> bool:
+        if self._boto:
+            if not self.exists(name):
+                return False
+            self._boto.download_file(self.bucket, self._key(name), path)
+            return True
+        return self._client.get_object(self.bucket, self._key(name), path)
+
+    def url(self, name: str) -> Optional[str]:
+        if self.public_url:
+            return f"{self.public_url}/{quote(self._key(name))}"
+        if self._boto:
+            return self._boto.generate_presigned_url(
+                "get_object", Params={"Bucket": self.bucket, "Key": self._key(name)}, ExpiresIn=self.url_ttl
+            )
+        return self._client.presigned_url(self.bucket, self._key(name), self.url_ttl)
+
+def create_media_store() -> MediaStore:
+    """Create the media store selected by MEDIA_STORE
+
+    ``off`` (default) uses only local files; ``local`` shares MEDIA_STORE_DIR;
+    ``s3`` uses MEDIA_STORE_S3_BUCKET on MEDIA_STORE_S3_ENDPOINT (or AWS S3).
+
+    Returns:
+        Media store
+    """
+    kind = os.getenv("MEDIA_STORE", "off").strip().lower()
+    public_url = os.getenv("MEDIA_STORE_PUBLIC_URL", "").strip() or None
+    redirect = os.getenv("MEDIA_STORE_REDIRECT", "false").lower() == "true"
+
+    if kind == "local":
+        root = os.getenv("MEDIA_STORE_DIR", "").strip()
+        if root:
+            return LocalMediaStore(root, public_url, redirect)
+        print("MEDIA_STORE=local needs MEDIA_STORE_DIR; media store disabled")
+    elif kind == "s3":
+        bucket = os.getenv("MEDIA_STORE_S3_BUCKET", "").strip()
+        if bucket:
+            return S3MediaStore(
+                bucket,
+                prefix=os.getenv("MEDIA_STORE_S3_PREFIX", "guidemind/"),
+                endpoint=os.getenv("MEDIA_STORE_S3_ENDPOINT", "").strip() or None,
+                region=os.getenv("MEDIA_STORE_S3_REGION", "us-east-1"),
+                public_url=public_url,
+                redirect=redirect,
+                url_ttl=int(os.getenv("MEDIA_STORE_URL_TTL", "3600"))
+            )
+        print("MEDIA_STORE=s3 needs MEDIA_STORE_S3_BUCKET; media store disabled")
+    elif kind != "off":
+        print(f"Unknown MEDIA_STORE '{kind}'; media store disabled")
+    return MediaStore()
+
+# Create media store instance
+media_store = create_media_store()
@@ -0,0 +1,379 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default histogram buckets in seconds, covering fast routes up to long renders
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Sequence[Tuple[str, str]] = ()) -> str:
+    """Format a label set like {route="/api",method="GET"}"""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    """Format a sample value"""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    """Base class for metrics with a fixed set of label names"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Get the label values in label name order"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        """Render the sample lines of this metric"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """Render this metric in the text exposition format"""
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ] + self.samples()
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """Increase the counter
+
+        Args:
+            amount: Amount to add
+            labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Get the current value for a label set"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+class Gauge(_Metric):
+    """Value that can go up and down, or is computed at scrape time"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        """Set the gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        """Increase the gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        """Decrease the gauge"""
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """Compute the gauge by calling a function at scrape time
+
+        Args:
+            function: Function returning the current value
+            labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+
+        for key, function in functions.items():
+            try:
+                values[key] = float(function())
+            except Exception as e:
+                print(f"Error collecting metric {self.name}: {e}")
+
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[Tuple[str, ...], Dict[str, object]] = {}
+
+    def observe(self, value: float, **labels):
+        """Record an observation
+
+        Args:
+            value: Observed value (seconds for durations)
+            labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = series
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = {key: {"counts": list(s["counts"]), "sum": s["sum"], "count": s["count"]} for key, s in self._values.items()}
+
+        lines = []
+        for key, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+class MetricsRegistry:
+    """Registry of all metrics exposed on /metrics
+
+    Metrics are created on first use and shared by name, so modules can
+    declare the metrics they record without import-order concerns. The
+    output follows the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Get or create a counter"""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Get or create a gauge"""
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram"""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Register a custom metric instance"""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """Get a registered metric by name"""
+        with self._lock:
+            return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render all metrics in the text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Shared registry
+metrics = MetricsRegistry()
+
+# Metrics recorded from several modules
+CACHE_REQUESTS = metrics.counter(
+    "guidemind_cache_requests_total",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"]
+)
+
+def record_cache(cache: str, hit: bool):
+    """Record a cache lookup
+
+    Args:
+        cache: Cache name
+        hit: Whether the lookup was a hit
+    """
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def _cache_hit_ratios() -> Dict[str, float]:
+    """Compute the hit ratio of every cache seen so far"""
+    with CACHE_REQUESTS._lock:
+        values = dict(CACHE_REQUESTS._values)
+    caches = {cache for cache, _ in values}
+    ratios = {}
+    for cache in caches:
+        hits = values.get((cache, "hit"), 0)
+        total = hits + values.get((cache, "miss"), 0)
+        ratios[cache] = hits / total if total else 0.0
+    return ratios
+
+class _CacheHitRatioGauge(Gauge):
+    """Hit ratio per cache, derived from guidemind_cache_requests_total"""
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, (cache,))} {_format_value(ratio)}"
+            for cache, ratio in sorted(_cache_hit_ratios().items())
+        ]
+
+metrics.register(_CacheHitRatioGauge(
+    "guidemind_cache_hit_ratio",
+    "Fraction of lookups served from cache since start, by cache",
+    ["cache"]
+))
+
+LLM_DURATION = metrics.histogram(
+    "guidemind_llm_request_duration_seconds",
+    "Latency of LLM calls by method",
+    ["method", "model"]
+)
+LLM_REQUESTS = metrics.counter(
+    "guidemind_llm_requests_total",
+    "LLM calls by method and status",
+    ["method", "status"]
+)
+LLM_TOKENS = metrics.counter(
+    "guidemind_llm_tokens_total",
+    "LLM tokens by method and direction (input or output)",
+    ["method", "direction"]
+)
+
+def record_llm_call(method: str, model: str, seconds: float, input_tokens: int = None, output_tokens: int = None, status: str = "success"):
+    """Record an LLM call
+
+    Args:
+        method: Calling method (e.g. "get_step_explanation")
+        model: Model name
+        seconds: Call latency
+        input_tokens: Prompt tokens (if known)
+        output_tokens: Completion tokens (if known)
+        status: "success" or "error"
+    """
+    LLM_DURATION.observe(seconds, method=method, model=model)
+    LLM_REQUESTS.inc(method=method, status=status)
+    if input_tokens:
+        LLM_TOKENS.inc(input_tokens, method=method, direction="input")
+    if output_tokens:
+        LLM_TOKENS.inc(output_tokens, method=method, direction="output")
+
+TTS_DURATION = metrics.histogram(
+    "guidemind_tts_duration_seconds",
+    "Narration synthesis time by engine",
+    ["engine"]
+)
+RENDER_DURATION = metrics.histogram(
+    "guidemind_render_duration_seconds",
+    "Avatar video render time by backend and kind",
+    ["backend", "kind"]
+)
+
+def instrument_app(app):
+    """Record request latency per route template for a Flask app
+
+    Args:
+        app: Flask application
+    """
+    from flask import g, request
+
+    duration = metrics.histogram(
+        "guidemind_http_request_duration_seconds",
+        "HTTP request latency by route, method and status",
+        ["route", "method", "status"]
+    )
+    in_progress = metrics.gauge(
+        "guidemind_http_requests_in_progress",
+        "HTTP requests currently being handled",
+    )
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        in_progress.inc()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get("_metrics_started")
+        if started is not None:
+            # The route template keeps label cardinality bounded
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            duration.observe(
+                time.perf_counter() - started,
+                route=route,
+                method=request.method,
+                status=str(response.status_code)
+            )
+        return response
+
+    @app.teardown_request
+    def _finish_request(exception=None):
+        # Runs even when the request failed with an unhandled exception
+        if g.pop("_metrics_started", None) is not None:
+            in_progress.dec()
@@ -0,0 +1,216 @@
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from metrics import metrics
+
+HAIKU = "claude-3-haiku-20240307"
+SONNET = "claude-3-sonnet-20240229"
+OPUS = "claude-3-opus-20240229"
+
+# Call type -> (model, max tokens, escalation model, latency target in seconds).
+# Text calls (parsing a manual, explanations, plan steps) run on the fast
+# model and escalate when the answer is unusable; troubleshooting a photo
+# and planning a vignette start one tier up.
+DEFAULT_POLICIES = {
+    "parse": (HAIKU, 1000, SONNET, 8.0),
+    "explain": (HAIKU, 500, SONNET, 3.0),
+    "troubleshoot": (HAIKU, 500, SONNET, 4.0),
+    "vision_troubleshoot": (SONNET, 1000, OPUS, 10.0),
+    "planner": (SONNET, 500, OPUS, 6.0),
+    "executor": (HAIKU, 300, SONNET, 3.0),
+}
+
+class CallPolicy:
+    """Model, token budget and escalation for one call type"""
+
+    def __init__(self, call_type: str, model: str, max_tokens: int, escalate_model: Optional[str], latency_target: float):
+        """Initialize call policy
+
+        Args:
+            call_type: Call type (e.g. "explain")
+            model: Model to try first
+            max_tokens: Maximum tokens to sample
+            escalate_model: Larger model to retry with when the answer is not
+                usable (None disables escalation)
+            latency_target: Latency in seconds the call type should stay under
+        """
+        self.call_type = call_type
+        self.model = model
+        self.max_tokens = max_tokens
+        self.escalate_model = escalate_model if escalate_model != model else None
+        self.latency_target = latency_target
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the policy as a dictionary"""
+        return {
+            "call_type": self.call_type,
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "escalate_model": self.escalate_model,
+            "latency_target": self.latency_target
+        }
+
+class ModelPolicy:
+    """Maps each LLM call type to a model and token budget
+
+    Every call type starts on its configured model and is retried once on
+    the escalation model, with twice the token budget, only when the first
+    answer is unusable: the call failed, or the caller's check rejected it
+    (e.g. a manual parsed into a single step, or a truncated answer).
+    Defaults can be overridden per call type with LLM_MODEL_<TYPE>,
+    LLM_MAX_TOKENS_<TYPE>, LLM_ESCALATE_<TYPE> (empty to disable) and
+    LLM_TARGET_SECONDS_<TYPE>; LLM_MODEL sets the first-try model for all
+    types at once.
+    """
+
+    def __init__(self):
+        """Initialize policy with settings from the environment"""
+        self.escalation_enabled = os.getenv("LLM_ESCALATION", "true").lower() == "true"
+        self.policies: Dict[str, CallPolicy] = {}
+
+        for call_type, (model, max_tokens, escalate_model, target) in DEFAULT_POLICIES.items():
+            suffix = call_type.upper()
+            escalate_model = os.getenv(f"LLM_ESCALATE_{suffix}", escalate_model).strip() or None
+            self.policies[call_type] = CallPolicy(
+                call_type,
+                os.getenv(f"LLM_MODEL_{suffix}") or os.getenv("LLM_MODEL") or model,
+                int(os.getenv(f"LLM_MAX_TOKENS_{suffix}", str(max_tokens))),
+                escalate_model if self.escalation_enabled else None,
+                float(os.getenv(f"LLM_TARGET_SECONDS_{suffix}", str(target)))
+            )
+
+        self._escalations = metrics.counter(
+            "guidemind_llm_escalations_total",
+            "LLM calls retried on a larger model by call type and reason",
+            ["call_type", "reason"]
+        )
+        self._target_misses = metrics.counter(
+            "guidemind_llm_latency_target_misses_total",
+            "LLM calls slower than their call type's latency target",
+            ["call_type"]
+        )
+
+    def get(self, call_type: str) -> CallPolicy:
+        """Get the policy for a call type
+
+        Args:
+            call_type: Call type (parse, explain, troubleshoot,
+                vision_troubleshoot, planner or executor)
+
+        Returns:
+            Call policy
+        """
+        if call_type not in self.policies:
+            raise ValueError(f"Unknown LLM call type: {call_type}")
+        return self.policies[call_type]
+
+    def model_for(self, call_type: str) -> str:
+        """Get the first-try model for a call type"""
+        return self.get(call_type).model
+
+    def _on_error(self, policy: CallPolicy, error: Exception) -> str:
+        """Handle a failed first try: re-raise it, or escalate if possible
+
+        Returns:
+            Escalation reason
+        """
+        # A bug in the call (wrong SDK arguments, unexpected response shape)
+        # would fail the same way on the larger model
+        if not policy.escalate_model or isinstance(error, (TypeError, AttributeError)):
+            raise error
+        print(f"{policy.call_type} call on {policy.model} failed ({error}); escalating to {policy.escalate_model}")
+        return "error"
+
+    @staticmethod
+    def _rejection(result: Any, is_acceptable: Optional[Callable[[Any], bool]]) -> Optional[str]:
+        """Get the escalation reason for a first-try result (None if usable)"""
+        return None if is_acceptable is None or is_acceptable(result) else "rejected"
+
+    def _should_escalate(self, policy: CallPolicy, reason: Optional[str]) -> bool:
+        """Check whether to retry on the escalation model, counting the escalation"""
+        if not (reason and policy.escalate_model):
+            return False
+        self._escalations.inc(call_type=policy.call_type, reason=reason)
+        return True
+
+    def _record_latency(self, policy: CallPolicy, started: float):
+        """Count a call that took longer than its latency target"""
+        if time.perf_counter() - started > policy.latency_target:
+            self._target_misses.inc(call_type=policy.call_type)
+
+    def run(self, call_type: str, call: Callable[[str, int], Any],
+            is_acceptable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Run a call under the policy, escalating once if needed
+
+        Args:
+            call_type: Call type
+            call: Function taking (model, max_tokens) and returning the result
+            is_acceptable: Optional check of the result; a rejected result is
+                retried on the escalation model
+
+        Returns:
+            Result of the call (the escalated result if escalation happened)
+        """
+        policy = self.get(call_type)
+        started = time.perf_counter()
+
+        try:
+            result = call(policy.model, policy.max_tokens)
+            reason = self._rejection(result, is_acceptable)
+        except Exception as e:
+            result, reason = None, self._on_error(policy, e)
+
+        if self._should_escalate(policy, reason):
+            result = call(policy.escalate_model, policy.max_tokens * 2)
+
+        self._record_latency(policy, started)
+        return result
+
+    async def arun(self, call_type: str, call: Callable[[str, int], Awaitable[Any]],
+                   is_acceptable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Run an async call under the policy, escalating once if needed
+
+        Same as run(), for calls that return an awaitable.
+
+        Args:
+            call_type: Call type
+            call: Function taking (model, max_tokens) and returning an awaitable
+                of the result
+            is_acceptable: Optional check of the result; a rejected result is
+                retried on the escalation model
+
+        Returns:
+            Result of the call (the escalated result if escalation happened)
+        """
+        policy = self.get(call_type)
+        started = time.perf_counter()
+
+        try:
+            result = await call(policy.model, policy.max_tokens)
+            reason = self._rejection(result, is_acceptable)
+        except Exception as e:
+            result, reason = None, self._on_error(policy, e)
+
+        if self._should_escalate(policy, reason):
+            result = await call(policy.escalate_model, policy.max_tokens * 2)
+
+        self._record_latency(policy, started)
+        return result
+
+    def report(self) -> Dict[str, Any]:
+        """Report the policy of every call type
+
+        Returns:
+            Dictionary with escalation setting and per-call-type policies
+        """
+        return {
+            "escalation": self.escalation_enabled,
+            "policies": [policy.to_dict() for policy in self.policies.values()]
+        }
+
+def not_truncated(response) -> bool:
+    """Check that a Messages API response did not stop at its token budget"""
+    return getattr(response, "stop_reason", None) != "max_tokens"
+
+# Create policy instance
+model_policy = ModelPolicy()
@@ -0,0 +1,199 @@
+"""Pre-render all GuideMind content for a manual
+
+Parses a manual and generates every step explanation, troubleshooting answer,
+narration track and avatar video ahead of time, using a process pool. Results
+are written to the same caches the web app reads (the content cache in
+GUIDEMIND_CACHE_DIR and static/videos), so a deployment that ships them never
+makes a user wait for first-time generation.
+
+Usage:
+    python prebake.py --preloaded basic_crane --avatars all --workers 4
+    python prebake.py --manual my_manual.txt --avatars professional_female --skip-videos
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List
+
+def _warm_text(kind: str, step_text: str) -> Dict[str, Any]:
+    """Generate an explanation or troubleshooting answer in a worker process
+
+    Args:
+        kind: "explanation" or "troubleshooting"
+        step_text: Text of the step
+
+    Returns:
+        Task result dictionary
+    """
+    from main import GuideMind
+
+    started = time.time()
+    guide = GuideMind()
+    try:
+        if kind == "explanation":
+            guide.get_step_explanation(step_text)
+        else:
+            guide.get_troubleshooting(step_text)
+        return {"status": "success", "seconds": time.time() - started}
+    except Exception as e:
+        return {"status": "error", "message": str(e), "seconds": time.time() - started}
+
+def _warm_media(avatar_id: str, kind: str, step_text: str, narration_only: bool, force: bool) -> Dict[str, Any]:
+    """Generate narration and (optionally) the avatar video in a worker process
+
+    Args:
+        avatar_id: ID of the avatar to render with
+        kind: "welcome", "step" or "help"
+        step_text: Text of the step (ignored for the welcome video)
+        narration_only: Only synthesize narration audio
+        force: Re-render even if a cached video exists
+
+    Returns:
+        Task result dictionary
+    """
+    from sadtalker_controller import sadtalker_controller
+
+    started = time.time()
+    controller = sadtalker_controller
+    controller.initialize()
+
+    if kind == "welcome":
+        script = controller._generate_welcome_script()
+    elif kind == "help":
+        script = controller._generate_help_script(step_text)
+    else:
+        script = controller._generate_script_for_step(step_text)
+
+    if narration_only:
+        audio_file = controller.sadtalker.generate_narration(script)
+        if not audio_file:
+            return {"status": "error", "message": "Failed to generate narration", "seconds": time.time() - started}
+        return {"status": "success", "seconds": time.time() - started}
+
+    if not controller.set_avatar(avatar_id):
+        return {"status": "error", "message": f"Avatar not available: {avatar_id}", "seconds": time.time() - started}
+
+    if kind == "welcome":
+        result = controller.get_welcome_video(force_regenerate=force)
+    elif kind == "help":
+        result = controller.get_help_video(step_text, force_regenerate=force)
+    else:
+        result = controller.get_video_for_step(step_text, 0, force_regenerate=force)
+
+    if result.get("status") != "success":
+        return {"status": "error", "message": result.get("message"), "seconds": time.time() - started}
+
+    return {
+        "status": "cached" if result.get("cached") else "success",
+        "video_url": result.get("video_url"),
+        "seconds": time.time() - started
+    }
+
+def _resolve_avatars(requested: str) -> List[str]:
+    """Resolve the --avatars argument to a list of avatar IDs
+
+    Args:
+        requested: Comma-separated avatar IDs or "all"
+
+    Returns:
+        List of avatar IDs
+    """
+    from sadtalker_controller import sadtalker_controller
+
+    sadtalker_controller.initialize()
+    known = [avatar["id"] for avatar in sadtalker_controller.available_avatars]
+
+    if requested == "all":
+        return known
+
+    avatar_ids = [avatar_id.strip() for avatar_id in requested.split(",") if avatar_id.strip()]
+    for avatar_id in avatar_ids:
+        if avatar_id not in known:
+            print(f"Warning: unknown avatar {avatar_id}")
+    return [avatar_id for avatar_id in avatar_ids if avatar_id in known]
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-render all GuideMind content for a manual")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--manual", help="Path to a manual text file")
+    source.add_argument("--preloaded", default="basic_crane", help="Key of preloaded instructions (default: basic_crane)")
+    parser.add_argument("--avatars", default="all", help="Comma-separated avatar IDs, or 'all' (default)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Number of worker processes")
+    parser.add_argument("--skip-llm", action="store_true", help="Don't generate explanations and troubleshooting")
+    parser.add_argument("--skip-videos", action="store_true", help="Only synthesize narration, don't render videos")
+    parser.add_argument("--no-help", action="store_true", help="Don't pre-render help videos")
+    parser.add_argument("--force", action="store_true", help="Re-render videos even if cached")
+    args = parser.parse_args(argv)
+
+    from main import GuideMind
+
+    started = time.time()
+    guide = GuideMind()
+
+    # Parse the manual once in the main process (the result is cached for the app)
+    if args.manual:
+        with open(args.manual, "r", encoding="utf-8") as f:
+            success = guide.parse_instructions(manual_text=f.read())
+    else:
+        success = guide.parse_instructions(preloaded_key=args.preloaded)
+
+    if not success or not guide.instructions:
+        print("Failed to parse instructions")
+        return 1
+
+    steps = guide.instructions
+    print(f"Parsed {len(steps)} steps in {time.time() - started:.1f}s")
+
+    avatar_ids = _resolve_avatars(args.avatars)
+    if not avatar_ids and not args.skip_videos:
+        print("No avatars available; only text and narration will be generated")
+
+    jobs = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        if not args.skip_llm:
+            for kind in ("explanation", "troubleshooting"):
+                for index, step in enumerate(steps):
+                    label = f"{kind} step {index + 1}"
+                    jobs.append((label, executor.submit(_warm_text, kind, step)))
+
+        media = [("welcome", None, "welcome")]
+        media += [("step", step, f"step {index + 1}") for index, step in enumerate(steps)]
+        if not args.no_help:
+            media += [("help", step, f"help step {index + 1}") for index, step in enumerate(steps)]
+
+        if args.skip_videos or not avatar_ids:
+            # Narration does not depend on the avatar
+            for kind, step, label in media:
+                jobs.append((f"narration {label}", executor.submit(_warm_media, None, kind, step, True, args.force)))
+        else:
+            for avatar_id in avatar_ids:
+                for kind, step, label in media:
+                    jobs.append((f"{avatar_id} {label}", executor.submit(_warm_media, avatar_id, kind, step, False, args.force)))
+
+        labels = {future: label for label, future in jobs}
+        counts = {"success": 0, "cached": 0, "error": 0}
+
+        for future in as_completed(labels):
+            label = labels[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"status": "error", "message": str(e), "seconds": 0}
+
+            counts[result["status"]] += 1
+            line = f"[{sum(counts.values())}/{len(jobs)}] {label}: {result['status']} ({result['seconds']:.1f}s)"
+            if result.get("message"):
+                line += f" - {result['message']}"
+            print(line)
+
+    print(
+        f"Done in {time.time() - started:.1f}s: "
+        f"{counts['success']} generated, {counts['cached']} already cached, {counts['error']} failed"
+    )
+    return 1 if counts["error"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
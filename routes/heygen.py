@@ -0,0 +1,79 @@
+import os
+import re
+from flask import Blueprint, current_app, request, jsonify, send_file, redirect
+
+# Create Blueprint
+heygen_bp = Blueprint('heygen', __name__)
+
+@heygen_bp.route('/api/heygen/webhook', methods=['POST'])
+def heygen_webhook():
+    """Receive HeyGen completion callbacks and resolve waiting renders"""
+    from heygen_controller import heygen_controller  # Import here to keep app startup light
+    
+    heygen = heygen_controller.heygen
+    
+    if not heygen.verify_webhook_signature(request.get_data(), request.headers.get('Signature')):
+        return jsonify({'success': False, 'error': 'Invalid signature'}), 401
+    
+    event = request.get_json(silent=True)
+    if not event:
+        return jsonify({'success': False, 'error': 'Invalid payload'}), 400
+    
+    resolved = heygen.handle_webhook_event(event)
+    
+    # Always acknowledge so HeyGen doesn't retry events for videos we don't track
+    return jsonify({'success': True, 'resolved': resolved})
+
+@heygen_bp.route('/api/heygen/batch', methods=['POST'])
+def start_heygen_batch():
+    """Submit videos for every step of the loaded manual concurrently"""
+    from heygen_controller import heygen_controller
+    
+    # Registered by app.py; importing app here would run it a second time under `python app.py`
+    guide = current_app.extensions['guide']
+    instructions = guide.instructions
+    if not instructions:
+        return jsonify({'success': False, 'error': 'No instructions loaded'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    result = heygen_controller.prepare_videos_for_steps(
+        instructions,
+        max_concurrency=data.get('max_concurrency'),
+        include_welcome=data.get('include_welcome', True)
+    )
+    
+    if result.get('status') != 'success':
+        return jsonify({'success': False, 'error': result.get('error')}), 503
+    
+    return jsonify({'success': True, **result}), 202
+
+@heygen_bp.route('/api/heygen/batch/<batch_id>', methods=['GET'])
+def heygen_batch_status(batch_id):
+    """Get the progress of a batch of step videos"""
+    from heygen_controller import heygen_controller
+    
+    result = heygen_controller.get_batch_status(batch_id)
+    if result.get('status') != 'success':
+        return jsonify({'success': False, 'error': result.get('error')}), 404
+    
+    return jsonify({'success': True, **result})
+
+@heygen_bp.route('/api/heygen/video/<video_key>.mp4', methods=['GET'])
+def heygen_video(video_key):
+    """Serve a HeyGen video from the local content-addressed store"""
+    from heygen_controller import heygen_controller
+    
+    if not re.fullmatch(r'[0-9a-f]{64}', video_key):
+        return jsonify({'success': False, 'error': 'Invalid video key'}), 404
+    
+    path = heygen_controller._local_video_path(video_key)
+    if not os.path.exists(path):
+        # Rendered on another node: download it from the media store or redirect there
+        shared_url = heygen_controller._from_media_store(video_key)
+        if shared_url and not shared_url.startswith('/api/heygen/video/'):
+            return redirect(shared_url)
+        if not os.path.exists(path):
+            return jsonify({'success': False, 'error': 'Video not found'}), 404
+    
+    # Content-addressed, so the file at this URL never changes
+    return send_file(path, mimetype='video/mp4', conditional=True, max_age=31536000)
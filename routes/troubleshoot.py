@@ -1,7 +1,9 @@
 import os
+import time
 import base64
 from flask import Blueprint, request, jsonify, current_app
-import anthropic
+from metrics import record_llm_call
+from model_policy import model_policy, not_truncated
 
 # Create Blueprint
 troubleshoot_bp = Blueprint('troubleshoot', __name__)
@@ -12,6 +14,10 @@ def get_anthropic_client():
     if not api_key:
         current_app.logger.warning("CLAUDE_API_KEY not found in environment variables")
         return None
+    import anthropic  # Import here so registering the blueprint stays cheap
+    base_url = os.getenv("ANTHROPIC_BASE_URL")
+    if base_url:
+        return anthropic.Anthropic(api_key=api_key, base_url=base_url)
     return anthropic.Anthropic(api_key=api_key)
 
 def encode_image(image_path):
@@ -22,14 +28,16 @@ def encode_image(image_path):
 @troubleshoot_bp.route('/api/troubleshoot', methods=['GET'])
 def get_troubleshooting():
     """Get troubleshooting tips for current step"""
-    from app import guide  # Import here to avoid circular import
+    guide = current_app.extensions['guide']
     
     current_step = guide.get_current_step()
     if current_step:
-        troubleshooting = guide.get_troubleshooting(current_step)
+        troubleshooting = guide.get_troubleshooting_within(current_step)
         return jsonify({
             'success': True,
-            'troubleshooting': troubleshooting
+            'troubleshooting': troubleshooting['text'],
+            'degraded': troubleshooting['degraded'],
+            'source': troubleshooting['source']
         })
     else:
         return jsonify({'success': False, 'error': 'No current step'})
@@ -41,7 +49,7 @@ def image_troubleshoot():
     uploads_dir = os.path.join(current_app.static_folder, 'uploads')
     os.makedirs(uploads_dir, exist_ok=True)
     
-    from app import guide  # Import here to avoid circular import
+    guide = current_app.extensions['guide']
     
     if 'image' not in request.files:
         return jsonify({'success': False, 'error': 'No image provided'}), 400
@@ -55,8 +63,9 @@ def image_troubleshoot():
     if not current_step:
         return jsonify({'success': False, 'error': 'No current step'}), 400
     
-    # Get the step explanation for additional context
-    step_explanation = guide.get_step_explanation(current_step)
+    # Get the step explanation for additional context (canned or generic
+    # context is good enough if the LLM is slow)
+    step_explanation = guide.get_step_explanation_within(current_step, route="troubleshoot_image")['text']
     
     # Validate image
     if user_image.filename == '':
@@ -81,25 +90,21 @@ def image_troubleshoot():
         base64_image = encode_image(image_path)
         
         # Prepare the Claude message with the image
-        response = client.messages.create(
-            model="claude-3-opus-20240229",
-            max_tokens=1000,
-            temperature=0.2,
-            messages=[
-                {
-                    "role": "user", 
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": base64_image
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": f"""I'm working on an origami project and I'm stuck at this step:
+        messages = [
+            {
+                "role": "user", 
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": "image/jpeg",
+                            "data": base64_image
+                        }
+                    },
+                    {
+                        "type": "text",
+                        "text": f"""I'm working on an origami project and I'm stuck at this step:
                             
 Current step: {current_step}
 
@@ -114,11 +119,35 @@ Please analyze the image of my current progress and:
 4. Describe what the result should look like when done correctly
 
 Respond with specific, actionable advice that directly addresses what's visible in the image."""
-                        }
-                    ]
-                }
-            ]
-        )
+                    }
+                ]
+            }
+        ]
+        
+        def ask(model, max_tokens):
+            started = time.perf_counter()
+            try:
+                response = client.messages.create(
+                    model=model,
+                    max_tokens=max_tokens,
+                    temperature=0.2,
+                    messages=messages
+                )
+            except Exception:
+                record_llm_call("image_troubleshoot", model, time.perf_counter() - started, status="error")
+                raise
+            
+            record_llm_call(
+                "image_troubleshoot",
+                model,
+                time.perf_counter() - started,
+                input_tokens=response.usage.input_tokens,
+                output_tokens=response.usage.output_tokens
+            )
+            return response
+        
+        # Retried on a larger model if the advice is cut off at the token budget
+        response = model_policy.run("vision_troubleshoot", ask, not_truncated)
         
         # Extract the troubleshooting advice
         troubleshooting_advice = response.content[0].text
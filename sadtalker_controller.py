@@ -1,12 +1,24 @@
 import os
-import time
 import tempfile
 import json
 import base64
-import requests
+import threading
 from typing import Dict, Any, Optional, List
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from sadtalker_integration import SadTalkerAPI
+from avatar_registry import AvatarRegistry
+from content_cache import make_key
+from storage_manager import storage_manager
+from video_postprocess import video_postprocessor
+from hls_packager import hls_packager
+from metrics import RENDER_DURATION, record_cache
+from tracing import tracer
+from state_backend import state_backend
+from media_store import media_store
+
+# State key of the avatar chosen by the learner, shared by all workers
+SELECTED_AVATAR_KEY = "sadtalker:avatar_id"
 
 class SadTalkerController:
     """Controller for managing SadTalker integration with GuideMind"""
@@ -17,27 +29,69 @@ class SadTalkerController:
         use_remote_api = os.getenv("SADTALKER_USE_REMOTE", "true").lower() == "true"
         self.sadtalker = SadTalkerAPI(use_remote_api=use_remote_api)
         
-        # Check if SadTalker is available
-        self.initialized = self.sadtalker.is_available()
+        # Backend probing and avatar indexing happen in initialize(), which the
+        # app runs on a background thread so construction never blocks startup
+        self.initialized = False
+        self._init_lock = threading.Lock()
+        self._avatars_loaded = False
         
-        # Set up video caching
-        self.video_cache = {}
+        # Working directory for renders; finished videos are cached on disk in
+        # static/videos, which every worker on the node shares
         self.cache_dir = os.path.join(tempfile.gettempdir(), "sadtalker_cache")
         os.makedirs(self.cache_dir, exist_ok=True)
         
+        # Rendered videos are served from static/videos
+        self.static_videos_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "videos")
+        os.makedirs(self.static_videos_dir, exist_ok=True)
+        
         # Default avatar image
         self.avatar_image = os.getenv("SADTALKER_AVATAR_IMAGE", "")
+        self.avatar_hash = None
+        self.avatar_id = None
         
         # Directory for avatar images
         self.avatars_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "img", "avatars")
         os.makedirs(self.avatars_dir, exist_ok=True)
         
-        # Load available avatars
-        self.available_avatars = self._load_available_avatars()
+        # Avatar registry (loaded in initialize)
+        self.registry = AvatarRegistry(self.avatars_dir)
+        self.available_avatars = []
         
-        # Set default avatar if not set and avatars are available
-        if not self.avatar_image and self.available_avatars:
-            self.avatar_image = self.available_avatars[0]["path"]
+        # Timeout for sample avatar downloads in seconds
+        self.download_timeout = float(os.getenv("SADTALKER_DOWNLOAD_TIMEOUT", "10"))
+        
+        # Time to wait for the first segment of an HLS video in seconds; never
+        # longer than the avatar deadline, so request threads aren't held
+        deadline = float(os.getenv("AVATAR_DEADLINE_SECONDS", "30"))
+        self.hls_first_segment_timeout = min(float(os.getenv("HLS_FIRST_SEGMENT_TIMEOUT", str(deadline))), deadline)
+    
+    def initialize(self) -> bool:
+        """Probe the SadTalker backend and load available avatars
+        
+        Safe to call more than once; only the first call does any work.
+        
+        Returns:
+            True if SadTalker is available, False otherwise
+        """
+        with self._init_lock:
+            if self._avatars_loaded:
+                return self.initialized
+            
+            # Load available avatars
+            self.available_avatars = self._load_available_avatars()
+            
+            # Use the avatar another worker selected, else the configured or first one
+            if not self._sync_avatar():
+                if self.avatar_image:
+                    self.avatar_hash = AvatarRegistry.hash_file(self.avatar_image)
+                elif self.available_avatars:
+                    self._use_avatar(self.available_avatars[0], share=False)
+            
+            self._avatars_loaded = True
+            
+            # Check if SadTalker is available
+            self.initialized = self.sadtalker.is_available()
+            return self.initialized
     
     def is_available(self) -> bool:
         """Check if SadTalker is available
@@ -47,60 +101,62 @@ class SadTalkerController:
         """
         return self.initialized
     
-    def _load_available_avatars(self) -> List[Dict[str, str]]:
-        """Load available avatar images
+    def _load_available_avatars(self) -> List[Dict[str, Any]]:
+        """Load available avatar images from the avatar registry
         
         Returns:
-            List of avatar dictionaries with id, name, and path
+            List of avatar dictionaries with id, name, path, hash and dimensions
         """
-        avatars = []
-        
         try:
-            # Check if avatars directory exists
-            if not os.path.exists(self.avatars_dir):
-                return avatars
-            
-            # List image files in avatars directory
-            for filename in os.listdir(self.avatars_dir):
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                    avatar_id = os.path.splitext(filename)[0]
-                    avatar_path = os.path.join(self.avatars_dir, filename)
-                    
-                    # Create readable name from filename
-                    name = avatar_id.replace('_', ' ').replace('-', ' ').title()
-                    
-                    avatars.append({
-                        "id": avatar_id,
-                        "name": name,
-                        "path": avatar_path
-                    })
-            
-            # Sort avatars by name
-            avatars.sort(key=lambda x: x["name"])
+            return self.registry.load()
         except Exception as e:
             print(f"Error loading avatars: {e}")
+            return []
+    
+    def _use_avatar(self, avatar: Dict[str, Any], share: bool = True):
+        """Make an avatar the one used for video generation
         
-        return avatars
+        Args:
+            avatar: Avatar dictionary from the registry
+            share: Record the choice in the state backend so other workers
+                use the same avatar (defaults picked at startup are not shared)
+        """
+        self.avatar_image = avatar["path"]
+        self.avatar_hash = avatar["hash"]
+        self.avatar_id = avatar["id"]
+        if share:
+            state_backend.set(SELECTED_AVATAR_KEY, avatar["id"])
     
-    def get_avatar_options(self) -> List[Dict[str, str]]:
+    def _sync_avatar(self) -> bool:
+        """Switch to the avatar selected through any worker
+        
+        Returns:
+            True if a shared selection exists and is in use
+        """
+        avatar_id = state_backend.get(SELECTED_AVATAR_KEY)
+        if not avatar_id:
+            return False
+        if avatar_id == self.avatar_id:
+            return True
+        
+        avatar = self.registry.get(avatar_id)
+        if not avatar:
+            # Uploaded through another worker; reload the shared manifest
+            self.available_avatars = self._load_available_avatars()
+            avatar = self.registry.get(avatar_id)
+        if not avatar:
+            return False
+        
+        self._use_avatar(avatar, share=False)
+        return True
+    
+    def get_avatar_options(self) -> List[Dict[str, Any]]:
         """Get available avatar options for UI selection
         
         Returns:
-            List of avatar dictionaries with id, name, and thumbnail_url
+            List of avatar dictionaries with id, name, thumbnail URL, hash and dimensions
         """
-        # Convert avatar paths to web URLs
-        result = []
-        for avatar in self.available_avatars:
-            # Extract filename from path for URL
-            filename = os.path.basename(avatar["path"])
-            
-            result.append({
-                "id": avatar["id"],
-                "name": avatar["name"],
-                "thumbnail": f"/static/img/avatars/{filename}"
-            })
-        
-        return result
+        return [self.registry.to_option(avatar) for avatar in self.available_avatars]
     
     def set_avatar(self, avatar_id: str) -> bool:
         """Set the avatar to use for video generation
@@ -116,10 +172,10 @@ class SadTalkerController:
             return False
         
         # Find avatar with matching ID
-        for avatar in self.available_avatars:
-            if avatar["id"] == avatar_id:
-                self.avatar_image = avatar["path"]
-                return True
+        avatar = self.registry.get(avatar_id)
+        if avatar:
+            self._use_avatar(avatar)
+            return True
         
         print(f"Avatar not found: {avatar_id}")
         return False
@@ -132,45 +188,30 @@ class SadTalkerController:
             name: Name for the avatar (optional)
             
         Returns:
-            Avatar dictionary with id, name, and thumbnail_url if successful, None otherwise
+            Avatar dictionary with id, name, and thumbnail URL if successful, None otherwise
         """
         if not self.initialized:
             print("SadTalker is not initialized")
             return None
         
         try:
-            # Generate unique ID for avatar
-            avatar_id = f"custom_{int(time.time())}"
-            
-            # Use provided name or generate from ID
-            if not name:
-                name = f"Custom Avatar {len(self.available_avatars) + 1}"
-            
-            # Save image to avatars directory
-            filename = f"{avatar_id}.jpg"
-            filepath = os.path.join(self.avatars_dir, filename)
-            
-            with open(filepath, "wb") as f:
-                f.write(image_data)
+            # Identical images are stored once and return the existing avatar
+            avatar, created = self.registry.add_image(
+                image_data,
+                name=name or f"Custom Avatar {len(self.available_avatars) + 1}"
+            )
             
-            # Add to available avatars
-            avatar = {
-                "id": avatar_id,
-                "name": name,
-                "path": filepath
-            }
+            if not avatar:
+                return None
             
-            self.available_avatars.append(avatar)
+            if created:
+                self.available_avatars = self.registry.list()
             
             # Set as current avatar
-            self.avatar_image = filepath
+            self._use_avatar(avatar)
             
             # Return avatar info for UI
-            return {
-                "id": avatar_id,
-                "name": name,
-                "thumbnail": f"/static/img/avatars/{filename}"
-            }
+            return self.registry.to_option(avatar)
         except Exception as e:
             print(f"Error uploading custom avatar: {e}")
             return None
@@ -180,104 +221,91 @@ class SadTalkerController:
         
         Args:
             step_text: Text of the step to explain
-            step_number: Step number for caching
+            step_number: Step number (for logging; videos are cached by content)
             force_regenerate: Force regeneration of video
             
         Returns:
             Dictionary with video_url and status information
         """
+        with tracer.span("sadtalker.script", kind="step"):
+            script = self._generate_script_for_step(step_text)
+        return self._get_or_render_video("step", script, force_regenerate, "Failed to generate video")
+    
+    def peek_video_for_step(self, step_text: str) -> Optional[Dict[str, Any]]:
+        """Get a step video only if it has already been rendered on this node
+        
+        Args:
+            step_text: Text of the step
+        
+        Returns:
+            Dictionary with video_url and status information, or None if the
+            video would have to be rendered (or fetched from the media store)
+        """
         if not self.initialized:
-            return {
-                "status": "error",
-                "message": "SadTalker is not initialized",
-                "video_url": None
-            }
+            return None
         
+        self._sync_avatar()
         if not self.avatar_image:
-            return {
-                "status": "error",
-                "message": "No avatar image selected",
-                "video_url": None
-            }
+            return None
         
-        # Check cache first
-        cache_key = f"step_{step_number}"
-        if not force_regenerate and cache_key in self.video_cache:
+        script = self._generate_script_for_step(step_text)
+        if hls_packager.should_use("step", script):
+            name = f"step_{self._render_key('step_hls', script)[:16]}"
+            if not hls_packager.is_complete(name):
+                return None
             return {
                 "status": "success",
-                "video_url": self.video_cache[cache_key],
+                "video_url": hls_packager.url_for(name),
+                "format": "hls",
                 "cached": True
             }
         
-        # Generate video
-        try:
-            # Generate script for step
-            script = self._generate_script_for_step(step_text)
-            
-            # Generate result file path
-            result_file = os.path.join(self.cache_dir, f"step_{step_number}.mp4")
-            
-            # Generate video
-            video_path = self.sadtalker.generate_video(
-                source_image=self.avatar_image,
-                text=script,
-                result_file=result_file
-            )
-            
-            if not video_path:
-                return {
-                    "status": "error",
-                    "message": "Failed to generate video",
-                    "video_url": None
-                }
-            
-            # Convert to web URL
-            video_filename = os.path.basename(video_path)
-            video_url = f"/static/videos/{video_filename}"
-            
-            # Copy to static directory for web access
-            static_videos_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "videos")
-            os.makedirs(static_videos_dir, exist_ok=True)
-            
-            static_video_path = os.path.join(static_videos_dir, video_filename)
-            with open(video_path, "rb") as src, open(static_video_path, "wb") as dst:
-                dst.write(src.read())
-            
-            # Cache result
-            self.video_cache[cache_key] = video_url
-            
-            return {
-                "status": "success",
-                "video_url": video_url,
-                "cached": False
-            }
-        except Exception as e:
-            print(f"Error generating video for step: {e}")
-            return {
-                "status": "error",
-                "message": str(e),
-                "video_url": None
-            }
+        video_filename = f"step_{self._render_key('step', script)[:16]}.mp4"
+        video_url = f"/static/videos/{video_filename}"
+        static_video_path = os.path.join(self.static_videos_dir, video_filename)
+        if not os.path.exists(static_video_path):
+            return None
+        return {
+            "status": "success",
+            "video_url": video_url,
+            "cached": True,
+            **video_postprocessor.variants(static_video_path, video_url)
+        }
     
-    def _generate_script_for_step(self, step_text: str) -> str:
-        """Generate script for explaining a step
+    def avatar_key(self) -> str:
+        """Get the avatar content hash used in render cache keys
+        
+        Returns:
+            Content hash of the current avatar image
+        """
+        if not self.avatar_hash and self.avatar_image:
+            self.avatar_hash = AvatarRegistry.hash_file(self.avatar_image)
+        return self.avatar_hash or "noavatar"
+    
+    def _render_key(self, kind: str, script: str) -> str:
+        """Build the content key for a rendered video
         
         Args:
-            step_text: Text of the step to explain
+            kind: Kind of video ("step", "welcome", ...)
+            script: Script the avatar speaks
             
         Returns:
-            Script text
+            Key derived from the script, avatar content and render settings
         """
-        # For simplicity, just enhance the step text
-        # In a real implementation, you could use Claude to generate better explanations
-        script = f"Let me explain this step. {step_text} Make sure to follow each fold carefully. Let me know if you need any help."
-        return script
+        return make_key(kind, script, self.avatar_key(), self.sadtalker.render_identity())
     
-    def get_welcome_video(self, force_regenerate: bool = False) -> Dict[str, Any]:
-        """Get or generate welcome video
+    def _get_or_render_video(self, kind: str, script: str, force_regenerate: bool, failure_message: str) -> Dict[str, Any]:
+        """Serve a video from the shared cache or render it
+        
+        Rendered videos are stored in static/videos under a content-derived
+        filename, so they survive restarts and are shared with other processes
+        (including the prebake CLI) using the same directory.
         
         Args:
+            kind: Kind of video, used as filename prefix
+            script: Script the avatar speaks
             force_regenerate: Force regeneration of video
+            failure_message: Error message if rendering fails
             
         Returns:
             Dictionary with video_url and status information
@@ -289,6 +317,7 @@ class SadTalkerController:
                 "video_url": None
             }
         
+        self._sync_avatar()
         if not self.avatar_image:
             return {
                 "status": "error",
@@ -296,157 +325,368 @@ class SadTalkerController:
                 "video_url": None
             }
         
-        # Check cache first
-        cache_key = "welcome"
-        if not force_regenerate and cache_key in self.video_cache:
+        # Help videos and long scripts are streamed as HLS segments
+        if hls_packager.should_use(kind, script):
+            return self._get_or_render_hls(kind, script, force_regenerate, failure_message)
+        
+        with tracer.span("sadtalker.cache_lookup", kind=kind) as span:
+            cache_key = self._render_key(kind, script)
+            video_filename = f"{kind}_{cache_key[:16]}.mp4"
+            video_url = f"/static/videos/{video_filename}"
+            static_video_path = os.path.join(self.static_videos_dir, video_filename)
+            
+            # Check cache first (the file may have been evicted by the storage manager)
+            cached = not force_regenerate and os.path.exists(static_video_path)
+            record_cache("sadtalker_video", cached)
+            if span:
+                span.set_attribute("cached", cached)
+        
+        if cached:
+            storage_manager.touch(static_video_path)
             return {
                 "status": "success",
-                "video_url": self.video_cache[cache_key],
-                "cached": True
+                "video_url": video_url,
+                "cached": True,
+                **video_postprocessor.variants(static_video_path, video_url)
             }
         
-        # Generate welcome video
+        # Rendered on another node (or evicted here): serve it from the media store
+        store_name = f"sadtalker/{video_filename}"
+        if not force_regenerate and media_store.enabled:
+            shared = self._from_media_store(video_filename)
+            if not shared and not media_store.claim(store_name):
+                # Another node is rendering this video; wait a while for its copy
+                if media_store.wait_for(store_name):
+                    shared = self._from_media_store(video_filename)
+                # Only render if the other node gave up; otherwise don't hold this thread
+                if not shared and not media_store.claim(store_name):
+                    return {
+                        "status": "pending",
+                        "message": "Video is rendering on another node",
+                        "video_url": None
+                    }
+            if shared:
+                return shared
+        
         try:
-            # Welcome script
-            script = (
-                "Welcome to GuideMind! I'm your origami instructor, and I'll guide you "
-                "through creating beautiful paper art step by step. You can ask me for help "
-                "anytime you get stuck, or use voice commands to navigate. Let's get started!"
-            )
-            
-            # Generate result file path
-            result_file = os.path.join(self.cache_dir, "welcome.mp4")
-            
             # Generate video
-            video_path = self.sadtalker.generate_video(
-                source_image=self.avatar_image,
-                text=script,
-                result_file=result_file
-            )
+            backend = self._metrics_backend()
+            with tracer.span("sadtalker.render", kind=kind, backend=backend), RENDER_DURATION.time(backend=backend, kind=kind):
+                video_path = self.sadtalker.generate_video(
+                    source_image=self.avatar_image,
+                    text=script,
+                    result_file=os.path.join(self.cache_dir, video_filename)
+                )
             
             if not video_path:
+                media_store.release(store_name)
                 return {
                     "status": "error",
-                    "message": "Failed to generate welcome video",
+                    "message": failure_message,
                     "video_url": None
                 }
             
-            # Convert to web URL
-            video_filename = os.path.basename(video_path)
-            video_url = f"/static/videos/{video_filename}"
-            
-            # Copy to static directory for web access
-            static_videos_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "videos")
-            os.makedirs(static_videos_dir, exist_ok=True)
+            # Publish to the static directory for web access (no second copy is
+            # kept), remuxed for faststart with a poster frame and renditions
+            with tracer.span("sadtalker.publish", postprocess=video_postprocessor.enabled):
+                video_postprocessor.publish(video_path, static_video_path)
             
-            static_video_path = os.path.join(static_videos_dir, video_filename)
-            with open(video_path, "rb") as src, open(static_video_path, "wb") as dst:
-                dst.write(src.read())
+            # Share with other nodes; the render claim is released once uploaded
+            if media_store.enabled:
+                threading.Thread(
+                    target=self._publish_to_media_store,
+                    args=(video_filename,),
+                    name="media-store-upload",
+                    daemon=True
+                ).start()
             
-            # Cache result
-            self.video_cache[cache_key] = video_url
+            # Keep generated media within its disk budgets
+            storage_manager.maybe_run()
             
             return {
                 "status": "success",
                 "video_url": video_url,
-                "cached": False
+                "cached": False,
+                **video_postprocessor.variants(static_video_path, video_url)
             }
         except Exception as e:
-            print(f"Error generating welcome video: {e}")
+            print(f"Error generating {kind} video: {e}")
+            media_store.release(store_name)
             return {
                 "status": "error",
                 "message": str(e),
                 "video_url": None
             }
     
-    def get_help_video(self, step_text: str, force_regenerate: bool = False) -> Dict[str, Any]:
-        """Get or generate help video
+    def _from_media_store(self, video_filename: str) -> Optional[Dict[str, Any]]:
+        """Serve a published video from the media store
+        
+        With MEDIA_STORE_REDIRECT the client is sent to the store; otherwise
+        the video and its poster are downloaded into static/videos first.
         
         Args:
-            step_text: Text of the step needing help
+            video_filename: Filename of the video in static/videos
+            
+        Returns:
+            Video result dictionary, or None if the store doesn't have the video
+        """
+        store_name = f"sadtalker/{video_filename}"
+        
+        if media_store.redirect:
+            store_url = media_store.url(store_name) if media_store.exists(store_name) else None
+            if store_url:
+                record_cache("media_store", True)
+                return {
+                    "status": "success",
+                    "video_url": store_url,
+                    "cached": True,
+                    "renditions": [{"height": None, "url": store_url}],
+                    "poster_url": None
+                }
+        
+        static_video_path = os.path.join(self.static_videos_dir, video_filename)
+        if not media_store.fetch(store_name, static_video_path):
+            return None
+        
+        poster_path = video_postprocessor.poster_path(static_video_path)
+        media_store.fetch(f"sadtalker/{os.path.basename(poster_path)}", poster_path, record=False)
+        storage_manager.maybe_run()
+        
+        video_url = f"/static/videos/{video_filename}"
+        return {
+            "status": "success",
+            "video_url": video_url,
+            "cached": True,
+            **video_postprocessor.variants(static_video_path, video_url)
+        }
+    
+    def _publish_to_media_store(self, video_filename: str):
+        """Upload a rendered video and its poster, then release the render claim"""
+        store_name = f"sadtalker/{video_filename}"
+        static_video_path = os.path.join(self.static_videos_dir, video_filename)
+        poster_path = video_postprocessor.poster_path(static_video_path)
+        try:
+            media_store.publish(f"sadtalker/{os.path.basename(poster_path)}", poster_path, "image/jpeg")
+            media_store.publish(store_name, static_video_path, "video/mp4")
+        finally:
+            media_store.release(store_name)
+    
+    def restore_video_file(self, filename: str) -> Optional[str]:
+        """Restore a missing file of static/videos from the media store
+        
+        Covers requests that reach a node other than the one that rendered
+        the video, and files evicted by the storage manager.
+        
+        Args:
+            filename: Requested filename in static/videos
+            
+        Returns:
+            Store URL to redirect to (MEDIA_STORE_REDIRECT), or None
+        """
+        path = os.path.join(self.static_videos_dir, filename)
+        if not media_store.enabled or os.path.exists(path) or "/" in filename or filename.startswith("."):
+            return None
+        
+        store_name = f"sadtalker/{filename}"
+        if media_store.redirect and media_store.exists(store_name):
+            return media_store.url(store_name)
+        media_store.fetch(store_name, path)
+        return None
+    
+    def _metrics_backend(self) -> str:
+        """Get the backend label for render metrics"""
+        return "sadtalker_remote" if self.sadtalker.use_remote_api else "sadtalker_local"
+    
+    def _get_or_render_hls(self, kind: str, script: str, force_regenerate: bool, failure_message: str) -> Dict[str, Any]:
+        """Serve an HLS video from the cache or start rendering it
+        
+        Returns as soon as the first segment is playable; later segments are
+        appended to the playlist while the client is already playing.
+        
+        Args:
+            kind: Kind of video, used as stream name prefix
+            script: Script the avatar speaks
             force_regenerate: Force regeneration of video
+            failure_message: Error message if rendering fails
             
         Returns:
-            Dictionary with video_url and status information
+            Dictionary with video_url (the master playlist) and status information
         """
-        if not self.initialized:
+        cache_key = self._render_key(f"{kind}_hls", script)
+        name = f"{kind}_{cache_key[:16]}"
+        video_url = hls_packager.url_for(name)
+        
+        cached = not force_regenerate and hls_packager.is_complete(name)
+        record_cache("sadtalker_hls", cached)
+        if cached:
+            hls_packager.touch(name)
             return {
-                "status": "error",
-                "message": "SadTalker is not initialized",
-                "video_url": None
+                "status": "success",
+                "video_url": video_url,
+                "format": "hls",
+                "cached": True
             }
         
-        if not self.avatar_image:
+        stream = None if force_regenerate else hls_packager.get_stream(name)
+        if not stream:
+            # Capture the avatar now; it may change while segments render
+            avatar_image = self.avatar_image
+            
+            def render_chunk(text, result_file):
+                audio_file = self.sadtalker.generate_narration(text)
+                if not audio_file:
+                    return None
+                with RENDER_DURATION.time(backend=self._metrics_backend(), kind="hls_segment"):
+                    video_path = self.sadtalker.generate_video(
+                        source_image=avatar_image,
+                        audio_file=audio_file,
+                        result_file=result_file
+                    )
+                return (video_path, audio_file) if video_path else None
+            
+            stream = hls_packager.start(name, hls_packager.split_script(script), render_chunk)
+        
+        if not stream:
+            # Another worker of this node is rendering it into the same directory
+            if hls_packager.has_segment(name):
+                return {
+                    "status": "success",
+                    "video_url": video_url,
+                    "format": "hls",
+                    "cached": False
+                }
             return {
-                "status": "error",
-                "message": "No avatar image selected",
+                "status": "pending",
+                "message": "Video is rendering in another worker",
                 "video_url": None
             }
         
-        # Check cache first
-        cache_key = f"help_{step_text[:20]}"  # Use first 20 chars as part of cache key
-        if not force_regenerate and cache_key in self.video_cache:
-            return {
-                "status": "success",
-                "video_url": self.video_cache[cache_key],
-                "cached": True
-            }
-        
-        # Generate help video
-        try:
-            # Help script
-            script = (
-                f"I see you're having trouble with this step: {step_text}. "
-                f"Don't worry, this is a common place to get stuck. "
-                f"Try checking that your previous folds are precise, and make sure "
-                f"the paper is properly aligned. Take it slowly and be gentle with the paper. "
-                f"If you're still having issues, we can go back to the previous step and try again."
-            )
-            
-            # Generate result file path
-            result_file = os.path.join(self.cache_dir, f"help_{int(time.time())}.mp4")
-            
-            # Generate video
-            video_path = self.sadtalker.generate_video(
-                source_image=self.avatar_image,
-                text=script,
-                result_file=result_file
-            )
-            
-            if not video_path:
+        if not stream.wait_first_segment(self.hls_first_segment_timeout):
+            if not stream.finished:
+                # Still rendering; the next request joins the stream
                 return {
-                    "status": "error",
-                    "message": "Failed to generate help video",
+                    "status": "pending",
+                    "message": "Video is rendering",
                     "video_url": None
                 }
+            return {
+                "status": "error",
+                "message": stream.error or failure_message,
+                "video_url": None
+            }
+        
+        return {
+            "status": "success",
+            "video_url": video_url,
+            "format": "hls",
+            "cached": False,
+            "segments_ready": stream.segments_ready,
+            "total_segments": stream.total_segments
+        }
+    
+    def _generate_script_for_step(self, step_text: str) -> str:
+        """Generate script for explaining a step
+        
+        Args:
+            step_text: Text of the step to explain
             
-            # Convert to web URL
-            video_filename = os.path.basename(video_path)
-            video_url = f"/static/videos/{video_filename}"
+        Returns:
+            Script text
+        """
+        # For simplicity, just enhance the step text
+        # In a real implementation, you could use Claude to generate better explanations
+        script = f"Let me explain this step. {step_text} Make sure to follow each fold carefully. Let me know if you need any help."
+        return script
+    
+    def _generate_welcome_script(self) -> str:
+        """Generate the welcome script
+        
+        Returns:
+            Script text
+        """
+        return (
+            "Welcome to GuideMind! I'm your origami instructor, and I'll guide you "
+            "through creating beautiful paper art step by step. You can ask me for help "
+            "anytime you get stuck, or use voice commands to navigate. Let's get started!"
+        )
+    
+    def _generate_help_script(self, step_text: str) -> str:
+        """Generate script for helping with a step
+        
+        Args:
+            step_text: Text of the step needing help
             
-            # Copy to static directory for web access
-            static_videos_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "videos")
-            os.makedirs(static_videos_dir, exist_ok=True)
+        Returns:
+            Script text
+        """
+        return (
+            f"I see you're having trouble with this step: {step_text}. "
+            f"Don't worry, this is a common place to get stuck. "
+            f"Try checking that your previous folds are precise, and make sure "
+            f"the paper is properly aligned. Take it slowly and be gentle with the paper. "
+            f"If you're still having issues, we can go back to the previous step and try again."
+        )
+    
+    def get_welcome_video(self, force_regenerate: bool = False) -> Dict[str, Any]:
+        """Get or generate welcome video
+        
+        Args:
+            force_regenerate: Force regeneration of video
             
-            static_video_path = os.path.join(static_videos_dir, video_filename)
-            with open(video_path, "rb") as src, open(static_video_path, "wb") as dst:
-                dst.write(src.read())
+        Returns:
+            Dictionary with video_url and status information
+        """
+        script = self._generate_welcome_script()
+        return self._get_or_render_video("welcome", script, force_regenerate, "Failed to generate welcome video")
+    
+    def get_help_video(self, step_text: str, force_regenerate: bool = False) -> Dict[str, Any]:
+        """Get or generate help video
+        
+        Args:
+            step_text: Text of the step needing help
+            force_regenerate: Force regeneration of video
             
-            # Cache result
-            self.video_cache[cache_key] = video_url
+        Returns:
+            Dictionary with video_url and status information
+        """
+        script = self._generate_help_script(step_text)
+        return self._get_or_render_video("help", script, force_regenerate, "Failed to generate help video")
+    
+    def get_narration(self, kind: str, step_text: str = None) -> Dict[str, Any]:
+        """Get narration audio for a video, ahead of the video itself
+        
+        The narration is the first stage of every render and is cached by
+        content, so the audio returned here is exactly the soundtrack of the
+        video that follows. Clients play it immediately and switch to the
+        video at the same position once it is ready.
+        
+        Args:
+            kind: Kind of video ("welcome", "step" or "help")
+            step_text: Text of the step (not used for the welcome video)
             
-            return {
-                "status": "success",
-                "video_url": video_url,
-                "cached": False
-            }
-        except Exception as e:
-            print(f"Error generating help video: {e}")
+        Returns:
+            Dictionary with audio_url and status information
+        """
+        if kind == "welcome":
+            script = self._generate_welcome_script()
+        elif kind == "help":
+            script = self._generate_help_script(step_text)
+        else:
+            script = self._generate_script_for_step(step_text)
+        
+        audio_file = self.sadtalker.generate_narration(script)
+        if not audio_file:
             return {
                 "status": "error",
-                "message": str(e),
-                "video_url": None
+                "message": "Failed to generate narration",
+                "audio_url": None
             }
+        
+        return {
+            "status": "success",
+            "audio_url": f"/api/avatar/narration/{self.sadtalker.narration_key(script)}.wav",
+            "script": script
+        }
     
     def add_sample_avatars(self) -> List[Dict[str, str]]:
         """Add sample avatar images if none are available
@@ -475,42 +715,55 @@ class SadTalkerController:
                 }
             ]
             
-            for avatar in sample_avatars:
-                try:
-                    # Download avatar image
-                    response = requests.get(avatar["url"], stream=True)
-                    if response.status_code == 200:
-                        # Save to avatars directory
-                        filename = f"{avatar['id']}.jpg"
-                        filepath = os.path.join(self.avatars_dir, filename)
-                        
-                        with open(filepath, "wb") as f:
-                            response.raw.decode_content = True
-                            f.write(response.raw.read())
-                        
-                        # Add to available avatars
-                        avatar_dict = {
-                            "id": avatar["id"],
-                            "name": avatar["name"],
-                            "path": filepath
-                        }
-                        
-                        self.available_avatars.append(avatar_dict)
-                        added_avatars.append({
-                            "id": avatar["id"],
-                            "name": avatar["name"],
-                            "thumbnail": f"/static/img/avatars/{filename}"
-                        })
-                        
-                        # Set as default avatar if none selected
-                        if not self.avatar_image:
-                            self.avatar_image = filepath
-                except Exception as e:
-                    print(f"Error downloading sample avatar {avatar['id']}: {e}")
+            # Download all sample avatars concurrently
+            with ThreadPoolExecutor(max_workers=len(sample_avatars)) as executor:
+                downloads = list(executor.map(self._download_image, [avatar["url"] for avatar in sample_avatars]))
+            
+            for avatar, image_data in zip(sample_avatars, downloads):
+                if not image_data:
+                    continue
+                
+                # Register in the avatars directory
+                avatar_dict, created = self.registry.add_image(
+                    image_data,
+                    avatar_id=avatar["id"],
+                    name=avatar["name"]
+                )
+                
+                if not avatar_dict or not created:
+                    continue
+                
+                self.available_avatars = self.registry.list()
+                added_avatars.append(self.registry.to_option(avatar_dict))
+                
+                # Set as default avatar if none selected
+                if not self.avatar_image:
+                    self._use_avatar(avatar_dict, share=False)
         except Exception as e:
             print(f"Error adding sample avatars: {e}")
         
         return added_avatars
+    
+    def _download_image(self, url: str) -> Optional[bytes]:
+        """Download an image with a timeout
+        
+        Args:
+            url: URL of the image
+            
+        Returns:
+            Image data as bytes or None if the download failed
+        """
+        try:
+            # Import requests only when needed to keep startup imports light
+            import requests
+            
+            response = requests.get(url, timeout=self.download_timeout)
+            if response.status_code == 200:
+                return response.content
+            print(f"Error downloading sample avatar from {url}: HTTP {response.status_code}")
+        except Exception as e:
+            print(f"Error downloading sample avatar from {url}: {e}")
+        return None
 
 # Create controller instance
 sadtalker_controller = SadTalkerController()
\ No newline at end of file
@@ -5,11 +5,15 @@ import time
 import shutil
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Tuple
 import base64
-import requests
 from dotenv import load_dotenv
+from content_cache import content_cache, make_key
+from storage_manager import storage_manager
+from metrics import TTS_DURATION, record_cache
+from tracing import tracer
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +36,7 @@ class SadTalkerAPI:
         # Remote API configuration
         self.remote_api_url = os.getenv("SADTALKER_API_URL", "").strip()
         self.remote_api_key = os.getenv("SADTALKER_API_KEY", "").strip()
+        self.remote_timeout = float(os.getenv("SADTALKER_API_TIMEOUT", "300"))
         
         # Local installation configuration
         self.sadtalker_path = os.getenv("SADTALKER_PATH", "").strip()
@@ -40,6 +45,34 @@ class SadTalkerAPI:
         # Create output directory if it doesn't exist
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir, exist_ok=True)
+        
+        # Text-to-speech model used for narration
+        self.tts_model = os.getenv("SADTALKER_TTS_MODEL", "tts_models/en/ljspeech/tacotron2-DDC")
+        
+        # One synthesis per script even when the narration endpoint and a
+        # render ask for the same audio at the same time
+        self._narration_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        
+        # Render settings shared by remote and local generation
+        self.render_settings = {
+            'enhancer': 'gfpgan',  # Optional face enhancer
+            'preprocess': 'full',   # Face detection mode
+            'still': False,         # Whether to disable head pose motion
+            'pose_style': 0,        # Style of the pose motion transfer
+        }
+    
+    def render_identity(self) -> Dict[str, Any]:
+        """Get everything besides image and script that affects the rendered video
+        
+        Returns:
+            Dictionary suitable for building render cache keys
+        """
+        return {
+            'backend': 'remote' if self.use_remote_api else 'local',
+            'tts_model': self.tts_model,
+            'settings': self.render_settings
+        }
     
     def is_available(self) -> bool:
         """Check if SadTalker is available
@@ -82,7 +115,7 @@ class SadTalkerAPI:
         
         # If text is provided but not audio_file, generate audio from text
         if text and not audio_file:
-            audio_file = self._generate_audio_from_text(text)
+            audio_file = self.generate_narration(text)
             if not audio_file:
                 print("Failed to generate audio from text")
                 return None
@@ -102,36 +135,110 @@ class SadTalkerAPI:
         else:
             return self._generate_video_local(source_image, audio_file, result_file)
     
-    def _generate_audio_from_text(self, text: str) -> Optional[str]:
+    def narration_key(self, text: str) -> str:
+        """Get the content key of the narration for text
+        
+        Args:
+            text: Text to be spoken
+            
+        Returns:
+            Key derived from the TTS model and the text
+        """
+        return make_key("narration", self.tts_model, text)
+    
+    def narration_path(self, key: str) -> str:
+        """Get the path of a narration file in the content cache
+        
+        Args:
+            key: Narration key from narration_key()
+            
+        Returns:
+            Path of the audio file (which may not exist yet)
+        """
+        return content_cache.path_for("narration", key, ".wav")
+    
+    def generate_narration(self, text: str) -> Optional[str]:
+        """Get narration audio for text, synthesizing it only if not cached
+        
+        Narration is stored in the shared content cache keyed by the TTS model
+        and the text, so the same script is only ever synthesized once. The
+        file is published before any video render starts, so clients can play
+        it while the video is still rendering.
+        
+        Args:
+            text: Text to be spoken
+            
+        Returns:
+            Path to the audio file or None if failed
+        """
+        with tracer.span("sadtalker.narration", chars=len(text)) as span:
+            key = self.narration_key(text)
+            audio_file = self.narration_path(key)
+            
+            cached = os.path.exists(audio_file)
+            record_cache("narration", cached)
+            if span:
+                span.set_attribute("cached", cached)
+            if cached:
+                storage_manager.touch(audio_file)
+                return audio_file
+            
+            with self._locks_guard:
+                lock = self._narration_locks.setdefault(key, threading.Lock())
+            
+            with lock:
+                # Another thread may have synthesized it while we waited
+                if os.path.exists(audio_file):
+                    return audio_file
+                try:
+                    return self._generate_audio_from_text(text, audio_file)
+                finally:
+                    with self._locks_guard:
+                        self._narration_locks.pop(key, None)
+    
+    def _generate_audio_from_text(self, text: str, audio_file: str = None) -> Optional[str]:
         """Generate audio from text using TTS
         
         Args:
             text: Text to be spoken
+            audio_file: Path to save the audio to (optional)
             
         Returns:
             Path to the generated audio file or None if failed
         """
+        if not audio_file:
+            audio_file = os.path.join(self.output_dir, f"speech_{int(time.time())}.wav")
+        
+        # Write to a temporary file first so readers never see partial audio
+        temp_file = f"{audio_file}.{os.getpid()}.tmp.wav"
+        
         try:
             # Import TTS only when needed to avoid unnecessary dependencies
             from TTS.api import TTS
             
-            # Create temporary file for audio
-            audio_file = os.path.join(self.output_dir, f"speech_{int(time.time())}.wav")
+            started = time.perf_counter()
             
             # Initialize TTS
-            tts = TTS("tts_models/en/ljspeech/tacotron2-DDC")
+            with tracer.span("tts.load_model", model=self.tts_model):
+                tts = TTS(self.tts_model)
             
             # Generate audio
-            tts.tts_to_file(text=text, file_path=audio_file)
+            with tracer.span("tts.synthesize", engine="tts"):
+                tts.tts_to_file(text=text, file_path=temp_file)
+            TTS_DURATION.observe(time.perf_counter() - started, engine="tts")
             
+            os.replace(temp_file, audio_file)
             return audio_file
         except Exception as e:
             print(f"Error generating audio from text: {e}")
             
             # Try alternative method using espeak (Unix systems)
             try:
-                audio_file = os.path.join(self.output_dir, f"speech_{int(time.time())}.wav")
-                subprocess.run(["espeak", "-w", audio_file, text], check=True)
+                started = time.perf_counter()
+                with tracer.span("tts.synthesize", engine="espeak"):
+                    subprocess.run(["espeak", "-w", temp_file, text], check=True)
+                TTS_DURATION.observe(time.perf_counter() - started, engine="espeak")
+                os.replace(temp_file, audio_file)
                 return audio_file
             except Exception as e2:
                 print(f"Error with alternative TTS method: {e2}")
@@ -150,22 +257,23 @@ class SadTalkerAPI:
         """
         try:
             # Prepare files for upload
-            with open(source_image, 'rb') as f:
-                source_image_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            with open(audio_file, 'rb') as f:
-                audio_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            # Prepare request data
-            data = {
-                'source_image': source_image_data,
-                'audio_data': audio_data,
-                'api_key': self.remote_api_key,
-                'enhancer': 'gfpgan',  # Optional face enhancer
-                'preprocess': 'full',   # Face detection mode
-                'still': False,         # Whether to disable head pose motion
-                'pose_style': 0,        # Style of the pose motion transfer
-            }
+            with tracer.span("sadtalker.remote.encode") as span:
+                with open(source_image, 'rb') as f:
+                    source_image_data = base64.b64encode(f.read()).decode('utf-8')
+                
+                with open(audio_file, 'rb') as f:
+                    audio_data = base64.b64encode(f.read()).decode('utf-8')
+                
+                # Prepare request data
+                data = {
+                    'source_image': source_image_data,
+                    'audio_data': audio_data,
+                    'api_key': self.remote_api_key,
+                    **self.render_settings
+                }
+                body = json.dumps(data)
+                if span:
+                    span.set_attribute("request_bytes", len(body))
             
             # Send request to remote API
             headers = {
@@ -173,27 +281,38 @@ class SadTalkerAPI:
                 'Authorization': f'Bearer {self.remote_api_key}'
             }
             
-            response = requests.post(
-                self.remote_api_url,
-                headers=headers,
-                data=json.dumps(data)
-            )
+            with tracer.span("sadtalker.remote.import"):
+                import requests
+            
+            with tracer.span("sadtalker.remote.request", url=self.remote_api_url) as span:
+                response = requests.post(
+                    self.remote_api_url,
+                    headers=headers,
+                    data=body,
+                    timeout=self.remote_timeout
+                )
+                if span:
+                    span.set_attribute("http.status_code", response.status_code)
+                    span.set_attribute("response_bytes", len(response.content))
             
             if response.status_code != 200:
                 print(f"Error from remote API: {response.text}")
                 return None
             
             # Parse response
-            result = response.json()
-            
-            if 'video_data' not in result:
-                print(f"Invalid response from remote API: {result}")
-                return None
+            with tracer.span("sadtalker.remote.decode"):
+                result = response.json()
+                
+                if 'video_data' not in result:
+                    print(f"Invalid response from remote API: {result}")
+                    return None
+                
+                video_data = base64.b64decode(result['video_data'])
             
             # Save video data to result file
-            video_data = base64.b64decode(result['video_data'])
-            with open(result_file, 'wb') as f:
-                f.write(video_data)
+            with tracer.span("sadtalker.remote.write", bytes=len(video_data)):
+                with open(result_file, 'wb') as f:
+                    f.write(video_data)
             
             return result_file
         except Exception as e:
@@ -225,14 +344,15 @@ class SadTalkerAPI:
                 '--driven_audio', audio_file,
                 '--result_dir', os.path.dirname(result_file),
                 '--result_video', os.path.basename(result_file),
-                '--enhancer', 'gfpgan',  # Optional face enhancer
-                '--preprocess', 'full',   # Face detection mode
-                '--still', 'False',       # Whether to disable head pose motion
-                '--pose_style', '0',      # Style of the pose motion transfer
+                '--enhancer', self.render_settings['enhancer'],
+                '--preprocess', self.render_settings['preprocess'],
+                '--still', str(self.render_settings['still']),
+                '--pose_style', str(self.render_settings['pose_style']),
             ]
             
             # Run SadTalker
-            process = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            with tracer.span("sadtalker.local.inference"):
+                process = subprocess.run(cmd, capture_output=True, text=True, check=True)
             
             # Change back to original directory
             os.chdir(cwd)
@@ -272,7 +392,8 @@ if __name__ == "__main__":
             os.makedirs(os.path.dirname(test_image), exist_ok=True)
             # Download a sample image
             try:
-                response = requests.get("https://thispersondoesnotexist.com/", stream=True)
+                import requests
+                response = requests.get("https://thispersondoesnotexist.com/", stream=True, timeout=30)
                 if response.status_code == 200:
                     with open(test_image, 'wb') as f:
                         response.raw.decode_content = True
@@ -0,0 +1,127 @@
+import time
+import threading
+from typing import Callable, Dict, Any, List, Optional
+
+class BackgroundInitializer:
+    """Runs slow startup work off the import path
+
+    Tasks (backend probing, sample avatar downloads, ...) are run in order on a
+    daemon thread so the web server can accept traffic immediately. Progress is
+    reported through ``status()`` for the readiness endpoint.
+    """
+
+    def __init__(self):
+        """Initialize background initializer"""
+        self._tasks: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+        self._created_at = time.perf_counter()
+        self.import_timings: Dict[str, float] = {}
+
+    def add_task(self, name: str, func: Callable[[], Any], required: bool = True):
+        """Register a startup task
+
+        Args:
+            name: Task name shown in the readiness report
+            func: Callable to run; its return value is kept as the task result
+            required: Whether the application counts as ready only after this task finished
+        """
+        with self._lock:
+            self._tasks.append({
+                "name": name,
+                "func": func,
+                "required": required,
+                "state": "pending",
+                "duration_ms": None,
+                "error": None,
+                "result": None
+            })
+
+    def record_import_time(self, module: str, started: float):
+        """Record how long importing a module took
+
+        Args:
+            module: Module name
+            started: time.perf_counter() value taken before the import
+        """
+        self.import_timings[module] = round((time.perf_counter() - started) * 1000, 1)
+
+    def start(self):
+        """Start running the registered tasks on a background thread"""
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._run, name="guidemind-startup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Run all tasks in registration order"""
+        for task in self._tasks:
+            task["state"] = "running"
+            started = time.perf_counter()
+            try:
+                task["result"] = task["func"]()
+                task["state"] = "ready"
+            except Exception as e:
+                print(f"Startup task {task['name']} failed: {e}")
+                task["error"] = str(e)
+                task["state"] = "failed"
+            task["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            print(f"Startup task {task['name']}: {task['state']} in {task['duration_ms']} ms")
+        self._done.set()
+
+    def result(self, name: str) -> Any:
+        """Get the return value of a finished task
+
+        Args:
+            name: Task name
+
+        Returns:
+            Task result or None if the task has not finished successfully
+        """
+        for task in self._tasks:
+            if task["name"] == name and task["state"] == "ready":
+                return task["result"]
+        return None
+
+    def is_ready(self) -> bool:
+        """Check if all required tasks have finished (successfully or not)
+
+        Returns:
+            True if the application is ready to serve avatar requests
+        """
+        return all(task["state"] in ("ready", "failed") for task in self._tasks if task["required"])
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until all tasks have finished
+
+        Args:
+            timeout: Maximum time to wait in seconds (optional)
+
+        Returns:
+            True if all tasks finished within the timeout
+        """
+        return self._done.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        """Get a readiness report
+
+        Returns:
+            Dictionary with overall readiness, per-task state and import timings
+        """
+        return {
+            "ready": self.is_ready(),
+            "uptime_ms": round((time.perf_counter() - self._created_at) * 1000, 1),
+            "tasks": [
+                {
+                    "name": task["name"],
+                    "state": task["state"],
+                    "required": task["required"],
+                    "duration_ms": task["duration_ms"],
+                    "error": task["error"]
+                }
+                for task in self._tasks
+            ],
+            "import_ms": self.import_timings
+        }
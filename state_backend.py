@@ -0,0 +1,441 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse, unquote
+from content_cache import get_cache_dir
+
+class MemoryBackend:
+    """In-process state backend
+
+    Used by the CLI and prebake tools, and by the web app when STATE_BACKEND
+    is ``memory``; state is lost on restart and not shared between workers.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        """Initialize memory backend"""
+        self._entries: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value
+
+        Args:
+            key: State key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            Stored value or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return default
+            return value
+
+    def set(self, key: str, value: Any, ttl: float = None):
+        """Store a JSON-serializable value
+
+        Args:
+            key: State key
+            value: Value to store
+            ttl: Time to live in seconds (optional, no expiry if omitted)
+        """
+        # Round-trip through JSON so values behave the same as in the shared backends
+        value = json.loads(json.dumps(value))
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+
+    def add(self, key: str, value: Any, ttl: float = None) -> bool:
+        """Store a value only if the key is missing or expired
+
+        Args:
+            key: State key
+            value: Value to store
+            ttl: Time to live in seconds (optional, no expiry if omitted)
+
+        Returns:
+            True if the value was stored
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                return False
+            self._entries[key] = (json.loads(json.dumps(value)), time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key: str):
+        """Delete a value"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_if(self, key: str, value: Any) -> bool:
+        """Delete a value only if it still equals the given one
+
+        Args:
+            key: State key
+            value: Expected value (e.g. the owner token of a claim)
+
+        Returns:
+            True if the value was deleted
+        """
+        value = json.loads(json.dumps(value))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != value or (entry[1] is not None and entry[1] <= time.time()):
+                return False
+            del self._entries[key]
+            return True
+
+    def ping(self) -> bool:
+        """Check that the backend is reachable"""
+        return True
+
+class SQLiteBackend:
+    """State backend stored in a local SQLite database
+
+    Shares state between the workers of one node (or any processes that can
+    open the same file). The database runs in WAL mode so readers don't block
+    the writer; each thread keeps its own connection.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        """Initialize SQLite backend
+
+        Args:
+            path: Database file
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA busy_timeout=10000")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value
+
+        Args:
+            key: State key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            Stored value or default
+        """
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM state WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float = None):
+        """Store a JSON-serializable value
+
+        Args:
+            key: State key
+            value: Value to store
+            ttl: Time to live in seconds (optional, no expiry if omitted)
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl if ttl else None)
+            )
+            # Expired rows are only ever read as missing; sweep them on writes
+            connection.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def add(self, key: str, value: Any, ttl: float = None) -> bool:
+        """Store a value only if the key is missing or expired
+
+        Args:
+            key: State key
+            value: Value to store
+            ttl: Time to live in seconds (optional, no expiry if omitted)
+
+        Returns:
+            True if the value was stored
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "DELETE FROM state WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, time.time())
+            )
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl if ttl else None)
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, key: str):
+        """Delete a value"""
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def delete_if(self, key: str, value: Any) -> bool:
+        """Delete a value only if it still equals the given one
+
+        Args:
+            key: State key
+            value: Expected value (e.g. the owner token of a claim)
+
+        Returns:
+            True if the value was deleted
+        """
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(
+                "DELETE FROM state WHERE key = ? AND value = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, json.dumps(value), time.time())
+            )
+            return cursor.rowcount == 1
+
+    def ping(self) -> bool:
+        """Check that the backend is reachable"""
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            print(f"State backend error: {e}")
+            return False
+
+class RESPClient:
+    """Minimal Redis-protocol (RESP2) client for the commands the app uses
+
+    Used when the ``redis`` package is not installed. One connection per
+    thread, reconnecting once if the server closed it.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        """Initialize client
+
+        Args:
+            url: ``redis://[:password@]host[:port][/db]`` URL
+            timeout: Socket timeout in seconds
+        """
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+        if self.password:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", str(self.db))
+
+    def _send(self, *args: str) -> Any:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg.encode("utf-8") if isinstance(arg, str) else arg
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._local.sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self) -> Any:
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b"+":
+            return rest.decode("utf-8")
+        if prefix == b"-":
+            raise RuntimeError(rest.decode("utf-8"))
+        if prefix == b":":
+            return int(rest)
+        if prefix == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            count = int(rest)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"Unexpected reply: {line[:40]!r}")
+
+    def execute_command(self, *args: str) -> Any:
+        """Send a command and return its reply"""
+        for attempt in range(2):
+            if getattr(self._local, "sock", None) is None:
+                self._connect()
+            try:
+                return self._send(*args)
+            except (ConnectionError, OSError):
+                self._local.sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute_command("GET", key)
+
+    def set(self, key: str, value: str, ex: int = None, nx: bool = False):
+        args = ["SET", key, value]
+        if ex:
+            args += ["EX", str(ex)]
+        if nx:
+            args.append("NX")
+        return self.execute_command(*args)
+
+    def delete(self, key: str):
+        return self.execute_command("DEL", key)
+
+    def ping(self):
+        return self.execute_command("PING")
+
+# Compare-and-delete for RedisBackend.delete_if
+DELETE_IF_SCRIPT = 'if redis.call("get", KEYS[1]) == ARGV[1] then return redis.call("del", KEYS[1]) else return 0 end'
+
+class RedisBackend:
+    """State backend on a Redis-protocol server
+
+    Shares state between workers on any number of nodes. Uses the ``redis``
+    package when it is installed and the built-in RESP client otherwise, so
+    it also works against bench/resp_stand_in.py.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "guidemind:"):
+        """Initialize Redis backend
+
+        Args:
+            url: Server URL (``redis://host:port/db``)
+            prefix: Prefix for every key, so deployments can share a server
+        """
+        self.url = url
+        self.prefix = prefix
+        try:
+            import redis
+            self.client = redis.Redis.from_url(url, socket_timeout=5)
+        except ImportError:
+            self.client = RESPClient(url)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value
+
+        Args:
+            key: State key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            Stored value or default
+        """
+        data = self.client.get(self.prefix + key)
+        return default if data is None else json.loads(data)
+
+    def set(self, key: str, value: Any, ttl: float = None):
+        """Store a JSON-serializable value
+
+        Args:
+            key: State key
+            value: Value to store
+            ttl: Time to live in seconds (optional, no expiry if omitted)
+        """
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)) if ttl else None)
+
+    def add(self, key: str, value: Any, ttl: float = None) -> bool:
+        """Store a value only if the key is missing or expired
+
+        Args:
+            key: State key
+            value: Value to store
+            ttl: Time to live in seconds (optional, no expiry if omitted)
+
+        Returns:
+            True if the value was stored
+        """
+        return bool(self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)) if ttl else None, nx=True))
+
+    def delete(self, key: str):
+        """Delete a value"""
+        self.client.delete(self.prefix + key)
+
+    def delete_if(self, key: str, value: Any) -> bool:
+        """Delete a value only if it still equals the given one
+
+        The comparison and delete run as one Lua script, so a value set by
+        another process in between is never deleted.
+
+        Args:
+            key: State key
+            value: Expected value (e.g. the owner token of a claim)
+
+        Returns:
+            True if the value was deleted
+        """
+        return bool(self.client.execute_command("EVAL", DELETE_IF_SCRIPT, "1", self.prefix + key, json.dumps(value)))
+
+    def ping(self) -> bool:
+        """Check that the backend is reachable"""
+        try:
+            self.client.ping()
+            return True
+        except Exception as e:
+            print(f"State backend error: {e}")
+            return False
+
+def create_backend():
+    """Create the state backend selected by STATE_BACKEND
+
+    ``sqlite`` (default) stores state in STATE_DB_PATH, by default
+    ``state.db`` in the shared cache directory; ``redis`` connects to
+    REDIS_URL; ``memory`` keeps state in the process.
+
+    Returns:
+        State backend
+    """
+    kind = os.getenv("STATE_BACKEND", "sqlite").strip().lower()
+
+    if kind == "redis":
+        url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        return RedisBackend(url, os.getenv("REDIS_KEY_PREFIX", "guidemind:"))
+
+    if kind == "sqlite":
+        path = os.getenv("STATE_DB_PATH", "").strip() or os.path.join(get_cache_dir(), "state.db")
+        try:
+            return SQLiteBackend(path)
+        except sqlite3.Error as e:
+            print(f"Could not open state database {path} ({e}); keeping state in memory")
+            return MemoryBackend()
+
+    if kind != "memory":
+        print(f"Unknown STATE_BACKEND '{kind}'; keeping state in memory")
+    return MemoryBackend()
+
+# Create state backend instance
+state_backend = create_backend()
@@ -106,6 +106,13 @@ $(document).ready(function() {
         if (data.success) {
             totalSteps = data.total_steps;
             currentStep = 0;
+            stepCache = {};
+            if (typeof avatarManager !== 'undefined') {
+                avatarManager.forgetStepVideos();
+            }
+            
+            // The first steps are fetched while the welcome plays
+            prefetchSteps(0);
             
             // Show guide interface
             $('#setup-container').hide();
@@ -119,8 +126,22 @@ $(document).ready(function() {
                     // Show loading indicator
                     $('.speaking-indicator').removeClass('d-none').text('Generating welcome...');
                     
-                    // Get welcome video
-                    const welcomeVideoUrl = await avatarManager.getWelcomeVideo();
+                    // Start the render and play its narration while it runs
+                    const videoPromise = avatarManager.getWelcomeVideo();
+                    const narrationUrl = await avatarManager.getNarration('welcome');
+                    
+                    if (narrationUrl && await avatarManager.playProgressive(narrationUrl, videoPromise, 'avatar-video', function() {
+                        $('.speaking-indicator').addClass('d-none');
+                        
+                        // Now load the first step
+                        loadStep(0);
+                    })) {
+                        showingWelcome = true;
+                        $('.speaking-indicator').text('Speaking...').removeClass('d-none');
+                    }
+                    
+                    // Without narration, wait for the video itself
+                    const welcomeVideoUrl = showingWelcome ? null : await videoPromise;
                     
                     if (welcomeVideoUrl) {
                         // Update the video source
@@ -135,8 +156,7 @@ $(document).ready(function() {
                             };
                             
                             // Set video source and play
-                            videoElement.src = welcomeVideoUrl;
-                            videoElement.load();
+                            avatarManager.setVideoSource(videoElement, welcomeVideoUrl);
                             videoElement.play().catch(e => {
                                 console.error('Error playing welcome video:', e);
                                 
@@ -164,93 +184,97 @@ $(document).ready(function() {
         }
     }
     
+    // Re-request a degraded response (fallback content served while the LLM
+    // was slow) until the real answer is ready
+    function refreshDegraded(url, params, isStillRelevant, onReady, attempt = 0) {
+        if (attempt >= 5) {
+            return;
+        }
+        
+        setTimeout(function() {
+            if (!isStillRelevant()) {
+                return;
+            }
+            
+            $.ajax({
+                url: url,
+                type: 'GET',
+                data: params,
+                success: function(data) {
+                    if (!data.success || !isStillRelevant()) {
+                        return;
+                    }
+                    if (data.degraded) {
+                        refreshDegraded(url, params, isStillRelevant, onReady, attempt + 1);
+                    } else {
+                        onReady(data);
+                    }
+                }
+            });
+        }, 3000 * (attempt + 1));
+    }
+    
+    // Step payloads fetched ahead of navigation, by step index
+    let stepCache = {};
+    
+    // Fetch the steps around the current one (one back, two ahead) in one
+    // request, so navigating to them renders without a round trip; their
+    // explanations and videos are generated on the server meanwhile
+    function prefetchSteps(stepNumber) {
+        const start = Math.max(0, stepNumber - 1);
+        $.ajax({
+            url: '/api/steps',
+            type: 'GET',
+            data: {
+                start: start,
+                count: 4,
+                warm: 'true'
+            },
+            success: function(data) {
+                if (!data.success) {
+                    return;
+                }
+                data.steps.forEach(function(step) {
+                    const index = step.step_number - 1;
+                    // Keep a real explanation over fallback content
+                    if (!stepCache[index] || stepCache[index].degraded || !step.degraded) {
+                        stepCache[index] = step;
+                    }
+                    if (typeof avatarManager !== 'undefined') {
+                        avatarManager.rememberStepVideo(index, step.video);
+                    }
+                });
+            }
+        });
+    }
+    
     // Load a specific step
     function loadStep(stepNumber) {
+        const cached = stepCache[stepNumber];
+        if (cached) {
+            showStep(stepNumber, cached);
+            
+            // Record the learner's position on the server without waiting
+            $.ajax({
+                url: '/get-step',
+                type: 'GET',
+                data: {
+                    step: stepNumber
+                }
+            });
+            return;
+        }
+        
         $.ajax({
             url: '/get-step',
             type: 'GET',
             data: {
                 step: stepNumber
             },
-            success: async function(data) {
+            success: function(data) {
                 if (data.success) {
-                    currentStep = stepNumber;
-                    
-                    // Update UI
-                    $('#step-title').text('Step ' + data.step_number);
-                    $('#step-instruction').text(data.instruction);
-                    $('#step-explanation').html(data.explanation);
-                    
-                    // Update progress bar
-                    const progress = (data.step_number / data.total_steps) * 100;
-                    $('.progress-bar').css('width', progress + '%');
-                    $('.progress-bar').attr('aria-valuenow', progress);
-                    $('.progress-bar').text(`Step ${data.step_number}/${data.total_steps}`);
-                    
-                    // Try to use the avatar video system if available
-                    let usingAvatarVideo = false;
-                    
-                    if (typeof avatarManager !== 'undefined' && await avatarManager.initialize()) {
-                        try {
-                            // Show loading indicator
-                            $('.speaking-indicator').removeClass('d-none').text('Generating avatar...');
-                            
-                            // Get video for this step
-                            const videoUrl = await avatarManager.getStepVideo(stepNumber);
-                            
-                            if (videoUrl) {
-                                // Update the video source
-                                const videoElement = document.getElementById('avatar-video');
-                                if (videoElement) {
-                                    // Set onended event to hide speaking indicator
-                                    videoElement.onended = function() {
-                                        $('.speaking-indicator').addClass('d-none');
-                                    };
-                                    
-                                    // Set video source and play
-                                    videoElement.src = videoUrl;
-                                    videoElement.load();
-                                    videoElement.play().catch(e => {
-                                        console.error('Error playing avatar video:', e);
-                                        
-                                        // Fallback to regular speech
-                                        speakText(data.explanation);
-                                    });
-                                    
-                                    // Mark as using avatar video
-                                    usingAvatarVideo = true;
-                                    
-                                    // Show the speaking indicator
-                                    $('.speaking-indicator').text('Speaking...').removeClass('d-none');
-                                }
-                            }
-                        } catch (error) {
-                            console.error('Error using avatar for step explanation:', error);
-                        }
-                    }
-                    
-                    // If not using avatar video, use regular speech synthesis
-                    if (!usingAvatarVideo) {
-                        speakText(data.explanation);
-                    }
-                    
-                    lastExplanation = data.explanation;
-                    
-                    // Hide troubleshooting if visible
-                    $('#troubleshooting-container').hide();
-                    
-                    // Enable/disable navigation buttons
-                    if (currentStep === 0) {
-                        $('#prev-step').prop('disabled', true);
-                    } else {
-                        $('#prev-step').prop('disabled', false);
-                    }
-                    
-                    if (currentStep === totalSteps - 1) {
-                        $('#next-step').text('Finish');
-                    } else {
-                        $('#next-step').text('Next Step');
-                    }
+                    stepCache[stepNumber] = data;
+                    showStep(stepNumber, data);
                 } else {
                     alert('Error: ' + data.error);
                     
@@ -265,48 +289,126 @@ $(document).ready(function() {
         });
     }
     
-    // Handle next step button
+    // Show a step's payload (from /get-step or /api/steps)
+    async function showStep(stepNumber, data) {
+        currentStep = stepNumber;
+        
+        // Update UI
+        $('#step-title').text('Step ' + data.step_number);
+        $('#step-instruction').text(data.instruction);
+        $('#step-explanation').html(data.explanation);
+        
+        // Update progress bar
+        const progress = (data.step_number / data.total_steps) * 100;
+        $('.progress-bar').css('width', progress + '%');
+        $('.progress-bar').attr('aria-valuenow', progress);
+        $('.progress-bar').text(`Step ${data.step_number}/${data.total_steps}`);
+        
+        prefetchSteps(stepNumber);
+        
+        // Try to use the avatar video system if available
+        let usingAvatarVideo = false;
+        
+        if (typeof avatarManager !== 'undefined' && await avatarManager.initialize()) {
+            try {
+                // Show loading indicator
+                $('.speaking-indicator').removeClass('d-none').text('Generating avatar...');
+                
+                // A prefetched video plays right away; otherwise start the
+                // render and play its narration while it runs
+                const prefetched = avatarManager.hasStepVideo(stepNumber);
+                const videoPromise = avatarManager.getStepVideo(stepNumber);
+                const narrationUrl = prefetched ? null : await avatarManager.getNarration('step', { stepNumber: stepNumber });
+                
+                if (narrationUrl && await avatarManager.playProgressive(narrationUrl, videoPromise, 'avatar-video', function() {
+                    $('.speaking-indicator').addClass('d-none');
+                })) {
+                    usingAvatarVideo = true;
+                    $('.speaking-indicator').text('Speaking...').removeClass('d-none');
+                }
+                
+                // Without narration, wait for the video itself
+                const videoUrl = usingAvatarVideo ? null : await videoPromise;
+                
+                if (videoUrl) {
+                    // Update the video source
+                    const videoElement = document.getElementById('avatar-video');
+                    if (videoElement) {
+                        // Set onended event to hide speaking indicator
+                        videoElement.onended = function() {
+                            $('.speaking-indicator').addClass('d-none');
+                        };
+                        
+                        // Set video source and play
+                        avatarManager.setVideoSource(videoElement, videoUrl);
+                        videoElement.play().catch(e => {
+                            console.error('Error playing avatar video:', e);
+                            
+                            // Fallback to regular speech
+                            speakText(data.explanation);
+                        });
+                        
+                        // Mark as using avatar video
+                        usingAvatarVideo = true;
+                        
+                        // Show the speaking indicator
+                        $('.speaking-indicator').text('Speaking...').removeClass('d-none');
+                    }
+                }
+            } catch (error) {
+                console.error('Error using avatar for step explanation:', error);
+            }
+        }
+        
+        // If not using avatar video, use regular speech synthesis
+        if (!usingAvatarVideo) {
+            speakText(data.explanation);
+        }
+        
+        lastExplanation = data.explanation;
+        
+        // Swap in the real explanation once it has been generated
+        if (data.degraded) {
+            refreshDegraded('/get-step', { step: stepNumber, refresh: 'true' }, function() {
+                return currentStep === stepNumber;
+            }, function(fresh) {
+                $('#step-explanation').html(fresh.explanation);
+                lastExplanation = fresh.explanation;
+                stepCache[stepNumber] = fresh;
+            });
+        }
+        
+        // Hide troubleshooting if visible
+        $('#troubleshooting-container').hide();
+        
+        // Enable/disable navigation buttons
+        if (currentStep === 0) {
+            $('#prev-step').prop('disabled', true);
+        } else {
+            $('#prev-step').prop('disabled', false);
+        }
+        
+        if (currentStep === totalSteps - 1) {
+            $('#next-step').text('Finish');
+        } else {
+            $('#next-step').text('Next Step');
+        }
+    }
+    
+    // Handle next step button (loadStep records the new position on the server)
     $('#next-step').on('click', function() {
         if (currentStep === totalSteps - 1) {
             showCompletion();
         } else {
-            $.ajax({
-                url: '/next-step',
-                type: 'POST',
-                success: function(data) {
-                    if (data.success) {
-                        loadStep(currentStep + 1);
-                    } else {
-                        if (data.is_complete) {
-                            showCompletion();
-                        } else {
-                            alert('Error: ' + data.error);
-                        }
-                    }
-                },
-                error: function() {
-                    alert('Error navigating to next step. Please try again.');
-                }
-            });
+            loadStep(currentStep + 1);
         }
     });
     
     // Handle previous step button
     $('#prev-step').on('click', function() {
-        $.ajax({
-            url: '/previous-step',
-            type: 'POST',
-            success: function(data) {
-                if (data.success) {
-                    loadStep(currentStep - 1);
-                } else {
-                    alert('Error: ' + data.error);
-                }
-            },
-            error: function() {
-                alert('Error navigating to previous step. Please try again.');
-            }
-        });
+        if (currentStep > 0) {
+            loadStep(currentStep - 1);
+        }
     });
     
     // Handle help button
@@ -319,6 +421,14 @@ $(document).ready(function() {
                     $('#troubleshooting-content').html(data.troubleshooting);
                     $('#troubleshooting-container').show();
                     
+                    if (data.degraded) {
+                        refreshDegraded('/troubleshoot', {}, function() {
+                            return $('#troubleshooting-container').is(':visible');
+                        }, function(fresh) {
+                            $('#troubleshooting-content').html(fresh.troubleshooting);
+                        });
+                    }
+                    
                     // Try to use avatar system if available
                     let usingAvatarVideo = false;
                     
@@ -330,8 +440,19 @@ $(document).ready(function() {
                             // Get current step
                             const currentStepText = $('#step-instruction').text();
                             
-                            // Get help video
-                            const videoUrl = await avatarManager.getHelpVideo(currentStepText);
+                            // Start the render and play its narration while it runs
+                            const videoPromise = avatarManager.getHelpVideo(currentStepText);
+                            const narrationUrl = await avatarManager.getNarration('help', { stepText: currentStepText });
+                            
+                            if (narrationUrl && await avatarManager.playProgressive(narrationUrl, videoPromise, 'avatar-video', function() {
+                                $('.speaking-indicator').addClass('d-none');
+                            })) {
+                                usingAvatarVideo = true;
+                                $('.speaking-indicator').text('Speaking...').removeClass('d-none');
+                            }
+                            
+                            // Without narration, wait for the video itself
+                            const videoUrl = usingAvatarVideo ? null : await videoPromise;
                             
                             if (videoUrl) {
                                 // Update the video source
@@ -343,8 +464,7 @@ $(document).ready(function() {
                                     };
                                     
                                     // Set video source and play
-                                    videoElement.src = videoUrl;
-                                    videoElement.load();
+                                    avatarManager.setVideoSource(videoElement, videoUrl);
                                     videoElement.play().catch(e => {
                                         console.error('Error playing avatar video:', e);
                                         
@@ -405,6 +525,7 @@ $(document).ready(function() {
         // Reset state
         totalSteps = 0;
         currentStep = 0;
+        stepCache = {};
     });
     
     // Add voice control button functionality
@@ -6,6 +6,8 @@ class AvatarManager {
         this.avatars = [];
         this.selectedAvatarId = null;
         this.videos = {};  // Cache for video URLs
+        this.posters = {};  // Poster frame URLs by video URL
+        this.hls = null;  // hls.js player for the current HLS video
     }
 
     async initialize() {
@@ -14,9 +16,17 @@ class AvatarManager {
         }
 
         try {
-            // Check if SadTalker is available
-            const statusResponse = await fetch('/api/avatar/status');
-            const statusData = await statusResponse.json();
+            // Check if SadTalker is available (the server finishes starting up in the background)
+            let statusData = null;
+            for (let attempt = 0; attempt < 30; attempt++) {
+                const statusResponse = await fetch('/api/avatar/status');
+                statusData = await statusResponse.json();
+                
+                if (!statusData.starting) {
+                    break;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }
 
             if (statusData.status !== 'success' || !statusData.initialized) {
                 console.error('Avatar system not initialized:', statusData.message);
@@ -123,8 +133,10 @@ class AvatarManager {
             const data = await response.json();
             
             if (data.status === 'success') {
-                // Add new avatar to list
-                this.avatars.push(data.avatar);
+                // Add new avatar to list (re-uploads of the same image return the existing avatar)
+                if (!this.avatars.some(avatar => avatar.id === data.avatar.id)) {
+                    this.avatars.push(data.avatar);
+                }
                 this.selectedAvatarId = data.avatar.id;
                 
                 console.log('Avatar uploaded successfully:', data.avatar);
@@ -145,8 +157,12 @@ class AvatarManager {
             const data = await response.json();
             
             if (data.status === 'success') {
-                this.videos.welcome = data.video_url;
-                return data.video_url;
+                this.videos.welcome = this.pickRendition(data);
+                return this.videos.welcome;
+            } else if (data.status === 'degraded') {
+                // No video within the server's deadline; the caller narrates instead
+                console.info('Welcome video not ready, using audio:', data.message);
+                return null;
             } else {
                 console.error('Failed to get welcome video:', data.message);
                 return null;
@@ -170,8 +186,11 @@ class AvatarManager {
             const data = await response.json();
             
             if (data.status === 'success') {
-                this.videos[cacheKey] = data.video_url;
-                return data.video_url;
+                this.videos[cacheKey] = this.pickRendition(data);
+                return this.videos[cacheKey];
+            } else if (data.status === 'degraded') {
+                console.info(`Video for step ${stepNumber} not ready, using audio:`, data.message);
+                return null;
             } else {
                 console.error(`Failed to get video for step ${stepNumber}:`, data.message);
                 return null;
@@ -182,6 +201,27 @@ class AvatarManager {
         }
     }
 
+    // Remember a step video reported by the /api/steps batch endpoint so
+    // getStepVideo() returns it without a request
+    rememberStepVideo(stepNumber, video) {
+        if (video && video.status === 'success' && video.video_url) {
+            this.videos[`step_${stepNumber}`] = this.pickRendition(video);
+        }
+    }
+
+    hasStepVideo(stepNumber) {
+        return Boolean(this.videos[`step_${stepNumber}`]);
+    }
+
+    // Step videos belong to the loaded manual
+    forgetStepVideos() {
+        Object.keys(this.videos).forEach(key => {
+            if (key.startsWith('step_')) {
+                delete this.videos[key];
+            }
+        });
+    }
+
     async getHelpVideo(stepText, forceRegenerate = false) {
         try {
             const response = await fetch(`/api/avatar/help-video?force=${forceRegenerate}`, {
@@ -195,7 +235,10 @@ class AvatarManager {
             const data = await response.json();
             
             if (data.status === 'success') {
-                return data.video_url;
+                return this.pickRendition(data);
+            } else if (data.status === 'degraded') {
+                console.info('Help video not ready, using audio:', data.message);
+                return null;
             } else {
                 console.error('Failed to get help video:', data.message);
                 return null;
@@ -206,6 +249,137 @@ class AvatarManager {
         }
     }
 
+    // Pick a rendition for the connection: the original on fast links, the
+    // smaller renditions on slow or data-saving connections
+    pickRendition(data) {
+        const renditions = data.renditions || [];
+        let videoUrl = data.video_url;
+        
+        const connection = navigator.connection;
+        if (connection && renditions.length > 1) {
+            const slow = connection.saveData
+                || ['slow-2g', '2g', '3g'].includes(connection.effectiveType)
+                || connection.downlink < 1.5;
+            
+            if (slow) {
+                videoUrl = renditions[renditions.length - 1].url;
+            } else if (connection.downlink < 5) {
+                videoUrl = renditions[1].url;
+            }
+        }
+        
+        if (data.poster_url) {
+            this.posters[videoUrl] = data.poster_url;
+        }
+        return videoUrl;
+    }
+
+    async getNarration(kind, { stepNumber = null, stepText = null } = {}) {
+        try {
+            const params = new URLSearchParams({ kind: kind });
+            if (stepText) {
+                params.set('step_text', stepText);
+            } else if (stepNumber !== null) {
+                params.set('step', stepNumber);
+            }
+            
+            const response = await fetch(`/api/avatar/narration?${params}`);
+            const data = await response.json();
+            
+            if (data.status === 'success') {
+                return data.audio_url;
+            } else {
+                console.error(`Failed to get ${kind} narration:`, data.message);
+                return null;
+            }
+        } catch (error) {
+            console.error(`Error getting ${kind} narration:`, error);
+            return null;
+        }
+    }
+
+    // Play narration audio right away and switch to the avatar video at the
+    // same position once it has rendered (the video's soundtrack is the same
+    // audio). Resolves to false if the audio could not be played.
+    async playProgressive(audioUrl, videoPromise, elementId, onEnded = null) {
+        const videoElement = document.getElementById(elementId);
+        
+        if (this.narration) {
+            this.narration.pause();
+        }
+        const audio = new Audio(audioUrl);
+        this.narration = audio;
+        
+        let finished = false;
+        const finish = () => {
+            if (!finished) {
+                finished = true;
+                if (onEnded) {
+                    onEnded();
+                }
+            }
+        };
+        audio.onended = finish;
+        
+        try {
+            await audio.play();
+        } catch (error) {
+            console.error('Error playing narration:', error);
+            return false;
+        }
+        
+        videoPromise.then(videoUrl => {
+            // Keep the audio if it already finished or was replaced
+            if (!videoUrl || !videoElement || audio.ended || this.narration !== audio) {
+                return;
+            }
+            
+            videoElement.onended = finish;
+            this.setVideoSource(videoElement, videoUrl);
+            videoElement.addEventListener('canplay', () => {
+                if (audio.ended || this.narration !== audio) {
+                    return;
+                }
+                videoElement.currentTime = audio.currentTime;
+                videoElement.play().then(() => {
+                    // Hand over from the audio to the video in sync
+                    videoElement.currentTime = audio.currentTime;
+                    audio.onended = null;
+                    audio.pause();
+                }).catch(error => {
+                    console.error('Error upgrading narration to video:', error);
+                });
+            }, { once: true });
+        });
+        
+        return true;
+    }
+
+    // Load a video into an element. HLS playlists (help videos and long
+    // explanations, which start playing after the first segment) play
+    // natively where supported and through hls.js elsewhere.
+    setVideoSource(videoElement, videoUrl) {
+        if (this.hls) {
+            this.hls.destroy();
+            this.hls = null;
+        }
+        
+        // Show the poster frame until the first frame decodes
+        videoElement.poster = this.posters[videoUrl] || '';
+        
+        const isHls = videoUrl.endsWith('.m3u8');
+        if (isHls && !videoElement.canPlayType('application/vnd.apple.mpegurl')
+                && typeof Hls !== 'undefined' && Hls.isSupported()) {
+            this.hls = new Hls();
+            this.hls.loadSource(videoUrl);
+            this.hls.attachMedia(videoElement);
+            return;
+        }
+        
+        videoElement.src = videoUrl;
+        videoElement.load();
+    }
+
     // Utility method to play video in a specific element
     playVideo(videoUrl, elementId, onEnded = null) {
         const videoElement = document.getElementById(elementId);
@@ -214,16 +388,19 @@ class AvatarManager {
             return false;
         }
         
-        // Set video source
-        videoElement.src = videoUrl;
+        // Stop any narration that is still playing
+        if (this.narration) {
+            this.narration.pause();
+            this.narration = null;
+        }
         
         // Add end event handler if provided
         if (onEnded) {
             videoElement.onended = onEnded;
         }
         
-        // Play video
-        videoElement.load();
+        // Set video source and play
+        this.setVideoSource(videoElement, videoUrl);
         videoElement.play().catch(error => {
             console.error('Error playing video:', error);
         });
@@ -189,7 +189,7 @@ $(document).ready(function() {
     }
     
     // Function to load troubleshooting content
-    function loadTroubleshooting() {
+    function loadTroubleshooting(attempt = 0) {
         $.ajax({
             url: '/api/troubleshoot',
             type: 'GET',
@@ -199,14 +199,27 @@ $(document).ready(function() {
                     $('#troubleshooting-container').show();
                     
                     // Speak the troubleshooting advice if text-to-speech is available
-                    if (typeof speakText === 'function') {
+                    if (attempt === 0 && typeof speakText === 'function') {
                         speakText(data.troubleshooting);
                     }
-                } else {
+                    
+                    // Fallback advice was served while the LLM was slow; fetch
+                    // the real advice once it has been generated
+                    if (data.degraded && attempt < 5) {
+                        setTimeout(function() {
+                            if ($('#troubleshooting-container').is(':visible')) {
+                                loadTroubleshooting(attempt + 1);
+                            }
+                        }, 3000 * (attempt + 1));
+                    }
+                } else if (attempt === 0) {
                     alert('Error: ' + (data.error || 'Failed to load troubleshooting'));
                 }
             },
             error: function() {
+                if (attempt > 0) {
+                    return;
+                }
                 alert('Error getting troubleshooting advice. Please try again.');
             }
         });
@@ -0,0 +1,278 @@
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+import threading
+from typing import Any, Dict, Optional
+from flask import abort, make_response, render_template, request, send_file
+from content_cache import get_cache_dir
+from metrics import record_cache
+
+# Text assets worth compressing; media is already compressed
+COMPRESSIBLE_EXTENSIONS = (".js", ".css", ".html", ".svg", ".json", ".txt")
+
+# Fingerprinted URLs never change content, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+FINGERPRINTED = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[A-Za-z0-9]+)$")
+
+# Content-Encoding -> file suffix of the precompressed variant
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+def _brotli():
+    """Get the brotli module if it is installed"""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into encoding -> quality"""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+class StaticAssets:
+    """Serves static files under content-hashed URLs
+
+    ``asset_url("js/sadtalker.js")`` (a template global) returns
+    ``/assets/js/sadtalker.<hash>.js``. The hash changes with the content,
+    so the response is marked immutable and browsers never revalidate it.
+    gzip and, when the ``brotli`` package is installed, brotli variants are
+    written once per content hash to ``<cache_dir>/assets`` (shared by all
+    workers) and served according to Accept-Encoding. There is no build
+    step: hashes are computed on first use and refreshed when a file changes.
+    """
+
+    def __init__(self, static_folder: str, url_prefix: str = "/assets"):
+        """Initialize static assets
+
+        Args:
+            static_folder: Directory the assets are served from
+            url_prefix: URL prefix of fingerprinted assets
+        """
+        self.static_folder = static_folder
+        self.url_prefix = url_prefix.rstrip("/")
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def variants_dir(self) -> str:
+        """Directory of precompressed variants"""
+        return os.path.join(get_cache_dir(), "assets")
+
+    def _entry(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Get the path and content hash of a static file
+
+        Args:
+            filename: Path relative to the static folder
+
+        Returns:
+            Dictionary with path and hash, or None if the file doesn't exist
+        """
+        path = os.path.realpath(os.path.join(self.static_folder, filename))
+        if not path.startswith(os.path.realpath(self.static_folder) + os.sep):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(filename)
+        if entry and entry["signature"] == signature:
+            return entry
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        entry = {"path": path, "hash": digest.hexdigest()[:12], "signature": signature}
+        with self._lock:
+            self._entries[filename] = entry
+        return entry
+
+    def asset_url(self, filename: str) -> str:
+        """Get the fingerprinted URL of a static file
+
+        Args:
+            filename: Path relative to the static folder
+
+        Returns:
+            URL under the asset prefix, or the plain /static/ URL if the file
+            doesn't exist
+        """
+        entry = self._entry(filename)
+        if not entry:
+            return f"/static/{filename}"
+        stem, ext = os.path.splitext(filename)
+        return f"{self.url_prefix}/{stem}.{entry['hash']}{ext}"
+
+    def _variant(self, entry: Dict[str, Any], encoding: str) -> Optional[str]:
+        """Get (writing it if needed) a precompressed variant of an asset
+
+        Args:
+            entry: Asset entry from _entry()
+            encoding: "br" or "gzip"
+
+        Returns:
+            Path of the variant, or None if the encoding is unavailable
+        """
+        brotli = _brotli() if encoding == "br" else None
+        if encoding == "br" and not brotli:
+            return None
+
+        directory = os.path.join(self.variants_dir, entry["hash"][:2])
+        path = os.path.join(directory, f"{entry['hash']}{ENCODINGS[encoding]}")
+        exists = os.path.exists(path)
+        record_cache("asset_variant", exists)
+        if exists:
+            return path
+
+        try:
+            with open(entry["path"], "rb") as f:
+                data = f.read()
+            compressed = brotli.compress(data) if brotli else gzip.compress(data, compresslevel=9, mtime=0)
+            os.makedirs(directory, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(temp_path, path)
+            return path
+        except OSError as e:
+            print(f"Error precompressing {entry['path']} ({encoding}): {e}")
+            return None
+
+    def precompress(self) -> int:
+        """Write the compressed variants of every compressible static file
+
+        Returns:
+            Number of files processed
+        """
+        count = 0
+        for directory, _, files in os.walk(self.static_folder):
+            for name in files:
+                if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                    continue
+                filename = os.path.relpath(os.path.join(directory, name), self.static_folder)
+                entry = self._entry(filename)
+                if entry:
+                    for encoding in ENCODINGS:
+                        self._variant(entry, encoding)
+                    count += 1
+        return count
+
+    def serve(self, fingerprinted: str):
+        """Serve a fingerprinted asset
+
+        A hash that doesn't match the current content (a page rendered before
+        a deploy) still gets the current file, but without immutable caching.
+
+        Args:
+            fingerprinted: Fingerprinted path relative to the static folder
+        """
+        match = FINGERPRINTED.match(fingerprinted)
+        if not match:
+            abort(404)
+        filename = match.group("stem") + match.group("ext")
+        entry = self._entry(filename)
+        if not entry:
+            abort(404)
+
+        path, encoding = entry["path"], None
+        if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+            accepted = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+            for candidate in ENCODINGS:
+                if accepted.get(candidate, 0) > 0:
+                    variant = self._variant(entry, candidate)
+                    if variant:
+                        path, encoding = variant, candidate
+                        break
+
+        response = send_file(
+            path,
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            conditional=True,
+            etag=f"{entry['hash']}-{encoding}" if encoding else entry["hash"]
+        )
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = (
+            IMMUTABLE_CACHE_CONTROL if match.group("hash") == entry["hash"] else "no-cache"
+        )
+        return response
+
+    def init_app(self, app):
+        """Register the asset route and the asset_url template global
+
+        Args:
+            app: Flask application
+        """
+        app.add_url_rule(f"{self.url_prefix}/<path:fingerprinted>", "assets", self.serve)
+        app.add_template_global(self.asset_url, "asset_url")
+
+class TemplateSnippets:
+    """Memoized rendering of context-free template snippets
+
+    Snippets loaded by the page (e.g. the troubleshooting panel) don't depend
+    on the request, so each is rendered once and served with an ETag; the
+    browser revalidates and gets a 304 while it is unchanged. A changed
+    template (or debug mode) renders again.
+    """
+
+    def __init__(self, app):
+        """Initialize snippets
+
+        Args:
+            app: Flask application the templates belong to
+        """
+        self.app = app
+        self._rendered: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _render(self, template_name: str) -> Dict[str, Any]:
+        """Get the memoized rendering of a snippet"""
+        template = self.app.jinja_env.get_template(template_name)
+        memo = self._rendered.get(template_name)
+        cached = bool(memo) and memo["template"] is template and template.is_up_to_date and not self.app.debug
+        record_cache("template_snippet", cached)
+        if cached:
+            return memo
+
+        body = render_template(template_name)
+        memo = {
+            "template": template,
+            "body": body,
+            "etag": hashlib.sha256(body.encode("utf-8")).hexdigest()[:16]
+        }
+        with self._lock:
+            self._rendered[template_name] = memo
+        return memo
+
+    def serve(self, template_name: str):
+        """Serve a snippet, answering 304 if the client's copy is current
+
+        Args:
+            template_name: Template file name
+        """
+        memo = self._render(template_name)
+        response = make_response(memo["body"])
+        response.set_etag(memo["etag"])
+        response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
+
+# Create static assets instance
+static_assets = StaticAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
@@ -0,0 +1,304 @@
+import os
+import time
+import json
+import tempfile
+import threading
+from typing import Dict, Any, List, Tuple
+
+from content_cache import get_cache_dir
+
+MB = 1024 * 1024
+
+class StorageManager:
+    """Disk quota manager for generated media directories
+
+    Each managed directory has a byte budget, and all of them share a global
+    budget. When a budget is exceeded the least recently used files are
+    evicted; access is recorded by setting the file's atime via ``touch()``
+    whenever a cached file is served. Orphans (leftover speech files,
+    intermediate render outputs, temporary files) are swept once they are
+    older than a grace period.
+    """
+
+    def __init__(self):
+        """Initialize storage manager with budgets from the environment"""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        temp_dir = tempfile.gettempdir()
+
+        # name: (path, default budget in MB)
+        defaults = {
+            "sadtalker_output": (os.path.join(temp_dir, "sadtalker_output"), 200),
+            "sadtalker_cache": (os.path.join(temp_dir, "sadtalker_cache"), 200),
+            "static_videos": (os.path.join(base_dir, "static", "videos"), 2048),
+            "static_uploads": (os.path.join(base_dir, "static", "uploads"), 100),
+            "narration": (os.path.join(get_cache_dir(), "narration"), 512),
+        }
+
+        self.directories: Dict[str, Dict[str, Any]] = {}
+        for name, (path, budget_mb) in defaults.items():
+            budget_mb = float(os.getenv(f"STORAGE_BUDGET_{name.upper()}_MB", budget_mb))
+            self.directories[name] = {"path": path, "budget": int(budget_mb * MB)}
+
+        self.global_budget = int(float(os.getenv("STORAGE_BUDGET_TOTAL_MB", "3072")) * MB)
+
+        # Orphans younger than this are left alone (they may belong to a running render)
+        self.orphan_grace_seconds = int(os.getenv("STORAGE_ORPHAN_GRACE_SECONDS", "3600"))
+
+        # Minimum time between automatic enforcement runs
+        self.enforce_interval = int(os.getenv("STORAGE_ENFORCE_INTERVAL_SECONDS", "300"))
+
+        self._lock = threading.Lock()
+        self._last_enforced = 0.0
+        self.last_run: Dict[str, Any] = {}
+
+    def touch(self, path: str):
+        """Record that a file was accessed (used for LRU eviction)
+
+        Args:
+            path: Path to the accessed file
+        """
+        try:
+            stat = os.stat(path)
+            os.utime(path, (time.time(), stat.st_mtime))
+        except OSError:
+            pass
+
+    def _list_files(self, path: str) -> List[Tuple[str, os.stat_result]]:
+        """List managed files in a directory tree
+
+        README files and dotfiles are never managed.
+
+        Args:
+            path: Directory to list
+
+        Returns:
+            List of (path, stat) tuples
+        """
+        files = []
+        if not os.path.isdir(path):
+            return files
+
+        for root, dirnames, filenames in os.walk(path):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if filename.startswith(".") or filename.upper().startswith("README"):
+                    continue
+                file_path = os.path.join(root, filename)
+                try:
+                    files.append((file_path, os.stat(file_path)))
+                except OSError:
+                    continue
+        return files
+
+    @staticmethod
+    def _last_access(stat: os.stat_result) -> float:
+        """Get the last access time used for LRU ordering"""
+        return max(stat.st_atime, stat.st_mtime)
+
+    def _remove(self, path: str) -> int:
+        """Remove a file
+
+        Args:
+            path: Path to remove
+
+        Returns:
+            Number of bytes freed
+        """
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError as e:
+            print(f"Error removing {path}: {e}")
+            return 0
+
+    def _remove_empty_dirs(self, path: str):
+        """Remove empty subdirectories left behind by renders"""
+        for root, dirnames, filenames in os.walk(path, topdown=False):
+            if root != path and not os.listdir(root):
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+
+    def _is_orphan(self, name: str, file_path: str, stat: os.stat_result) -> bool:
+        """Check whether a file is an orphan that can be swept
+
+        Args:
+            name: Managed directory name
+            file_path: Path to the file
+            stat: File stat
+
+        Returns:
+            True if the file is an orphan
+        """
+        filename = os.path.basename(file_path)
+
+        # Interrupted atomic writes
+        if ".tmp" in filename:
+            return True
+
+        # Everything in the render output directory is intermediate
+        if name == "sadtalker_output":
+            return True
+
+        # Render copies that have already been published to static/videos
+        if name == "sadtalker_cache":
+            published = os.path.join(self.directories["static_videos"]["path"], filename)
+            return os.path.exists(published) or not filename.endswith(".mp4")
+
+        # Troubleshooting uploads are deleted after each request
+        if name == "static_uploads":
+            return True
+
+        return False
+
+    def sweep_orphans(self) -> Dict[str, Any]:
+        """Remove orphaned files older than the grace period
+
+        Returns:
+            Dictionary with number of files and bytes removed per directory
+        """
+        cutoff = time.time() - self.orphan_grace_seconds
+        result = {}
+
+        for name, directory in self.directories.items():
+            removed, freed = 0, 0
+            for file_path, stat in self._list_files(directory["path"]):
+                if stat.st_mtime > cutoff or not self._is_orphan(name, file_path, stat):
+                    continue
+                size = self._remove(file_path)
+                if size or not os.path.exists(file_path):
+                    removed += 1
+                    freed += size
+            self._remove_empty_dirs(directory["path"])
+            result[name] = {"files": removed, "bytes": freed}
+
+        return result
+
+    def enforce_budgets(self) -> Dict[str, Any]:
+        """Evict least recently used files until all budgets are met
+
+        Files modified within the orphan grace period and temporary files
+        are skipped.
+
+        Returns:
+            Dictionary with number of files and bytes evicted per directory
+        """
+        result = {name: {"files": 0, "bytes": 0} for name in self.directories}
+        all_files = []
+        in_use_bytes = 0
+        cutoff = time.time() - self.orphan_grace_seconds
+
+        for name, directory in self.directories.items():
+            files = sorted(self._list_files(directory["path"]), key=lambda f: self._last_access(f[1]))
+            used = sum(stat.st_size for _, stat in files)
+
+            # Per-directory budget
+            remaining = []
+            for file_path, stat in files:
+                # Files still being written or just rendered count towards the
+                # budget but are never evicted (as in sweep_orphans)
+                if stat.st_mtime > cutoff or ".tmp" in os.path.basename(file_path):
+                    in_use_bytes += stat.st_size
+                    continue
+                if used > directory["budget"]:
+                    freed = self._remove(file_path)
+                    used -= freed
+                    result[name]["files"] += 1
+                    result[name]["bytes"] += freed
+                else:
+                    remaining.append((name, file_path, stat))
+            all_files.extend(remaining)
+
+        # Global budget across all directories
+        total = in_use_bytes + sum(stat.st_size for _, _, stat in all_files)
+        if total > self.global_budget:
+            all_files.sort(key=lambda f: self._last_access(f[2]))
+            for name, file_path, stat in all_files:
+                if total <= self.global_budget:
+                    break
+                freed = self._remove(file_path)
+                total -= freed
+                result[name]["files"] += 1
+                result[name]["bytes"] += freed
+
+        return result
+
+    def run(self) -> Dict[str, Any]:
+        """Sweep orphans and enforce budgets
+
+        Returns:
+            Summary of the run
+        """
+        with self._lock:
+            started = time.time()
+            swept = self.sweep_orphans()
+            evicted = self.enforce_budgets()
+            self._last_enforced = time.time()
+            self.last_run = {
+                "finished_at": int(self._last_enforced),
+                "duration_ms": round((self._last_enforced - started) * 1000, 1),
+                "swept": swept,
+                "evicted": evicted
+            }
+
+            freed = sum(r["bytes"] for r in swept.values()) + sum(r["bytes"] for r in evicted.values())
+            if freed:
+                print(f"Storage manager freed {freed / MB:.1f} MB")
+            return self.last_run
+
+    def maybe_run(self):
+        """Run sweep and eviction in the background if the interval has passed
+
+        Called after renders; cheap when nothing needs to happen.
+        """
+        if time.time() - self._last_enforced < self.enforce_interval or self._lock.locked():
+            return
+        self._last_enforced = time.time()
+        threading.Thread(target=self.run, name="guidemind-storage", daemon=True).start()
+
+    def report(self) -> Dict[str, Any]:
+        """Report disk usage of all managed directories
+
+        Returns:
+            Dictionary with usage and budget per directory and in total
+        """
+        directories = {}
+        total = 0
+
+        for name, directory in self.directories.items():
+            files = self._list_files(directory["path"])
+            used = sum(stat.st_size for _, stat in files)
+            total += used
+            oldest = min((self._last_access(stat) for _, stat in files), default=None)
+            directories[name] = {
+                "path": directory["path"],
+                "files": len(files),
+                "bytes": used,
+                "budget": directory["budget"],
+                "over_budget": used > directory["budget"],
+                "oldest_access": int(oldest) if oldest else None
+            }
+
+        return {
+            "directories": directories,
+            "total_bytes": total,
+            "global_budget": self.global_budget,
+            "over_budget": total > self.global_budget,
+            "last_run": self.last_run
+        }
+
+# Create storage manager instance
+storage_manager = StorageManager()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report on and clean up GuideMind media directories")
+    parser.add_argument("--sweep", action="store_true", help="Sweep orphans and enforce budgets")
+    args = parser.parse_args()
+
+    if args.sweep:
+        print(json.dumps(storage_manager.run(), indent=2))
+    print(json.dumps(storage_manager.report(), indent=2))
@@ -0,0 +1,294 @@
+// GuideMind service worker
+//
+// Keeps the page, step payloads and avatar media available on flaky
+// connections. Rendered by app.py at /sw.js, which fills in the cache
+// version (a hash of the static bundle) and the cache limits.
+
+const CACHE_VERSION = {{ cache_version|tojson }};
+const STATIC_CACHE = `guidemind-static-${CACHE_VERSION}`;
+const STEPS_CACHE = `guidemind-steps-${CACHE_VERSION}`;
+// Media is content-addressed, so it survives deploys; bump to change its layout
+const MEDIA_CACHE = 'guidemind-media-v1';
+
+const PRECACHE_URLS = {{ precache_urls|tojson }};
+const MEDIA_CACHE_BYTES = {{ media_cache_bytes|tojson }};
+const STEPS_CACHE_ENTRIES = {{ steps_cache_entries|tojson }};
+
+// Seconds to wait for the network before serving the page from the cache
+const NAVIGATION_TIMEOUT = 3;
+
+// Requests that change what the step payloads contain
+const INVALIDATING_POSTS = ['/load-instructions', '/api/avatar/set', '/api/avatar/upload'];
+
+// Step payloads and the avatar JSON endpoints that point at media
+const STEP_PAYLOADS = [/^\/get-step$/, /^\/api\/steps$/, /^\/api\/avatar\/(step|welcome)-video(\/|$)/, /^\/api\/avatar\/narration$/];
+
+// Rendered videos, narration and images (names derive from their content)
+const MEDIA = [/^\/static\/videos\//, /^\/static\/video\//, /^\/static\/img\//, /^\/api\/heygen\/video\//, /^\/api\/avatar\/narration\/.+\.wav$/];
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(STATIC_CACHE);
+        // One missing asset (e.g. an optional poster) must not fail the install
+        await Promise.all(PRECACHE_URLS.map(async url => {
+            try {
+                const sameOrigin = new URL(url, self.location.origin).origin === self.location.origin;
+                const response = await fetch(url, sameOrigin ? { cache: 'reload' } : { mode: 'no-cors' });
+                if (response.ok || response.type === 'opaque') {
+                    await cache.put(url, response);
+                }
+            } catch (error) {
+                console.warn('Could not precache', url, error);
+            }
+        }));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const current = [STATIC_CACHE, STEPS_CACHE, MEDIA_CACHE];
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter(name => name.startsWith('guidemind-') && !current.includes(name))
+            .map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        // CDN scripts and styles are versioned by URL
+        if (request.method === 'GET' && ['script', 'style', 'font'].includes(request.destination)) {
+            event.respondWith(staleWhileRevalidate(event, STATIC_CACHE));
+        }
+        return;
+    }
+
+    if (request.method === 'POST' && INVALIDATING_POSTS.includes(url.pathname)) {
+        event.respondWith((async () => {
+            const response = await fetch(request);
+            if (response.ok) {
+                await caches.delete(STEPS_CACHE);
+            }
+            return response;
+        })());
+        return;
+    }
+
+    if (request.method !== 'GET' || url.pathname === '/sw.js') {
+        return;
+    }
+
+    if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request, STATIC_CACHE, NAVIGATION_TIMEOUT));
+    } else if (url.pathname.startsWith('/assets/')) {
+        // Fingerprinted: the URL changes whenever the content does
+        event.respondWith(cacheFirst(request, STATIC_CACHE));
+    } else if (url.pathname.startsWith('/static/css/') || url.pathname.startsWith('/static/js/')) {
+        event.respondWith(staleWhileRevalidate(event, STATIC_CACHE));
+    } else if (url.pathname === '/get-step' && url.searchParams.get('refresh') !== 'true') {
+        // Revisited steps show at once; the request still reaches the server,
+        // which records the learner's position
+        event.respondWith(staleWhileRevalidate(event, STEPS_CACHE, isFinalPayload));
+    } else if (STEP_PAYLOADS.some(pattern => pattern.test(url.pathname))) {
+        event.respondWith(networkFirst(request, STEPS_CACHE, null, isFinalPayload));
+    } else if (url.pathname.endsWith('.m3u8')) {
+        // Playlists of HLS streams grow while they render
+        event.respondWith(networkFirst(request, MEDIA_CACHE));
+    } else if (MEDIA.some(pattern => pattern.test(url.pathname))) {
+        event.respondWith(serveMedia(event));
+    }
+});
+
+// Only complete answers are cached: no degraded (fallback) explanations and
+// no videos that are still rendering
+async function isFinalPayload(response) {
+    try {
+        const data = await response.clone().json();
+        if (data.success === false || data.degraded || (data.status && data.status !== 'success')) {
+            return false;
+        }
+        return !(data.steps || []).some(step => step.degraded);
+    } catch (error) {
+        return false;
+    }
+}
+
+async function put(cacheName, request, response, isCacheable) {
+    if (!response || !(response.ok || response.type === 'opaque') || (isCacheable && !(await isCacheable(response)))) {
+        return;
+    }
+    const cache = await caches.open(cacheName);
+    await cache.put(request, response);
+    if (cacheName === STEPS_CACHE) {
+        await trimEntries(cache, STEPS_CACHE_ENTRIES);
+    }
+}
+
+async function staleWhileRevalidate(event, cacheName, isCacheable) {
+    const request = event.request;
+    const cached = await caches.match(request, { cacheName: cacheName });
+    const network = fetch(request).then(async response => {
+        await put(cacheName, request, response.clone(), isCacheable);
+        return response;
+    });
+
+    if (cached) {
+        event.waitUntil(network.catch(() => null));
+        return cached;
+    }
+    return network;
+}
+
+async function cacheFirst(request, cacheName) {
+    const cached = await caches.match(request, { cacheName: cacheName });
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    await put(cacheName, request, response.clone());
+    return response;
+}
+
+async function networkFirst(request, cacheName, timeout, isCacheable) {
+    const network = fetch(request).then(async response => {
+        await put(cacheName, request, response.clone(), isCacheable);
+        return response;
+    });
+
+    try {
+        if (!timeout) {
+            return await network;
+        }
+        return await Promise.race([
+            network,
+            new Promise((resolve, reject) => setTimeout(() => reject(new Error('timeout')), timeout * 1000))
+        ]);
+    } catch (error) {
+        const cached = await caches.match(request, { cacheName: cacheName });
+        if (cached) {
+            return cached;
+        }
+        return network;
+    }
+}
+
+// Cache-first for media, answering range requests (how browsers load
+// video) from the cached file
+async function serveMedia(event) {
+    const request = event.request;
+    const range = request.headers.get('range');
+    const cache = await caches.open(MEDIA_CACHE);
+    const cached = await cache.match(request.url);
+
+    if (cached) {
+        return range ? rangeResponse(cached, range) : cached;
+    }
+
+    const response = await fetch(request);
+    // Redirects to another origin (the media store) come back opaque
+    if (response.type === 'basic' && (response.status === 200 || isWholeRange(response))) {
+        event.waitUntil(storeMedia(request.url, response.clone()));
+    } else if (response.type === 'basic' && response.status === 206) {
+        // A seek into a file we don't have yet: fetch all of it in the background
+        event.waitUntil(fetchMedia(request.url));
+    }
+    return response;
+}
+
+// Whether a 206 response is actually the whole file (e.g. "bytes=0-")
+function isWholeRange(response) {
+    const match = /^bytes (\d+)-(\d+)\/(\d+)$/.exec(response.headers.get('content-range') || '');
+    return response.status === 206 && Boolean(match) && match[1] === '0' && Number(match[2]) + 1 === Number(match[3]);
+}
+
+const mediaDownloads = new Map();
+
+function fetchMedia(url) {
+    if (!mediaDownloads.has(url)) {
+        const download = fetch(url)
+            .then(response => (response.status === 200 && response.type === 'basic') ? storeMedia(url, response) : null)
+            .catch(error => console.warn('Could not cache', url, error))
+            .finally(() => mediaDownloads.delete(url));
+        mediaDownloads.set(url, download);
+    }
+    return mediaDownloads.get(url);
+}
+
+async function storeMedia(url, response) {
+    const blob = await response.blob();
+    // Leave room for other files; one video must not flush the whole cache
+    if (blob.size > MEDIA_CACHE_BYTES / 4) {
+        return;
+    }
+
+    const headers = new Headers(response.headers);
+    headers.delete('content-range');
+    headers.set('content-length', String(blob.size));
+    const cache = await caches.open(MEDIA_CACHE);
+    await cache.put(url, new Response(blob, { status: 200, headers: headers }));
+    await trimBytes(cache, MEDIA_CACHE_BYTES);
+}
+
+async function rangeResponse(response, range) {
+    const blob = await response.blob();
+    const size = blob.size;
+    const match = /^bytes=(\d*)-(\d*)$/.exec(range.trim());
+    if (!match || (!match[1] && !match[2])) {
+        return new Response(blob, { status: 200, headers: response.headers });
+    }
+
+    let start, end;
+    if (match[1]) {
+        start = Number(match[1]);
+        end = match[2] ? Math.min(Number(match[2]), size - 1) : size - 1;
+    } else {
+        start = Math.max(0, size - Number(match[2]));
+        end = size - 1;
+    }
+    if (start >= size || start > end) {
+        return new Response(null, { status: 416, headers: { 'Content-Range': `bytes */${size}` } });
+    }
+
+    const headers = new Headers(response.headers);
+    headers.set('Content-Range', `bytes ${start}-${end}/${size}`);
+    headers.set('Content-Length', String(end - start + 1));
+    return new Response(blob.slice(start, end + 1), { status: 206, statusText: 'Partial Content', headers: headers });
+}
+
+// Evictions run one at a time so concurrent stores don't both delete the
+// same entries
+let evictions = Promise.resolve();
+
+// Drop the oldest entries (caches list entries in insertion order)
+function trimEntries(cache, maxEntries) {
+    evictions = evictions.then(async () => {
+        const requests = await cache.keys();
+        for (const request of requests.slice(0, Math.max(0, requests.length - maxEntries))) {
+            await cache.delete(request);
+        }
+    }).catch(error => console.warn('Cache eviction failed', error));
+    return evictions;
+}
+
+// Drop the oldest entries until the cached bytes fit the budget
+function trimBytes(cache, maxBytes) {
+    evictions = evictions.then(async () => {
+        const requests = await cache.keys();
+        const sizes = await Promise.all(requests.map(async request => {
+            const response = await cache.match(request);
+            return Number(response && response.headers.get('content-length')) || 0;
+        }));
+
+        let total = sizes.reduce((sum, size) => sum + size, 0);
+        for (let i = 0; total > maxBytes && i < requests.length - 1; i++) {
+            await cache.delete(requests[i]);
+            total -= sizes[i];
+        }
+    }).catch(error => console.warn('Cache eviction failed', error));
+    return evictions;
+}
@@ -0,0 +1,341 @@
+import os
+import sys
+import json
+import time
+import queue
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# Span of the code that is currently running (per request / thread context)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("guidemind_span", default=None)
+
+class Span:
+    """A timed stage of a request"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Dict[str, Any] = None):
+        """Initialize span
+
+        Args:
+            name: Stage name (e.g. "sadtalker.render")
+            trace_id: 32-hex-digit trace ID shared by all spans of a request
+            parent_id: Span ID of the enclosing span (None for the root)
+            attributes: Initial attributes
+        """
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        """Set an attribute on the span"""
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        """Duration in milliseconds (None while running)"""
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the span as a JSON-serializable dictionary"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+class JSONLogExporter:
+    """Writes one JSON line per finished span to stderr or a file"""
+
+    def __init__(self, path: str = None):
+        """Initialize exporter
+
+        Args:
+            path: File to append to (stderr if omitted)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps({"type": "span", **span.to_dict()}, default=str)
+        with self._lock:
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            else:
+                print(line, file=sys.stderr)
+
+class OTLPHTTPExporter:
+    """Sends spans to an OpenTelemetry collector using OTLP/HTTP with JSON
+
+    Spans are queued and posted in batches from a background thread, so
+    exporting never adds latency to requests.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "guidemind", batch_size: int = 256, interval: float = 2.0):
+        """Initialize exporter
+
+        Args:
+            endpoint: Collector base URL (e.g. http://localhost:4318)
+            service_name: service.name resource attribute
+            batch_size: Maximum spans per request
+            interval: Seconds between flushes
+        """
+        self.url = endpoint.rstrip("/")
+        if not self.url.endswith("/v1/traces"):
+            self.url += "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            return
+
+        with self._lock:
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """Flush queued spans until the queue stays empty"""
+        while True:
+            try:
+                batch = [self._queue.get(timeout=30)]
+            except queue.Empty:
+                return
+            time.sleep(self.interval)
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._post(batch)
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        """Encode an attribute as an OTLP KeyValue"""
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        return {"key": key, "value": encoded}
+
+    def _post(self, spans: List[Span]):
+        """Post a batch of spans to the collector"""
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "guidemind.tracing"},
+                    "spans": [{
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        "parentSpanId": span.parent_id or "",
+                        "name": span.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": [self._attribute(k, v) for k, v in span.attributes.items()],
+                        "status": {"code": 2, "message": span.error or ""} if span.status == "error" else {"code": 1},
+                    } for span in spans]
+                }]
+            }]
+        }
+        try:
+            import requests
+            response = requests.post(self.url, json=payload, timeout=5)
+            if response.status_code >= 300:
+                print(f"Error exporting spans: HTTP {response.status_code}")
+        except Exception as e:
+            print(f"Error exporting spans: {e}")
+
+class Tracer:
+    """Request-scoped tracing with pluggable exporters
+
+    Spans nest through a context variable, so any code running for a request
+    (including threads started with ``bind()``) attaches its spans to that
+    request's trace. TRACING_EXPORTER selects the output: "off" (default),
+    "json" (one JSON line per span on stderr or TRACING_LOG_FILE) or "otlp"
+    (OTLP/HTTP JSON to OTEL_EXPORTER_OTLP_ENDPOINT).
+    """
+
+    def __init__(self):
+        """Initialize tracer with settings from the environment"""
+        self.exporter = None
+        mode = os.getenv("TRACING_EXPORTER", "off").lower()
+
+        if mode == "json":
+            self.exporter = JSONLogExporter(os.getenv("TRACING_LOG_FILE", "").strip() or None)
+        elif mode == "otlp":
+            self.exporter = OTLPHTTPExporter(
+                os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"),
+                service_name=os.getenv("OTEL_SERVICE_NAME", "guidemind")
+            )
+        elif mode != "off":
+            print(f"Warning: unknown TRACING_EXPORTER {mode}; tracing disabled")
+
+    @property
+    def enabled(self) -> bool:
+        """Whether spans are recorded"""
+        return self.exporter is not None
+
+    @contextmanager
+    def span(self, name: str, trace_id: str = None, parent_id: str = None, **attributes):
+        """Time a block as a span of the current trace
+
+        Starts a new trace if no span is active. With tracing disabled this
+        yields None and costs next to nothing.
+
+        Args:
+            name: Span name
+            trace_id: Trace ID to continue (e.g. from a traceparent header)
+            parent_id: Parent span ID to continue
+            attributes: Span attributes
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        parent = _current_span.get()
+        if parent and not trace_id:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+
+        span = Span(name, trace_id or secrets.token_hex(16), parent_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = "error"
+            span.error = str(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def start_span(self, name: str, trace_id: str = None, parent_id: str = None, **attributes) -> Optional[Span]:
+        """Start a span that is ended explicitly with end_span()
+
+        Used where start and end happen in different callbacks (e.g. Flask
+        request hooks). The span becomes the current span.
+
+        Returns:
+            The span, or None with tracing disabled
+        """
+        if not self.enabled:
+            return None
+        span = Span(name, trace_id or secrets.token_hex(16), parent_id, attributes)
+        span._token = _current_span.set(span)
+        return span
+
+    def end_span(self, span: Optional[Span], error: str = None):
+        """End a span started with start_span()"""
+        if span is None or span.end_ns is not None:
+            return
+        if error:
+            span.status = "error"
+            span.error = error
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            # Ended from a different context
+            pass
+        self.finish(span)
+
+    def finish(self, span: Span):
+        """Record the end of a span and export it"""
+        span.end_ns = time.time_ns()
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            print(f"Error exporting span {span.name}: {e}")
+
+    def current_span(self) -> Optional[Span]:
+        """Get the active span"""
+        return _current_span.get()
+
+    def set_attribute(self, key: str, value: Any):
+        """Set an attribute on the active span (no-op without one)"""
+        span = _current_span.get()
+        if span:
+            span.set_attribute(key, value)
+
+    @staticmethod
+    def bind(function: Callable) -> Callable:
+        """Bind a function to the current context so spans it creates on
+        another thread stay part of the current trace
+
+        Args:
+            function: Function to run later, e.g. on an executor
+
+        Returns:
+            Function running in a copy of the current context
+        """
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+    def instrument_app(self, app):
+        """Trace every request of a Flask app as a root span
+
+        Continues W3C ``traceparent`` headers and returns the trace ID in
+        an ``X-Trace-Id`` response header.
+
+        Args:
+            app: Flask application
+        """
+        if not self.enabled:
+            return
+
+        from flask import g, request
+
+        @app.before_request
+        def _start_trace():
+            trace_id = parent_id = None
+            traceparent = request.headers.get("traceparent", "").split("-")
+            if len(traceparent) == 4 and len(traceparent[1]) == 32 and len(traceparent[2]) == 16:
+                trace_id, parent_id = traceparent[1], traceparent[2]
+            g._trace_span = self.start_span(
+                f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                trace_id=trace_id,
+                parent_id=parent_id,
+                **{"http.method": request.method, "http.target": request.path}
+            )
+
+        @app.after_request
+        def _add_trace_header(response):
+            span = g.get("_trace_span")
+            if span:
+                span.set_attribute("http.status_code", response.status_code)
+                response.headers["X-Trace-Id"] = span.trace_id
+            return response
+
+        @app.teardown_request
+        def _end_trace(exception=None):
+            self.end_span(g.pop("_trace_span", None), error=str(exception) if exception else None)
+
+# Shared tracer
+tracer = Tracer()
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import hashlib
+import secrets
+import threading
+from typing import Any, Dict, Optional
+
+# Query, form and JSON fields whose values are safe to keep (step numbers,
+# modes and flags); everything else is reduced to its presence or size
+SAFE_FIELDS = {"step", "step_number", "kind", "force", "preloaded_key", "start", "count", "warm", "max_concurrency", "include_welcome"}
+
+# Routes that are not learner traffic
+EXCLUDED_PREFIXES = ("/static/", "/sw.js", "/metrics", "/api/ready", "/api/heygen/webhook")
+
+class TrafficRecorder:
+    """Opt-in recorder of anonymized request sequences for replay
+
+    Writes one JSON line per request with the route template, safe
+    parameters, timing, status and an anonymized session ID, so navigation
+    patterns (bursts of Next, back-tracking, repeated "I'm stuck", avatar
+    switches) can be replayed with bench/replay.py. Instruction text, step
+    text, descriptions and uploaded files are never recorded, and client
+    addresses are hashed with a salt that changes on every restart unless
+    TRAFFIC_RECORD_SALT is set.
+    """
+
+    def __init__(self):
+        """Initialize recorder with settings from the environment"""
+        self.enabled = os.getenv("TRAFFIC_RECORDING", "false").lower() == "true"
+        self.path = os.getenv("TRAFFIC_RECORD_FILE", "traffic.jsonl")
+        self.sample_rate = float(os.getenv("TRAFFIC_RECORD_SAMPLE_RATE", "1.0"))
+        self.max_bytes = int(float(os.getenv("TRAFFIC_RECORD_MAX_MB", "100")) * 1024 * 1024)
+        self.salt = os.getenv("TRAFFIC_RECORD_SALT", "").strip() or secrets.token_hex(16)
+        self._lock = threading.Lock()
+        self._full = False
+
+    def session_id(self, remote_addr: str, user_agent: str) -> str:
+        """Get an anonymized, salted ID for a client
+
+        Args:
+            remote_addr: Client address
+            user_agent: Client user agent
+
+        Returns:
+            16-hex-digit session ID
+        """
+        digest = hashlib.sha256(f"{self.salt}|{remote_addr}|{user_agent}".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def _sampled(self, session: str) -> bool:
+        """Sample by session so recorded sessions are complete"""
+        if self.sample_rate >= 1.0:
+            return True
+        return int(session, 16) / float(16 ** len(session)) < self.sample_rate
+
+    @staticmethod
+    def _anonymize(fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep safe field values; replace the rest with a marker
+
+        Args:
+            fields: Request fields (query, form or JSON)
+
+        Returns:
+            Dictionary of safe values and ``True`` for fields that were present
+        """
+        anonymized = {}
+        for name, value in fields.items():
+            if name in SAFE_FIELDS and isinstance(value, (str, int, float, bool)) and len(str(value)) <= 64:
+                anonymized[name] = value
+            elif name == "avatar_id" and isinstance(value, str):
+                # Sample and HeyGen avatar IDs are shared; custom ones derive from the image
+                anonymized[name] = "custom" if value.startswith("custom_") else value
+            else:
+                anonymized[name] = True
+        return anonymized
+
+    def build_record(self, request, response, seconds: float) -> Optional[Dict[str, Any]]:
+        """Build the record for a finished request
+
+        Args:
+            request: Flask request
+            response: Flask response
+            seconds: Time spent handling the request
+
+        Returns:
+            Record dictionary, or None if the request is not recorded
+        """
+        if request.path.startswith(EXCLUDED_PREFIXES) or request.url_rule is None:
+            return None
+
+        session = self.session_id(request.remote_addr or "", request.headers.get("User-Agent", ""))
+        if not self._sampled(session):
+            return None
+
+        record = {
+            "ts": round(time.time() - seconds, 3),
+            "session": session,
+            "method": request.method,
+            "route": request.url_rule.rule,
+            "view_args": self._anonymize(request.view_args or {}),
+            "status": response.status_code,
+            "duration_ms": round(seconds * 1000, 1),
+        }
+
+        if request.args:
+            record["args"] = self._anonymize(request.args.to_dict())
+        if request.form:
+            record["form"] = self._anonymize(request.form.to_dict())
+        if request.files:
+            record["files"] = {name: request.content_length or 0 for name in request.files}
+        if request.is_json:
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                record["json"] = self._anonymize(body)
+
+        if response.mimetype == "application/json" and not response.direct_passthrough:
+            data = response.get_json(silent=True)
+            if isinstance(data, dict):
+                # Outcome flags show cache and degradation behaviour in the recording
+                record["outcome"] = {
+                    key: data[key] for key in ("status", "success", "cached", "backend", "degraded")
+                    if key in data and isinstance(data[key], (str, bool))
+                }
+        return record
+
+    def write(self, record: Dict[str, Any]):
+        """Append a record to the recording file"""
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._full:
+                return
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    self._full = True
+                    print(f"Traffic recording stopped: {self.path} reached TRAFFIC_RECORD_MAX_MB")
+                    return
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Error recording traffic: {e}")
+
+    def instrument_app(self, app):
+        """Record the requests of a Flask app (no-op unless TRAFFIC_RECORDING=true)
+
+        Args:
+            app: Flask application
+        """
+        if not self.enabled:
+            return
+
+        from flask import g, request
+
+        @app.before_request
+        def _start_recording():
+            g._traffic_started = time.perf_counter()
+
+        @app.after_request
+        def _record_request(response):
+            started = g.pop("_traffic_started", None)
+            if started is not None:
+                try:
+                    record = self.build_record(request, response, time.perf_counter() - started)
+                    if record:
+                        self.write(record)
+                except Exception as e:
+                    print(f"Error recording traffic: {e}")
+            return response
+
+        print(f"Recording anonymized traffic to {self.path}")
+
+# Create recorder instance
+traffic_recorder = TrafficRecorder()
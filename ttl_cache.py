@@ -0,0 +1,114 @@
+import time
+import threading
+from typing import Any, Callable, Dict, Optional, Union
+from metrics import record_cache
+
+class TTLCache:
+    """In-memory cache with per-entry TTLs and background refresh
+
+    A fresh entry is returned directly. An expired entry is still returned
+    (stale-while-revalidate) while a single background thread reloads it, so
+    callers only ever wait on the very first load of a key.
+    """
+
+    def __init__(self, name: str = "cache"):
+        """Initialize TTL cache
+
+        Args:
+            name: Name used in log messages
+        """
+        self.name = name
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, loader: Callable[[], Any], ttl: Union[float, Callable[[Any], float]]) -> Any:
+        """Get a value, loading or refreshing it as needed
+
+        Args:
+            key: Cache key
+            loader: Function that loads the value
+            ttl: Time to live in seconds, or a function computing it from the value
+                (e.g. to keep negative results for a shorter time)
+
+        Returns:
+            Cached or freshly loaded value
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+
+        record_cache(self.name, bool(entry))
+        if entry:
+            self.hits += 1
+            if entry["expires_at"] <= now:
+                self.refresh_async(key, loader, ttl)
+            return entry["value"]
+
+        self.misses += 1
+        return self._load(key, loader, ttl)
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Get a cached value without loading it
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value (possibly stale) or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry["value"] if entry else None
+
+    def set(self, key: str, value: Any, ttl: float):
+        """Store a value
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Time to live in seconds
+        """
+        with self._lock:
+            self._entries[key] = {"value": value, "expires_at": time.time() + ttl}
+
+    def invalidate(self, key: str):
+        """Drop a cached value so the next get() reloads it
+
+        Args:
+            key: Cache key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def refresh_async(self, key: str, loader: Callable[[], Any], ttl: Union[float, Callable[[Any], float]]):
+        """Reload a value on a background thread (at most one refresh per key)
+
+        Args:
+            key: Cache key
+            loader: Function that loads the value
+            ttl: Time to live in seconds, or a function computing it from the value
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._load(key, loader, ttl)
+            except Exception as e:
+                print(f"Error refreshing {self.name} entry {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"{self.name}-refresh", daemon=True).start()
+
+    def _load(self, key: str, loader: Callable[[], Any], ttl: Union[float, Callable[[Any], float]]) -> Any:
+        """Load a value and store it"""
+        value = loader()
+        self.set(key, value, ttl(value) if callable(ttl) else ttl)
+        return value
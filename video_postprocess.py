@@ -0,0 +1,282 @@
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import Any, Dict, List, Optional
+
+# Default renditions for talking-head videos: (height, video bitrate, audio bitrate)
+DEFAULT_RENDITIONS = "480:700k:96k,320:300k:64k"
+
+class VideoPostProcessor:
+    """Post-render stage for generated videos using ffmpeg
+
+    Every published video is remuxed with its moov atom at the front
+    (``-movflags +faststart``) so playback starts before the download
+    finishes, and a poster frame is extracted. Smaller H.264 renditions are
+    transcoded in the background next to the original:
+
+        step_<key>.mp4          original resolution, faststart
+        step_<key>_480p.mp4     renditions (VIDEO_RENDITIONS)
+        step_<key>.jpg          poster frame
+
+    Without ffmpeg, videos are published unchanged.
+    """
+
+    def __init__(self):
+        """Initialize post-processor with settings from the environment"""
+        self.ffmpeg = os.getenv("FFMPEG_PATH", "").strip() or shutil.which("ffmpeg")
+        self.enabled = bool(self.ffmpeg) and os.getenv("VIDEO_POSTPROCESS", "true").lower() == "true"
+        self.renditions = self._parse_renditions(os.getenv("VIDEO_RENDITIONS", DEFAULT_RENDITIONS))
+        self.timeout = float(os.getenv("VIDEO_POSTPROCESS_TIMEOUT", "300"))
+        self._transcoding = set()
+        # Rendition heights per video that failed or would not be smaller
+        # than the source; variants() doesn't try them again
+        self._skipped: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+        if not self.ffmpeg:
+            print("ffmpeg not found; videos are published without post-processing")
+
+    @staticmethod
+    def _parse_renditions(value: str) -> List[Dict[str, Any]]:
+        """Parse a rendition list like "480:700k:96k,320:300k:64k"
+
+        Args:
+            value: Comma-separated height:video_bitrate[:audio_bitrate] entries
+
+        Returns:
+            List of rendition dictionaries, largest first
+        """
+        renditions = []
+        for entry in value.split(","):
+            parts = [part.strip() for part in entry.split(":") if part.strip()]
+            if len(parts) < 2:
+                continue
+            try:
+                height = int(parts[0])
+            except ValueError:
+                print(f"Invalid video rendition: {entry}")
+                continue
+            renditions.append({
+                "height": height,
+                "video_bitrate": parts[1],
+                "audio_bitrate": parts[2] if len(parts) > 2 else "64k"
+            })
+        return sorted(renditions, key=lambda r: r["height"], reverse=True)
+
+    @staticmethod
+    def rendition_path(video_path: str, height: int) -> str:
+        """Get the path of a rendition of a video"""
+        base, extension = os.path.splitext(video_path)
+        return f"{base}_{height}p{extension}"
+
+    @staticmethod
+    def poster_path(video_path: str) -> str:
+        """Get the path of the poster frame of a video"""
+        return f"{os.path.splitext(video_path)[0]}.jpg"
+
+    def _run(self, args: List[str]) -> bool:
+        """Run ffmpeg
+
+        Args:
+            args: Arguments after the ffmpeg executable
+
+        Returns:
+            True if ffmpeg succeeded
+        """
+        try:
+            result = subprocess.run(
+                [self.ffmpeg, "-y", "-hide_banner", "-loglevel", "error"] + args,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout
+            )
+            if result.returncode != 0:
+                print(f"ffmpeg failed: {result.stderr.strip()}")
+                return False
+            return True
+        except Exception as e:
+            print(f"Error running ffmpeg: {e}")
+            return False
+
+    def _video_height(self, video_path: str) -> Optional[int]:
+        """Get the frame height of a video from ffmpeg's stream info
+
+        Args:
+            video_path: Path to the video
+
+        Returns:
+            Height in pixels or None if it can't be read
+        """
+        try:
+            # Without an output file ffmpeg exits non-zero after printing the streams
+            result = subprocess.run(
+                [self.ffmpeg, "-hide_banner", "-i", video_path],
+                capture_output=True,
+                text=True,
+                timeout=self.timeout
+            )
+        except Exception as e:
+            print(f"Error running ffmpeg: {e}")
+            return None
+        match = re.search(r"Video:.*?, (\d{2,5})x(\d{2,5})", result.stderr)
+        return int(match.group(2)) if match else None
+
+    def publish(self, source_path: str, video_path: str):
+        """Publish a rendered video with faststart, poster and renditions
+
+        The faststart remux and poster are done before returning; renditions
+        are transcoded on a background thread and appear when ready.
+
+        Args:
+            source_path: Rendered video (moved away or consumed)
+            video_path: Destination path of the published video
+        """
+        temp_path = f"{video_path}.{os.getpid()}.tmp.mp4"
+
+        # Remux without re-encoding, moving the moov atom to the front
+        if self.enabled and self._run(["-i", source_path, "-c", "copy", "-movflags", "+faststart", temp_path]):
+            os.remove(source_path)
+        else:
+            shutil.move(source_path, temp_path)
+        os.replace(temp_path, video_path)
+
+        with self._lock:
+            self._skipped.pop(video_path, None)
+
+        if not self.enabled:
+            return
+
+        self.extract_poster(video_path)
+
+        if self.renditions:
+            threading.Thread(
+                target=self.transcode_renditions,
+                args=(video_path,),
+                name="video-renditions",
+                daemon=True
+            ).start()
+
+    def extract_poster(self, video_path: str) -> Optional[str]:
+        """Extract a poster frame from a video
+
+        Args:
+            video_path: Path to the video
+
+        Returns:
+            Path to the poster image or None if failed
+        """
+        poster_path = self.poster_path(video_path)
+        temp_path = f"{poster_path}.{os.getpid()}.tmp.jpg"
+
+        # A frame shortly after the start shows the face at rest
+        if not self._run(["-ss", "0.5", "-i", video_path, "-frames:v", "1", "-q:v", "4", temp_path]):
+            return None
+        os.replace(temp_path, poster_path)
+        return poster_path
+
+    def transcode_renditions(self, video_path: str) -> List[str]:
+        """Transcode the smaller renditions of a video
+
+        Args:
+            video_path: Path to the published video
+
+        Returns:
+            List of rendition paths that were written
+        """
+        with self._lock:
+            if video_path in self._transcoding:
+                return []
+            self._transcoding.add(video_path)
+
+        written = []
+        skipped = set()
+        try:
+            source_height = None
+            for rendition in self.renditions:
+                path = self.rendition_path(video_path, rendition["height"])
+                if os.path.exists(path):
+                    written.append(path)
+                    continue
+
+                # A rendition as tall as the source would only duplicate it
+                source_height = source_height or self._video_height(video_path)
+                if source_height and rendition["height"] >= source_height:
+                    skipped.add(rendition["height"])
+                    continue
+
+                temp_path = f"{path}.{os.getpid()}.tmp.mp4"
+                ok = self._run([
+                    "-i", video_path,
+                    # Never upscale; keep the width even for H.264
+                    "-vf", f"scale=-2:'min({rendition['height']},ih)'",
+                    "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+                    "-b:v", rendition["video_bitrate"], "-maxrate", rendition["video_bitrate"],
+                    "-bufsize", rendition["video_bitrate"],
+                    "-pix_fmt", "yuv420p",
+                    "-c:a", "aac", "-b:a", rendition["audio_bitrate"],
+                    "-movflags", "+faststart",
+                    temp_path
+                ])
+                if ok:
+                    os.replace(temp_path, path)
+                    written.append(path)
+                else:
+                    skipped.add(rendition["height"])
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+        finally:
+            with self._lock:
+                self._transcoding.discard(video_path)
+                if skipped:
+                    self._skipped[video_path] = skipped
+
+        return written
+
+    def variants(self, video_path: str, video_url: str) -> Dict[str, Any]:
+        """Describe the published renditions and poster of a video
+
+        Args:
+            video_path: Path to the published video
+            video_url: URL of the published video
+
+        Returns:
+            Dictionary with a renditions list (largest first, the original
+            with height None) and poster_url (or None)
+        """
+        url_base, extension = os.path.splitext(video_url)
+        renditions = [{"height": None, "url": video_url}]
+        missing = False
+        with self._lock:
+            skipped = self._skipped.get(video_path, set())
+
+        for rendition in self.renditions:
+            if os.path.exists(self.rendition_path(video_path, rendition["height"])):
+                renditions.append({
+                    "height": rendition["height"],
+                    "bitrate": rendition["video_bitrate"],
+                    "url": f"{url_base}_{rendition['height']}p{extension}"
+                })
+            elif rendition["height"] not in skipped:
+                missing = True
+
+        # Renditions evicted by the storage manager are rebuilt in the
+        # background; failed and unneeded ones are not retried
+        if (self.enabled and missing
+                and video_path not in self._transcoding and os.path.exists(video_path)):
+            threading.Thread(
+                target=self.transcode_renditions,
+                args=(video_path,),
+                name="video-renditions",
+                daemon=True
+            ).start()
+
+        poster_exists = os.path.exists(self.poster_path(video_path))
+        return {
+            "renditions": renditions,
+            "poster_url": f"{url_base}.jpg" if poster_exists else None
+        }
+
+# Create post-processor instance
+video_postprocessor = VideoPostProcessor()
@@ -0,0 +1,14 @@
+"""WSGI entry point for production servers
+
+Run with gunicorn (settings in gunicorn.conf.py):
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker imports the app and runs its own background startup; session
+state and caches are shared through the state backend (STATE_BACKEND) and
+the content cache directory (GUIDEMIND_CACHE_DIR).
+"""
+
+from app import app
+
+# Alias for servers that look for ``application``
+application = app